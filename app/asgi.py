@@ -0,0 +1,242 @@
+import os
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, PlainTextResponse, StreamingResponse
+from starlette.routing import Match
+from werkzeug.datastructures import Authorization
+from botocore.exceptions import ClientError, BotoCoreError
+from app import main
+from app.utils import deadline
+from app.utils.admission import Rejected
+from app.utils.deadline import DeadlineExceeded, request_budget
+from app.utils.validator import parse_account_id, parse_body
+from app.utils.metrics import registry, http_requests, http_request_duration, http_in_flight
+
+# Async (ASGI) entrypoint of the web application. Serve with,
+#   uvicorn app.asgi:api --host 0.0.0.0 --port 80
+api = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+
+# Bounded pool the blocking boto3 calls run on, so the event loop keeps
+# accepting requests while DynamoDB calls are in flight
+db_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ASGI_DB_WORKERS", "128")),
+    thread_name_prefix="ddb"
+)
+
+async def run_blocking(func, *args):
+    # The executor does not carry context variables, the request deadline
+    # is handed over explicitly
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(deadline.propagate(func), *args))
+
+def json_response(body, status=200, headers=None):
+    # Encode with the Flask app's JSON provider so both apps render
+    # Decimals and errors identically
+    return Response(
+        content=main.app.json.dumps(body),
+        status_code=status,
+        media_type="application/json",
+        headers=headers
+    )
+
+async def read_json(request):
+    # Same parsing as the Flask app: any unparsable body is rejected
+    try:
+        return parse_body(await request.body()), None
+    except ValueError:
+        return None, json_response({"error": "Invalid JSON payload"}, 400)
+
+async def request_account_id(request):
+    # Same account as request_account_id of the Flask app: the one in
+    # the path, or the account a write takes money from or adds it to.
+    # Middlewares run before routing, so the path is matched here.
+    account_id = None
+    for route in api.router.routes:
+        match, child_scope = route.matches(request.scope)
+        if match == Match.FULL:
+            account_id = child_scope.get("path_params", {}).get("account_id")
+            break
+    if account_id is None and request.method == "POST" and main.admission.accounts is not None:
+        try:
+            data = parse_body(await request.body())
+        except ValueError:
+            return None
+        if isinstance(data, dict):
+            account_id = data.get("from_account_id", data.get("account_id"))
+    return parse_account_id(account_id)
+
+"""
+Same admission control as admit_request in the Flask app, run after -
+require_auth. Requests over a limit are answered 429 with Retry-After.
+"""
+@api.middleware("http")
+async def admit_request(request, call_next):
+    if request.url.path in ("/", "/metrics"):
+        return await call_next(request)
+
+    auth = Authorization.from_header(request.headers.get("Authorization"))
+    admit = functools.partial(main.admission.admit, auth.username, await request_account_id(request))
+    try:
+        # Waiting in the concurrency queue blocks, keep it off the event loop
+        admitted = await run_blocking(admit) if main.admission.concurrency is not None else admit()
+    except Rejected as e:
+        return json_response({"error": "Too many requests"}, 429, {"Retry-After": e.retry_after_header})
+
+    try:
+        return await call_next(request)
+    finally:
+        if admitted:
+            main.admission.release()
+
+"""
+Same Basic authentication as require_auth in the Flask app, -
+every route except the health check needs valid credentials.
+"""
+@api.middleware("http")
+async def require_auth(request, call_next):
+    if request.url.path in ("/", "/metrics"):
+        return await call_next(request)
+
+    auth = Authorization.from_header(request.headers.get("Authorization"))
+    try:
+        if main.credentials.loaded:
+            authorized = main.is_authorized(auth)
+        else:
+            # The first lookup fetches the secret, keep it off the event loop
+            authorized = await run_blocking(main.is_authorized, auth)
+    except (ClientError, BotoCoreError):
+        return json_response({"error": "Credentials unavailable"}, 503)
+
+    if not authorized:
+        return json_response({"error": "Unauthorized"}, 401)
+    return await call_next(request)
+
+"""
+Same time budget as start_deadline in the Flask app, set before the -
+credentials are checked.
+"""
+@api.middleware("http")
+async def start_deadline(request, call_next):
+    path = request.url.path
+    budget = request_budget(request.headers.get("X-Request-Timeout-Ms"), main.REQUEST_TIMEOUT)
+    if path in ("/", "/metrics", "/admin/report") or path.startswith("/statement/") or budget is None:
+        return await call_next(request)
+
+    token = deadline.start(budget)
+    try:
+        return await call_next(request)
+    finally:
+        deadline.reset(token)
+
+@api.exception_handler(DeadlineExceeded)
+async def deadline_exceeded(request, exc):
+    return json_response({"error": "Deadline exceeded"}, 504)
+
+@api.exception_handler(BotoCoreError)
+async def storage_unavailable(request, exc):
+    return json_response(main.UNAVAILABLE, 503, main.retry_headers(503))
+
+"""
+Request instrumentation for /metrics, the outermost middleware so -
+rejected requests are measured too.
+"""
+@api.middleware("http")
+async def record_request_metrics(request, call_next):
+    http_in_flight.inc()
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        http_in_flight.dec()
+    route = request.scope.get("route")
+    route = route.path if route is not None else "unmatched"
+    http_request_duration.observe(time.perf_counter() - started, method=request.method, route=route)
+    http_requests.inc(method=request.method, route=route, status=str(response.status_code))
+    return response
+
+@api.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@api.get("/")
+async def health():
+    return json_response({"status": "ok"})
+
+@api.get("/balance/{account_id}")
+async def get_balance(account_id: str, request: Request):
+    consistent = main.wants_consistent_read(request.query_params, request.headers)
+    allowance = main.wants_allowance(request.query_params)
+    if_none_match = request.headers.get("If-None-Match")
+    body, status, etag = await run_blocking(main.handle_balance, account_id, consistent, allowance, if_none_match)
+    headers = {"ETag": etag} if etag else None
+    if status == 304:
+        return Response(status_code=304, headers=headers)
+    return json_response(body, status, headers)
+
+@api.api_route("/balances", methods=["GET", "POST"])
+async def get_balances(request: Request):
+    if request.method == "POST":
+        data, error = await read_json(request)
+        if error:
+            return error
+        account_ids = data.get("account_ids") if isinstance(data, dict) else None
+    else:
+        account_ids = [i for i in request.query_params.get("ids", "").split(",") if i]
+
+    consistent = main.wants_consistent_read(request.query_params, request.headers)
+    body, status = await run_blocking(main.handle_balances, account_ids, consistent)
+    return json_response(body, status)
+
+@api.get("/transactions/{account_id}")
+async def get_transactions(account_id: str, request: Request):
+    body, status = await run_blocking(main.handle_transactions, account_id, request.query_params)
+    return json_response(body, status)
+
+@api.get("/statement/{account_id}")
+async def get_statement(account_id: str, request: Request):
+    body, status, content_type = await run_blocking(main.handle_statement, account_id, request.query_params)
+    if status != 200:
+        return json_response(body, status)
+    # Starlette iterates the blocking generator on its thread pool
+    fmt = request.query_params.get("format", "ndjson").lower()
+    return StreamingResponse(body, media_type=content_type, headers={
+        "Content-Disposition": f"attachment; filename=statement-{account_id}.{fmt}"
+    })
+
+@api.get("/admin/report")
+async def get_report(request: Request):
+    body, status, content_type = main.handle_report(request.query_params)
+    if status != 200:
+        return json_response(body, status)
+    # Starlette iterates the blocking generator on its thread pool
+    return StreamingResponse(body, media_type=content_type)
+
+@api.post("/deposit")
+async def deposit(request: Request):
+    data, error = await read_json(request)
+    if error:
+        return error
+    key = request.headers.get("Idempotency-Key")
+    body, status = await run_blocking(main.idempotent, "/deposit", key, data, main.handle_deposit)
+    return json_response(body, status, main.retry_headers(status))
+
+@api.post("/withdraw")
+async def withdraw(request: Request):
+    data, error = await read_json(request)
+    if error:
+        return error
+    key = request.headers.get("Idempotency-Key")
+    body, status = await run_blocking(main.idempotent, "/withdraw", key, data, main.handle_withdraw)
+    return json_response(body, status, main.retry_headers(status))
+
+@api.post("/transfer")
+async def transfer(request: Request):
+    data, error = await read_json(request)
+    if error:
+        return error
+    key = request.headers.get("Idempotency-Key")
+    body, status = await run_blocking(main.idempotent, "/transfer", key, data, main.handle_transfer)
+    return json_response(body, status, main.retry_headers(status))
@@ -1,45 +1,362 @@
 import os
+import time
 import boto3
 import json
-from flask import Flask, request, jsonify
-from botocore.exceptions import ClientError
-from decimal import Decimal, InvalidOperation
-from app.utils.validator import validate_amount
+import tempfile
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, g, request, jsonify
+from botocore.exceptions import ClientError, BotoCoreError
+from app.utils.validator import is_account_id, parse_account_id, parse_body, ACCOUNT_WRITE, TRANSFER
+from app.utils.cache import build_account_cache
+from app.utils.credentials import CredentialProvider
+from app.utils.idempotency import build_idempotency_store, fingerprint, IdempotencyError, NotApplied
+from app.utils.statement import iter_ledger, render_statement
+from app.utils.report import run_report, parse_buckets, WITHDRAWN_BUCKETS
+from app.utils.serialization import FastJSONProvider, select_fields
+from app.utils.admission import build_admission_control, Rejected
+from app.utils import deadline
+from app.utils.profiling import RequestProfiler
+from app.utils.deadline import DeadlineExceeded, request_budget
+from app.utils.metrics import (
+    registry, http_requests, http_request_duration, http_in_flight, InstrumentedDynamoDB
+)
+from app.storage import (
+    build_storage, build_dynamodb_pool, seed_accounts, StorageError, AccountNotFound, AccountBusy
+)
+from app.storage.connections import PooledDynamoDB, never_sent
+from app.storage.base import UTC, UncachedItem, daily_allowance, ledger_timestamp, to_decimal
 
 # entrypoint of the web application
 app = Flask(__name__)
 
+# Responses are encoded by one provider, so Decimals render the same way
+# on every endpoint of both the Flask and ASGI apps
+app.json = FastJSONProvider(
+    app,
+    decimal=os.getenv("JSON_DECIMAL", "number"),
+    encoder=os.getenv("JSON_ENCODER", "auto")
+)
+
+# Default time budget of a request in seconds, 0 leaves it unbounded
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT_MS", "0")) / 1000
+
+# Retry-After, in seconds, of requests failed by an unreachable DynamoDB
+UNAVAILABLE_RETRY_AFTER = os.getenv("UNAVAILABLE_RETRY_AFTER", "1")
+UNAVAILABLE = {"error": "Service unavailable"}
+
+# Share of requests run under cProfile, switched at runtime on
+# /admin/profile, 0 leaves profiling off. The rate and the profiles are
+# shared by the workers through PROFILE_DIR; the default is named after
+# the process that imported the app, the gunicorn master preloading it
+profiler = RequestProfiler(
+    os.getenv("PROFILE_SAMPLE_RATE", "0"),
+    directory=os.getenv("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), f"bank-profiles-{os.getpid()}")
+)
+
+# Download formats of /admin/profile/download, (mimetype, file name)
+PROFILE_FORMATS = {
+    "pstats": ("application/octet-stream", "profile.pstats"),
+    "collapsed": ("text/plain", "profile.folded")
+}
+
 # retrieve credentials from Secret Manager
 def get_credentials():
-    client = boto3.client("secretsmanager", region_name="ap-southeast-1")
-    secret_name = "myapp/credentials"  # nosec B105
+    client = boto3.client(
+        "secretsmanager",
+        region_name=os.getenv("AWS_REGION", "ap-southeast-1")
+    )
+    secret_name = os.getenv("SECRET_NAME", "myapp/credentials")  # nosec B105
     response = client.get_secret_value(SecretId=secret_name)
     secret = json.loads(response["SecretString"])
     return secret["username"], secret["password"]
 
-USERNAME, PASSWORD = get_credentials()
+# Credentials are fetched on first use, not at import, and refreshed in
+# the background every CREDENTIALS_TTL seconds to pick up rotations
+credentials = CredentialProvider(
+    lambda: get_credentials(),
+    ttl=float(os.getenv("CREDENTIALS_TTL", "300"))
+)
+
+"""
+Request instrumentation for /metrics. Registered before require_auth -
+so rejected requests are measured too.
+"""
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    http_in_flight.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get("request_started")
+    if started is not None:
+        # Label by route template, not path, to keep cardinality bounded
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        http_request_duration.observe(time.perf_counter() - started, method=request.method, route=route)
+        http_requests.inc(method=request.method, route=route, status=str(response.status_code))
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if g.pop("request_started", None) is not None:
+        http_in_flight.dec()
+
+"""
+Sampled profiling, started before authentication so the profile of a -
+request covers auth, body parsing, storage calls and the JSON response. -
+The profiling endpoints themselves are never sampled.
+"""
+@app.before_request
+def start_profile():
+    if not profiler.poll() or request.url_rule is None or request.endpoint.startswith("profile_"):
+        return
+    g.profile = profiler.start()
+
+@app.teardown_request
+def stop_profile(exc):
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profiler.stop(profile, f"{request.method} {request.url_rule.rule}")
+
+"""
+Time budget of the request, from the X-Request-Timeout-Ms header or -
+REQUEST_TIMEOUT_MS. It starts before authentication and admission, -
+and every DynamoDB call of the request fails fast once it is spent. -
+Statement exports and reports stream for as long as they take.
+"""
+@app.before_request
+def start_deadline():
+    if request.endpoint in ("health", "metrics", "get_statement", "get_report"):
+        return
+    budget = request_budget(request.headers.get("X-Request-Timeout-Ms"), REQUEST_TIMEOUT)
+    if budget is not None:
+        g.deadline = deadline.start(budget)
+
+@app.teardown_request
+def reset_deadline(exc):
+    token = g.pop("deadline", None)
+    if token is not None:
+        deadline.reset(token)
+
+@app.errorhandler(DeadlineExceeded)
+def deadline_exceeded(e):
+    return jsonify({"error": "Deadline exceeded"}), 504
+
+"""
+botocore errors that are no DynamoDB answer: no free pooled connection -
+(PoolTimeout), connection failures and timeouts. They say nothing about -
+the request, so the client is told to retry shortly.
+"""
+@app.errorhandler(BotoCoreError)
+def storage_unavailable(e):
+    return jsonify(UNAVAILABLE), 503, retry_headers(503)
+
+def retry_headers(status):
+    # Retry-After of a 503, replayed Idempotency-Key results included
+    return {"Retry-After": UNAVAILABLE_RETRY_AFTER} if status == 503 else None
 
 def check_auth(username, password):
-    return username == USERNAME and password == PASSWORD
+    valid_username, valid_password = credentials.get()
+    if username == valid_username and password == valid_password:
+        return True
+
+    # The secret may have been rotated since it was cached
+    credentials.refresh_async(force=True)
+    return False
+
+def is_authorized(auth):
+    """
+    Check parsed Basic credentials, shared by the Flask and ASGI apps.
+
+    :param auth: werkzeug Authorization or None
+    """
+    return bool(auth) and check_auth(auth.username, auth.password)
 
 @app.before_request
 def require_auth():
-    if request.endpoint == "health":
+    if request.endpoint in ("health", "metrics"):
         return
     
-    auth = request.authorization
-    if not auth or not check_auth(auth.username, auth.password):
+    try:
+        authorized = is_authorized(request.authorization)
+    except (ClientError, BotoCoreError):
+        return jsonify({"error": "Credentials unavailable"}), 503
+
+    if not authorized:
         return jsonify({"error": "Unauthorized"}), 401
 
-# creates DynamoDB object with default region set to Singapore
-dynamodb = boto3.resource(
-    "dynamodb",
-    region_name=os.getenv("AWS_REGION", "ap-southeast-1") 
+"""
+Admission control, run after require_auth. Requests over the credential -
+or account rate, or beyond the concurrency limit and its queue, are -
+answered 429 with Retry-After before any storage call is made.
+"""
+@app.before_request
+def admit_request():
+    if request.endpoint in ("health", "metrics"):
+        return
+
+    try:
+        g.admitted = admission.admit(request.authorization.username, request_account_id())
+    except Rejected as e:
+        return jsonify({"error": "Too many requests"}), 429, {"Retry-After": e.retry_after_header}
+
+@app.teardown_request
+def release_admission(exc):
+    if g.pop("admitted", False):
+        admission.release()
+
+def request_body():
+    """
+    JSON body of the request, parsed once and shared by admission
+    control and the view.
+
+    :raises ValueError: body is not valid JSON
+    """
+    if "body" not in g:
+        g.body = parse_body(request.get_data())
+    return g.body
+
+def request_account_id():
+    # Account a request is charged to: the one in the path, or the
+    # account a write takes money from or adds it to
+    account_id = (request.view_args or {}).get("account_id")
+    if account_id is None and request.method == "POST" and admission.accounts is not None:
+        try:
+            data = request_body()
+        except ValueError:
+            return None
+        if isinstance(data, dict):
+            account_id = data.get("from_account_id", data.get("account_id"))
+    return parse_account_id(account_id)
+
+def init_storage():
+    """
+    Create the account storage selected by STORAGE_BACKEND. Backends
+    hold connections that must not be shared across processes, so the
+    production server calls this again in every worker after fork.
+    """
+    global storage, dynamodb, table, idempotency
+    storage = build_storage()
+
+    # Local engines can start with generated accounts for load tests
+    seed = int(os.getenv("STORAGE_SEED_ACCOUNTS", "0"))
+    if seed:
+        seed_accounts(storage, seed)
+
+    # The DynamoDB resource and table stay reachable for tooling and tests
+    dynamodb = getattr(storage, "resource", None)
+    table = getattr(storage, "table", None)
+
+    # Idempotency-Key results, shared across workers through a DynamoDB
+    # table when IDEMPOTENCY_TABLE is set
+    table_name = os.getenv("IDEMPOTENCY_TABLE")
+    resource = dynamodb
+    if table_name and resource is None:
+        resource = InstrumentedDynamoDB(PooledDynamoDB(build_dynamodb_pool()))
+    idempotency = build_idempotency_store(
+        size=int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "100000")),
+        ttl=float(os.getenv("IDEMPOTENCY_TTL", "86400")),
+        table_name=table_name,
+        resource=resource,
+        wait=float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10")),
+        # A claim outlives the longest request: gunicorn restarts a worker
+        # stuck for WEB_TIMEOUT, and no request outlasts its deadline
+        lease=float(os.getenv("IDEMPOTENCY_LEASE_SECONDS",
+                              max(REQUEST_TIMEOUT, float(os.getenv("WEB_TIMEOUT", "30")))))
+    )
+
+init_storage()
+
+# Per credential and per account token buckets and the concurrency
+# limit of this process, each disabled when its setting is 0
+admission = build_admission_control(
+    account_rate=float(os.getenv("ADMISSION_ACCOUNT_RATE", "0")),
+    account_burst=float(os.getenv("ADMISSION_ACCOUNT_BURST", "0")),
+    credential_rate=float(os.getenv("ADMISSION_CREDENTIAL_RATE", "0")),
+    credential_burst=float(os.getenv("ADMISSION_CREDENTIAL_BURST", "0")),
+    max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", "0")),
+    queue_size=int(os.getenv("ADMISSION_QUEUE_SIZE", "16")),
+    queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "50")) / 1000
 )
 
-# Set the DyanmoDB table to Accounts
-table_name = os.getenv("DDB_TABLE", "Accounts")
-table = dynamodb.Table(table_name)
+# Read-through cache of account items, disabled when the TTL is 0
+balance_cache = build_account_cache(
+    size=int(os.getenv("BALANCE_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("BALANCE_CACHE_TTL", "0")),
+    redis_url=os.getenv("BALANCE_CACHE_REDIS_URL")
+)
+
+def balance_etag(account, allowance=False, today=None):
+    """
+    Strong ETag of a balance response. The version of the account item
+    grows with every balance change, a body with the daily allowance
+    also depends on the date.
+    """
+    version = int(to_decimal(account.get("version")))
+    return f'"{version}-{today}"' if allowance else f'"{version}"'
+
+def etag_matches(if_none_match, etag):
+    # If-None-Match is "*" or a list of tags, compared weakly as for any GET
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+def wants_consistent_read(args, headers):
+    """
+    A request can bypass the balance cache and ask DynamoDB for a
+    strongly consistent read with ?consistent=true or Cache-Control: no-cache.
+
+    :param args: query string mapping of the request
+    :param headers: header mapping of the request
+    """
+    return (args.get("consistent", "").lower() == "true"
+            or "no-cache" in headers.get("Cache-Control", ""))
+
+# Maximum number of account ids accepted by one batch balance lookup
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", "500"))
+
+# Item fields returned by /deposit and /withdraw, "*" returns the whole item
+RESPONSE_FIELDS = os.getenv(
+    "RESPONSE_FIELDS", "account_id,current_balance,daily_limit,daily_amount_withdrawn,withdrawal_date")
+RESPONSE_FIELDS = None if RESPONSE_FIELDS == "*" else tuple(f.strip() for f in RESPONSE_FIELDS.split(",") if f.strip())
+
+# Longest Idempotency-Key header accepted
+IDEMPOTENCY_KEY_MAX = 255
+
+# Server errors the handlers only answer for storage errors, which are
+# rejections raised before anything is written. A retry with the same
+# Idempotency-Key runs such a request again, any other 5xx is replayed.
+NOT_APPLIED_STATUSES = frozenset({AccountBusy.status})
+
+# Maximum number of transfers accepted in one /transfer request
+TRANSFER_BATCH_MAX = int(os.getenv("TRANSFER_BATCH_MAX", "25"))
+
+# Default and maximum number of ledger entries per /transactions page
+TRANSACTIONS_PAGE_SIZE = int(os.getenv("TRANSACTIONS_PAGE_SIZE", "50"))
+TRANSACTIONS_PAGE_MAX = int(os.getenv("TRANSACTIONS_PAGE_MAX", "100"))
+
+# Statement exports read the ledger STATEMENT_PAGE_SIZE entries at a
+# time, prefetching the next page, and flush every STATEMENT_CHUNK_BYTES
+STATEMENT_PAGE_SIZE = int(os.getenv("STATEMENT_PAGE_SIZE", "500"))
+STATEMENT_CHUNK_BYTES = int(os.getenv("STATEMENT_CHUNK_BYTES", "65536"))
+statement_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("STATEMENT_PREFETCH_WORKERS", "4")),
+    thread_name_prefix="statement"
+)
+
+STATEMENT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Account reports scan REPORT_SEGMENTS segments in parallel (at most
+# REPORT_MAX_SEGMENTS on request) within REPORT_READ_CAPACITY read
+# capacity units per second, and stream partial aggregates every
+# REPORT_PROGRESS_SECONDS
+REPORT_SEGMENTS = int(os.getenv("REPORT_SEGMENTS", "4"))
+REPORT_MAX_SEGMENTS = int(os.getenv("REPORT_MAX_SEGMENTS", "16"))
+REPORT_READ_CAPACITY = float(os.getenv("REPORT_READ_CAPACITY", "50"))
+REPORT_PAGE_SIZE = int(os.getenv("REPORT_PAGE_SIZE", "1000"))
+REPORT_PROGRESS_SECONDS = float(os.getenv("REPORT_PROGRESS_SECONDS", "2"))
 
 """
 Health check endpoint where the Application Load Balancer -
@@ -54,39 +371,181 @@ it will continously try to restart the service.
 def health():
     return {"status": "ok"}, 200
 
+def collect_cache_metrics():
+    stats = balance_cache.stats()
+    for name in ("hits", "misses", "evictions", "size"):
+        registry.gauge(f"balance_cache_{name}", f"Balance cache {name}.").set(stats[name])
+
+registry.register_collector(collect_cache_metrics)
+
+"""
+Prometheus endpoint exposing request, DynamoDB and cache metrics -
+of this worker process. Like the health check it needs no credentials.
+
+:return: metrics in the Prometheus text format
+:rtype: str
+"""
+@app.route("/metrics")
+def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
 """
 GET endpoint to retrieve the balance of the -
 bank account.
 
 :param int account_id: The account number of bank account
-:return: current balance of the requested account
+:param consistent: "true" to skip the balance cache and read consistently
+:param allowance: "true" to also return what is left of today's withdrawal limit
+:header If-None-Match: ETag of a previous response
+:return: current balance of the requested account, with its ETag
 :rtype: dict
 :statuscode 200: Successfully retrieved account balance
+:statuscode 304: Balance unchanged since the ETag in If-None-Match
 :statuscode 400: Invalid account id
 :statuscode 404: Account not found
 :statuscode 500: Internal server error
+:statuscode 504: Request deadline spent before DynamoDB answered
 """
 @app.route("/balance/<account_id>", methods=["GET"])
 def get_balance(account_id):
+    body, status, etag = handle_balance(
+        account_id,
+        wants_consistent_read(request.args, request.headers),
+        wants_allowance(request.args),
+        request.headers.get("If-None-Match")
+    )
+    headers = {"ETag": etag} if etag else {}
+    if status == 304:
+        return "", 304, headers
+    return jsonify(body), status, headers
+
+def wants_allowance(args):
+    return args.get("allowance", "").lower() == "true"
+
+def handle_balance(account_id, consistent=False, allowance=False, if_none_match=None):
+    """
+    Framework independent body of the balance endpoint, shared by the
+    Flask and ASGI apps. A cached item of the version in if_none_match
+    answers 304 without a DynamoDB read.
+
+    :return: response body, status code and ETag (None for errors)
+    :rtype: tuple
+    """
     try:
         # Validate if account id is in digits
-        if not account_id.isdigit():
-            return jsonify({"error": f"Invalid account id : {account_id}"}), 400
+        if not is_account_id(account_id):
+            return {"error": f"Invalid account id : {account_id}"}, 400, None
+
+        # Serve from the cache unless a consistent read was requested
+        account = None if consistent else balance_cache.get(account_id)
 
-        # Retrieve account id from DDB table
-        response = table.get_item(Key={"account_id": account_id})
+        if account is None:
+            account = storage.get(account_id, consistent=consistent)
 
-        # Validate if the account exists in the DDB table
-        if "Item" not in response:
-            return jsonify({"error": f"Account {account_id} not found"}), 404
+            # Validate if the account exists in the DDB table
+            if account is None:
+                return {"error": f"Account {account_id} not found"}, 404, None
+
+            balance_cache.put(account_id, account)
+
+        today = storage.today() if allowance else None
+        etag = balance_etag(account, allowance, today)
+        if etag_matches(if_none_match, etag):
+            return None, 304, etag
 
         # If exists return the current balance of the requested account
-        account = response["Item"]
-        return jsonify({
-            "current_balance": float(account["current_balance"])
-        }), 200
+        body = {
+            "current_balance": account["current_balance"]
+        }
+        if allowance:
+            body["daily_allowance_remaining"] = daily_allowance(account, today)
+        return body, 200, etag
+    except StorageError as e:
+        return {"error": str(e)}, e.status, None
+    except ClientError as e:
+        return {"error": str(e)}, 500, None
+
+
+"""
+Batch endpoint to retrieve the balances of many -
+bank accounts in one request.
+
+:param ids: comma separated account ids (GET query string)
+:param request body:
+    - account_ids(list): Account ids of the bank accounts (POST)
+:return: per account result keyed by account id, each with a status of -
+    ok/invalid/not_found/error and the current balance when found
+:rtype: dict
+:statuscode 200: Balances resolved (see per account status)
+:statuscode 400: Invalid payload/No account ids/Too many account ids
+:statuscode 500: Internal server error
+"""
+@app.route("/balances", methods=["GET", "POST"])
+def get_balances():
+    if request.method == "POST":
+        try:
+            # Validates for payload
+            data = request_body()
+        except Exception:
+            return jsonify({"error": "Invalid JSON payload"}), 400
+        account_ids = data.get("account_ids") if isinstance(data, dict) else None
+    else:
+        account_ids = [i for i in request.args.get("ids", "").split(",") if i]
+
+    body, status = handle_balances(account_ids, wants_consistent_read(request.args, request.headers))
+    return jsonify(body), status
+
+def handle_balances(account_ids, consistent=False):
+    """
+    Framework independent body of the batch balance endpoint.
+
+    :return: response body and status code
+    :rtype: tuple
+    """
+    # Validates for an empty or malformed list of ids
+    if not account_ids or not isinstance(account_ids, list):
+        return {"error": "No account ids supplied"}, 400
+
+    # De-duplicate while keeping the requested order
+    account_ids = list(dict.fromkeys(str(account_id) for account_id in account_ids))
+    if len(account_ids) > BATCH_MAX_IDS:
+        return {"error": f"Too many account ids, maximum is {BATCH_MAX_IDS}"}, 400
+
+    results = {}
+    for account_id in account_ids:
+        # Same validation as the single balance endpoint
+        if not is_account_id(account_id):
+            results[account_id] = {"status": "invalid", "error": f"Invalid account id : {account_id}"}
+            continue
+
+        account = None if consistent else balance_cache.get(account_id)
+        if account is None:
+            results[account_id] = None
+        else:
+            results[account_id] = {"status": "ok", "current_balance": account["current_balance"]}
+
+    try:
+        items, unprocessed = storage.batch_get([a for a, r in results.items() if r is None], consistent)
+    except StorageError as e:
+        return {"error": str(e)}, e.status
     except ClientError as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
+
+    unprocessed = set(unprocessed)
+    for account_id, result in results.items():
+        if result is not None:
+            continue
+        if account_id in items:
+            results[account_id] = {
+                "status": "ok",
+                "current_balance": items[account_id]["current_balance"]
+            }
+        elif account_id in unprocessed:
+            results[account_id] = {"status": "error", "error": "Account lookup throttled, retry later"}
+        else:
+            results[account_id] = {"status": "not_found", "error": f"Account {account_id} not found"}
+
+    return {"results": results}, 200
 
 
 """
@@ -96,63 +555,115 @@ bank account.
 :param request body:
     - account_id(int): Account id of the bank account
     - amount(float) : Amount to be deposited to account
+:param Idempotency-Key: Optional header, retries with the same key replay the first response
 :return: returns bank information with the current balance 
 :rtype: dict
 :statuscode 200: Successfully deposited to the account
 :statuscode 400: Invalid payload/Invalid account id/Empty request body/Invalid amount
 :statuscode 404: Account not found
+:statuscode 422: Idempotency-Key reused with a different payload
 :statuscode 500: Internal server error
 """
 @app.route("/deposit", methods=["POST"])
 def deposit():
     try:
         # Validates for payload
-        data = request.get_json(force=True)
+        data = request_body()
     except Exception:
         return jsonify({"error": "Invalid JSON payload"}), 400
 
-    # Validates for empty requests
-    if not data:
-        return jsonify({"error": "Empty request body"}), 400
-    
-    # Retrieves account id
-    account_id = data.get("account_id")
+    body, status = idempotent("/deposit", request.headers.get("Idempotency-Key"), data, handle_deposit)
+    return jsonify(body), status, retry_headers(status)
 
-    # Validates if amount is float
-    amount = validate_amount(data.get("amount"))
+def handle_deposit(data):
+    """
+    Framework independent body of the deposit endpoint.
 
-    # Validates if account id is valid
-    if not account_id:
-        return jsonify({"error": "Invalid account_id"}), 400
-    
-    # Validates if amount is valid
-    if amount is None:
-        return jsonify({"error": "Invalid amount"}), 400
-                      
-    try:
-        # Validate if amount if less than zero
-        amount = Decimal(str(amount))
-        if amount <= 0:
-            raise ValueError
-    except (InvalidOperation, ValueError, TypeError):
-        return jsonify({"error": "Invalid amount"}), 400
-
-    try:
-        # Update the records in the DynamoDB
-        response = table.update_item(
-            Key={"account_id": account_id},
-            UpdateExpression="SET current_balance = current_balance + :val",
-            ExpressionAttributeValues={":val": amount},
-            ConditionExpression="attribute_exists(account_id)",
-            ReturnValues="ALL_NEW"
-        )
-    except ClientError as e:
-        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
-            return jsonify({"error": f"Account {account_id} not found"}), 404
-        else:
-            return jsonify({"error": "Internal server error"}), 500
-        
-    return jsonify(response["Attributes"])
+    :param dict data: parsed JSON payload
+    :return: response body and status code
+    :rtype: tuple
+    """
+    # Validates the account id and amount in one pass
+    values, error = ACCOUNT_WRITE.validate(data)
+    if error:
+        return {"error": error}, 400
+    account_id, amount = values["account_id"], values["amount"]
+
+    try:
+        item = storage.deposit(account_id, amount)
+    except StorageError as e:
+        return storage_error(account_id, e)
+    except ClientError:
+        return {"error": "Internal server error"}, 500
+
+    remember_write(account_id, item)
+    return select_fields(item, RESPONSE_FIELDS), 200
+
+
+def idempotent(route, key, data, handler):
+    """
+    Run handler(data) at most once per Idempotency-Key. Retries with
+    the same key and payload get the stored response, duplicates sent
+    while the first request runs wait for it.
+
+    :param str key: Idempotency-Key header, None runs the handler as is
+    :return: response body and status code
+    :rtype: tuple
+    """
+    if key is None:
+        return handler(data)
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX:
+        return {"error": "Invalid Idempotency-Key"}, 400
+
+    def run():
+        try:
+            body, status = handler(data)
+        except DeadlineExceeded as e:
+            # Raised before a write is sent, writes are never cut
+            raise NotApplied(error=e)
+        except BotoCoreError as e:
+            if never_sent(e):
+                raise NotApplied(error=e)
+            # A timed out write may have been applied, the retry the 503
+            # invites gets the same 503 rather than running it twice
+            return 503, app.json.dumps(UNAVAILABLE)
+        if status in NOT_APPLIED_STATUSES:
+            raise NotApplied(status, app.json.dumps(body))
+        # Stored encoded, so replays render exactly like the first response
+        return status, app.json.dumps(body)
+
+    try:
+        status, body = idempotency.execute(f"{route}:{key}", fingerprint(data), run)
+    except IdempotencyError as e:
+        return {"error": str(e)}, e.status
+    except ClientError:
+        return {"error": "Internal server error"}, 500
+    return json.loads(body), status
+
+
+def remember_write(account_id, item):
+    # Write the fresh item straight into the balance cache. An item that
+    # is no snapshot of the account only drops the cached one.
+    if isinstance(item, UncachedItem):
+        balance_cache.invalidate(account_id)
+    else:
+        balance_cache.put(account_id, item)
+
+def storage_error(account_id, error):
+    """
+    Turn a rejected storage operation into an error response, keeping
+    the balance cache in line with the item the storage returned.
+
+    :return: response body and status code
+    :rtype: tuple
+    """
+    # A transfer error names the account whose check failed
+    account_id = error.account_id or account_id
+    if error.item is not None:
+        balance_cache.put(account_id, error.item)
+    elif isinstance(error, AccountNotFound):
+        balance_cache.invalidate(account_id)
+    return {"error": str(error)}, error.status
 
 
 """
@@ -162,75 +673,418 @@ bank account.
 :param request body:
     - account_id(int): Account id of the bank account
     - amount(float) : Amount to be deposited to account
+:param Idempotency-Key: Optional header, retries with the same key replay the first response
 :return: returns bank information with the current balance 
 :rtype: dict
 :statuscode 200: Successfully withdrawn from account
-:statuscode 400: Invalid payload/Invalid account id/Empty request body/Invalid amount
+:statuscode 400: Invalid payload/Invalid account id/Empty request body/Invalid amount/Daily limit exceeded
 :statuscode 404: Account not found
+:statuscode 409: Insufficient balance
+:statuscode 422: Idempotency-Key reused with a different payload
 :statuscode 500: Internal server error
+:statuscode 503: Account busy after repeated concurrent updates
 """
 @app.route("/withdraw", methods=["POST"])
 def withdraw():
     try:
         # Validates for payload
-        data = request.get_json(force=True)
+        data = request_body()
     except Exception:
         return jsonify({"error": "Invalid JSON payload"}), 400
 
+    body, status = idempotent("/withdraw", request.headers.get("Idempotency-Key"), data, handle_withdraw)
+    return jsonify(body), status, retry_headers(status)
+
+def handle_withdraw(data):
+    """
+    Framework independent body of the withdraw endpoint.
+
+    :param dict data: parsed JSON payload
+    :return: response body and status code
+    :rtype: tuple
+    """
+    # Validates the account id and amount in one pass
+    values, error = ACCOUNT_WRITE.validate(data)
+    if error:
+        return {"error": error}, 400
+    account_id, amount = values["account_id"], values["amount"]
+
+    try:
+        item = storage.withdraw(account_id, amount)
+    except StorageError as e:
+        return storage_error(account_id, e)
+    except ClientError:
+        return {"error": "Internal server error"}, 500
+
+    remember_write(account_id, item)
+    return select_fields(item, RESPONSE_FIELDS), 200
+
+
+"""
+POST endpoint to move money between two bank accounts -
+in one atomic DynamoDB transaction.
+
+:param request body:
+    - from_account_id(int): Account id the amount is withdrawn from
+    - to_account_id(int): Account id the amount is deposited to
+    - amount(float) : Amount to be transferred
+    - transfers(list): Optional, many transfers of the above shape, -
+      each applied as its own transaction in the given order
+:param Idempotency-Key: Optional header, retries with the same key replay the first response
+:return: returns the transfer, or per transfer results for a batch
+:rtype: dict
+:statuscode 200: Successfully transferred (see per transfer status for a batch)
+:statuscode 400: Invalid payload/Invalid account id/Invalid amount/Daily limit exceeded/Too many transfers
+:statuscode 404: Account not found
+:statuscode 409: Insufficient balance
+:statuscode 422: Idempotency-Key reused with a different payload
+:statuscode 500: Internal server error
+:statuscode 503: Account busy after repeated concurrent updates
+"""
+@app.route("/transfer", methods=["POST"])
+def transfer():
+    try:
+        # Validates for payload
+        data = request_body()
+    except Exception:
+        return jsonify({"error": "Invalid JSON payload"}), 400
+
+    body, status = idempotent("/transfer", request.headers.get("Idempotency-Key"), data, handle_transfer)
+    return jsonify(body), status, retry_headers(status)
+
+def handle_transfer(data):
+    """
+    Framework independent body of the transfer endpoint.
+
+    :param dict data: parsed JSON payload
+    :return: response body and status code
+    :rtype: tuple
+    """
     # Validates for empty requests
-    if not data:
-        return jsonify({"error": "Empty request body"}), 400
-
-    account_id = data.get("account_id")
-    raw_amount = data.get("amount")
-    # daily_limit = data.get("daily_limit")
-    # daily_amount_withdrawn = data.get("amount_withdrawn")
-    # withdraw_flag = data.get("withdraw_flag")
-
-    # Validates if account is valid
-    if not account_id:
-        return jsonify({"error": "Invalid account_id"}), 400
-
-    try:
-        # Validate if amount if less than zero
-        amount = Decimal(str(raw_amount))
-        if amount <= 0:
-            raise InvalidOperation
-    except (InvalidOperation, TypeError):
-        return jsonify({"error": "Invalid amount"}), 400
-
-    try:
-
-        # Get current details from DDB
-        account = table.get_item(
-            Key={"account_id": account_id}
-        ).get("Item")
-
-        if not account:
-            return jsonify({"error": "Account not found"}), 404
-        
-        daily_limit = Decimal(str(account.get("daily_limit", 0)))
-        daily_amount_withdrawn = Decimal(str(account.get("daily_amount_withdrawn", 0)))
-        current_balance = Decimal(str(account.get("current_balance", 0)))
-
-        if daily_amount_withdrawn +  amount > daily_limit:
-            return jsonify({"error": "Daily limit exceeded"}), 400
-        
-        # Update the records in the DynamoDB
-        response = table.update_item(
-            Key={"account_id": account_id},
-            UpdateExpression="SET current_balance = current_balance - :val, daily_amount_withdrawn=if_not_exists(daily_amount_withdrawn, :zero) + :val",
-            ExpressionAttributeValues={":val": amount, ":zero": Decimal("0")},
-            ConditionExpression="attribute_exists(account_id) AND current_balance >= :val",
-            ReturnValues="ALL_NEW"
-        )
-    except ClientError as e:
-        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
-            return jsonify({"error": "Insufficient balance or account not found or daily limit exceeded"}), 404
-        else:
-            return jsonify({"error": "Internal server error"}), 500
+    if not data or not isinstance(data, dict):
+        return {"error": "Empty request body"}, 400
+
+    if "transfers" not in data:
+        return transfer_one(data)
+
+    transfers = data["transfers"]
+    if not transfers or not isinstance(transfers, list):
+        return {"error": "No transfers supplied"}, 400
+    if len(transfers) > TRANSFER_BATCH_MAX:
+        return {"error": f"Too many transfers, maximum is {TRANSFER_BATCH_MAX}"}, 400
+
+    results = []
+    for entry in transfers:
+        body, status = transfer_one(entry if isinstance(entry, dict) else {})
+        results.append(dict(body, status=status))
+    return {"results": results}, 200
+
+def transfer_one(data):
+    # Validates both account ids and the amount in one pass
+    values, error = TRANSFER.validate(data)
+    if error:
+        return {"error": error}, 400
+    source_id, destination_id, amount = values["from_account_id"], values["to_account_id"], values["amount"]
+
+    try:
+        storage.transfer(source_id, destination_id, amount)
+    except StorageError as e:
+        return storage_error(source_id, e)
+    except ClientError:
+        return {"error": "Internal server error"}, 500
+    except DeadlineExceeded:
+        # Reported per transfer, so a batch shows which ones were applied
+        return {"error": "Deadline exceeded"}, 504
+
+    # The transaction returns no items, drop both cached balances
+    balance_cache.invalidate(source_id)
+    balance_cache.invalidate(destination_id)
+    return {"from_account_id": source_id, "to_account_id": destination_id, "amount": amount}, 200
+
+
+"""
+GET endpoint to page through the transaction history -
+of the bank account, newest first.
+
+:param int account_id: The account number of bank account
+:param from: Optional ISO 8601 date or time, entries at or after it
+:param to: Optional ISO 8601 date or time, entries before it
+:param limit: Entries per page, capped at TRANSACTIONS_PAGE_MAX
+:param order: "desc" (default) or "asc"
+:param cursor: next_cursor of the previous page
+:return: ledger entries and the cursor of the next page, null on the last page
+:rtype: dict
+:statuscode 200: Successfully retrieved the page
+:statuscode 400: Invalid account id/Invalid limit/Invalid order/Invalid time range/Invalid cursor
+:statuscode 500: Internal server error
+:statuscode 501: Storage keeps no ledger
+"""
+@app.route("/transactions/<account_id>", methods=["GET"])
+def get_transactions(account_id):
+    body, status = handle_transactions(account_id, request.args)
+    return jsonify(body), status
+
+def parse_timestamp(value):
+    # ISO 8601 date or time as a ledger timestamp, naive values are UTC
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=UTC)
+    return ledger_timestamp(moment)
+
+def parse_time_range(args):
+    """
+    Ledger bounds of the from/to query parameters.
+
+    :return: start and end ledger timestamps, None when not given
+    :rtype: tuple
+    :raises ValueError: unparsable bounds or from not before to
+    """
+    start = parse_timestamp(args["from"]) if args.get("from") else None
+    end = parse_timestamp(args["to"]) if args.get("to") else None
+    if start is not None and end is not None and start >= end:
+        raise ValueError("Invalid time range")
+    return start, end
+
+def handle_transactions(account_id, args):
+    """
+    Framework independent body of the transaction history endpoint.
+
+    :param args: query string mapping of the request
+    :return: response body and status code
+    :rtype: tuple
+    """
+    # Validate if account id is in digits
+    if not is_account_id(account_id):
+        return {"error": f"Invalid account id : {account_id}"}, 400
+
+    try:
+        limit = int(args.get("limit", TRANSACTIONS_PAGE_SIZE))
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return {"error": "Invalid limit"}, 400
+    limit = min(limit, TRANSACTIONS_PAGE_MAX)
+
+    order = args.get("order", "desc").lower()
+    if order not in ("asc", "desc"):
+        return {"error": "Invalid order"}, 400
+
+    try:
+        start, end = parse_time_range(args)
+    except ValueError:
+        return {"error": "Invalid time range"}, 400
+
+    try:
+        entries, cursor = storage.history(
+            account_id, start, end, limit, args.get("cursor") or None, newest_first=order == "desc")
+    except StorageError as e:
+        return {"error": str(e)}, e.status
+    except ClientError:
+        return {"error": "Internal server error"}, 500
+
+    return {"account_id": account_id, "transactions": entries, "next_cursor": cursor}, 200
+
+
+"""
+GET endpoint to export the full statement of the -
+bank account, oldest entry first, streamed.
+
+:param int account_id: The account number of bank account
+:param format: "ndjson" (default) or "csv"
+:param from: Optional ISO 8601 date or time, entries at or after it
+:param to: Optional ISO 8601 date or time, entries before it
+:return: one ledger entry with its running balance per line, NDJSON -
+    statements end with a summary line
+:rtype: application/x-ndjson or text/csv
+:statuscode 200: Statement streamed
+:statuscode 400: Invalid account id/Invalid format/Invalid time range
+:statuscode 404: Account not found
+:statuscode 500: Internal server error
+:statuscode 501: Storage keeps no ledger
+"""
+@app.route("/statement/<account_id>", methods=["GET"])
+def get_statement(account_id):
+    body, status, content_type = handle_statement(account_id, request.args)
+    if status != 200:
+        return jsonify(body), status
+    return Response(body, status=status, mimetype=content_type, headers={
+        "Content-Disposition": f"attachment; filename=statement-{account_id}.{request.args.get('format', 'ndjson').lower()}"
+    })
+
+def handle_statement(account_id, args):
+    """
+    Framework independent body of the statement endpoint. The request
+    is validated and the first page read before anything is streamed,
+    so errors still get their status code.
+
+    :param args: query string mapping of the request
+    :return: byte chunks or error body, status code and content type
+    :rtype: tuple
+    """
+    # Validate if account id is in digits
+    if not is_account_id(account_id):
+        return {"error": f"Invalid account id : {account_id}"}, 400, None
+
+    fmt = args.get("format", "ndjson").lower()
+    if fmt not in STATEMENT_FORMATS:
+        return {"error": "Invalid format"}, 400, None
+
+    try:
+        start, end = parse_time_range(args)
+    except ValueError:
+        return {"error": "Invalid time range"}, 400, None
+
+    try:
+        first_page = storage.history(account_id, start, end, STATEMENT_PAGE_SIZE, newest_first=False)
+        if not first_page[0] and storage.get(account_id) is None:
+            return {"error": f"Account {account_id} not found"}, 404, None
+    except StorageError as e:
+        return {"error": str(e)}, e.status, None
+    except ClientError:
+        return {"error": "Internal server error"}, 500, None
+
+    entries = iter_ledger(storage, account_id, start, end, STATEMENT_PAGE_SIZE,
+                          executor=statement_executor, first_page=first_page)
+    chunks = render_statement(entries, fmt, app.json.dumps, STATEMENT_CHUNK_BYTES)
+    return chunks, 200, STATEMENT_FORMATS[fmt]
+
+
+"""
+Admin endpoint reporting aggregates over every account: total -
+balance, today's withdrawals and their distribution, and the -
+accounts near their daily limit. The table is read with a parallel -
+Scan kept within the REPORT_READ_CAPACITY budget.
+
+:param segments: Parallel scan segments, capped at REPORT_MAX_SEGMENTS
+:param near: Share of the daily limit from which an account counts as near it
+:param buckets: Comma separated upper bounds of the withdrawn distribution
+:return: NDJSON lines of partial aggregates while the scan runs, the -
+    last line is the full report ("partial": false)
+:rtype: application/x-ndjson
+:statuscode 200: Report streamed
+:statuscode 400: Invalid segments/near/buckets
+"""
+@app.route("/admin/report", methods=["GET"])
+def get_report():
+    body, status, content_type = handle_report(request.args)
+    if status != 200:
+        return jsonify(body), status
+    return Response(body, status=status, mimetype=content_type)
+
+def handle_report(args):
+    """
+    Framework independent body of the report endpoint.
+
+    :param args: query string mapping of the request
+    :return: byte lines or error body, status code and content type
+    :rtype: tuple
+    """
+    try:
+        segments = int(args.get("segments", REPORT_SEGMENTS))
+        near_limit = float(args.get("near", "0.8"))
+    except ValueError:
+        return {"error": "Invalid report parameters"}, 400, None
+    try:
+        buckets = parse_buckets(args["buckets"]) if "buckets" in args else WITHDRAWN_BUCKETS
+    except ValueError as e:
+        return {"error": str(e)}, 400, None
+    if not 1 <= segments <= REPORT_MAX_SEGMENTS:
+        return {"error": f"Segments must be between 1 and {REPORT_MAX_SEGMENTS}"}, 400, None
+    if not 0 < near_limit <= 1:
+        return {"error": "Near must be above 0 and at most 1"}, 400, None
+
+    reports = run_report(storage, segments, REPORT_READ_CAPACITY, REPORT_PAGE_SIZE,
+                         near_limit, buckets, REPORT_PROGRESS_SECONDS)
+
+    def lines():
+        try:
+            for report in reports:
+                yield (app.json.dumps(report) + "\n").encode()
+        except (ClientError, BotoCoreError):
+            # The status line is sent already, the error ends the stream
+            yield (app.json.dumps({"partial": False, "error": "Internal server error"}) + "\n").encode()
+
+    return lines(), 200, "application/x-ndjson"
+
+
+"""
+Admin endpoint of the sampling profiler, shared by the worker processes. -
+GET returns the sample rate and the routes profiled so far, POST sets the -
+rate and DELETE drops the profiles collected.
+
+:body rate: Share of requests profiled from 0 (off) to 1
+:return: sample rate and profiled requests and seconds per route
+:rtype: dict
+:statuscode 200: Profiler settings
+:statuscode 400: Invalid rate
+"""
+@app.route("/admin/profile", methods=["GET", "POST", "DELETE"])
+def profile_settings():
+    try:
+        data = request_body() if request.method == "POST" else None
+    except ValueError:
+        return jsonify({"error": "Invalid JSON payload"}), 400
+    body, status = handle_profile_settings(request.method, data)
+    return jsonify(body), status
+
+def handle_profile_settings(method, data=None):
+    """
+    Framework independent body of the profiler settings endpoint.
+
+    :return: response body and status code
+    :rtype: tuple
+    """
+    if method == "POST":
+        if not isinstance(data, dict) or isinstance(data.get("rate"), (bool, str)):
+            return {"error": "Invalid rate"}, 400
+        try:
+            profiler.set_rate(data.get("rate"))
+        except (TypeError, ValueError):
+            return {"error": "Invalid rate"}, 400
+    elif method == "DELETE":
+        profiler.reset()
+    routes = profiler.routes()
+    return {"rate": profiler.rate, "routes": routes}, 200
+
+"""
+Download the profiles of every worker process, of one route or of -
+every route. pstats files open with "python -m pstats" or snakeviz, -
+collapsed stacks with flamegraph.pl or speedscope.
+
+:param format: pstats (default) or collapsed
+:param route: Method and route template, e.g. "GET /balance/<account_id>"
+:return: profile file
+:statuscode 200: Profile file
+:statuscode 400: Invalid format
+:statuscode 404: Nothing profiled for the route yet
+"""
+@app.route("/admin/profile/download", methods=["GET"])
+def profile_download():
+    body, status, content_type = handle_profile_download(request.args)
+    if status != 200:
+        return jsonify(body), status
+    filename = PROFILE_FORMATS[request.args.get("format", "pstats")][1]
+    return Response(body, status=status, mimetype=content_type, headers={
+        "Content-Disposition": f"attachment; filename={filename}"
+    })
+
+def handle_profile_download(args):
+    """
+    Framework independent body of the profile download endpoint.
+
+    :param args: query string mapping of the request
+    :return: file contents or error body, status code and content type
+    :rtype: tuple
+    """
+    fmt = args.get("format", "pstats")
+    if fmt not in PROFILE_FORMATS:
+        return {"error": "Invalid format"}, 400, None
 
-    return jsonify(response["Attributes"])
+    route = args.get("route")
+    body = profiler.pstats(route) if fmt == "pstats" else profiler.collapsed(route)
+    if body is None:
+        return {"error": "No profiled requests"}, 404, None
+    return body, 200, PROFILE_FORMATS[fmt][0]
 
 
 if __name__ == "__main__":
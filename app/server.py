@@ -0,0 +1,72 @@
+import os
+import multiprocessing
+from gunicorn.app.base import BaseApplication
+
+# Production entrypoint of the web application.
+#
+# Runs the Flask app (or the ASGI app with WEB_APP=asgi) under gunicorn
+# with pre-forked worker processes instead of Werkzeug's development
+# server. SIGTERM, which ECS sends when stopping a task, makes gunicorn
+# stop accepting connections and lets in-flight requests finish within
+# WEB_GRACEFUL_TIMEOUT seconds before the workers exit.
+
+def post_fork(server, worker):
+    # Each worker builds its own DynamoDB connections instead of
+    # inheriting the ones created when the app was preloaded in the
+    # master, and opens some before it accepts requests
+    from app import main
+    main.init_storage()
+    main.storage.warm()
+    main.credentials.prefetch()
+
+def build_options(env=os.environ):
+    """
+    Build the gunicorn settings from environment variables.
+
+    :return: gunicorn settings
+    :rtype: dict
+    """
+    asgi = env.get("WEB_APP", "wsgi") == "asgi"
+    return {
+        "bind": env.get("WEB_BIND", "0.0.0.0:80"),  # nosec B104
+        "workers": int(env.get("WEB_WORKERS", multiprocessing.cpu_count())),
+        "threads": int(env.get("WEB_THREADS", "8")),
+        "worker_class": "uvicorn.workers.UvicornWorker" if asgi else "gthread",
+        # Longer than the ALB idle timeout (60s) so the load balancer,
+        # not the worker, closes idle keep-alive connections
+        "keepalive": int(env.get("WEB_KEEPALIVE", "75")),
+        "backlog": int(env.get("WEB_BACKLOG", "2048")),
+        "timeout": int(env.get("WEB_TIMEOUT", "30")),
+        # Below the ECS stopTimeout (30s) so draining finishes before SIGKILL
+        "graceful_timeout": int(env.get("WEB_GRACEFUL_TIMEOUT", "25")),
+        "max_requests": int(env.get("WEB_MAX_REQUESTS", "0")),
+        "max_requests_jitter": int(env.get("WEB_MAX_REQUESTS_JITTER", "0")),
+        "preload_app": True,
+        "accesslog": env.get("WEB_ACCESS_LOG", "-"),
+        "post_fork": post_fork,
+    }
+
+class Server(BaseApplication):
+
+    def __init__(self, options, asgi=False):
+        self.options = options
+        self.asgi = asgi
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        if self.asgi:
+            from app.asgi import api
+            return api
+        from app.main import app
+        return app
+
+def run():
+    Server(build_options(), asgi=os.getenv("WEB_APP", "wsgi") == "asgi").run()
+
+
+if __name__ == "__main__":
+    run()
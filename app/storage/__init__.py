@@ -0,0 +1,109 @@
+import os
+from decimal import Decimal
+from app.storage.base import (
+    AccountStorage, StorageError, AccountNotFound, InsufficientBalance,
+    DailyLimitExceeded, AccountBusy, InvalidTransfer, InvalidCursor, LedgerUnavailable
+)
+
+
+def build_storage(backend=None):
+    """
+    Create the account storage selected by STORAGE_BACKEND: dynamodb
+    (default), memory or sqlite (file from SQLITE_PATH). Deposits are
+    coalesced per account when DEPOSIT_COALESCE_WINDOW_MS is above 0.
+    """
+    storage = _build_backend(backend or os.getenv("STORAGE_BACKEND", "dynamodb"))
+
+    window_ms = float(os.getenv("DEPOSIT_COALESCE_WINDOW_MS", "0"))
+    if window_ms > 0:
+        from app.storage.coalescing import CoalescingStorage
+        storage = CoalescingStorage(
+            storage,
+            window=window_ms / 1000,
+            max_batch=int(os.getenv("DEPOSIT_COALESCE_MAX_BATCH", "64"))
+        )
+    return storage
+
+
+def build_dynamodb_pool():
+    """
+    Create the DynamoDB connection pool of this process from the DDB_*
+    connection settings.
+    """
+    from app.storage.connections import DynamoDBPool, client_config
+    return DynamoDBPool(
+        region_name=os.getenv("AWS_REGION", "ap-southeast-1"),
+        size=int(os.getenv("DDB_MAX_POOL_CONNECTIONS", "50")),
+        timeout=float(os.getenv("DDB_POOL_TIMEOUT", "5")),
+        config=client_config(
+            connect_timeout=float(os.getenv("DDB_CONNECT_TIMEOUT", "2")),
+            read_timeout=float(os.getenv("DDB_READ_TIMEOUT", "5")),
+            tcp_keepalive=os.getenv("DDB_TCP_KEEPALIVE", "true").lower() == "true",
+            retry_mode=os.getenv("DDB_RETRY_MODE", "adaptive"),
+            max_attempts=int(os.getenv("DDB_MAX_ATTEMPTS", "3"))
+        )
+    )
+
+
+def build_hedging():
+    """
+    Create the hedged reads of account lookups when HEDGE_READS is
+    true, from the HEDGE_* settings.
+    """
+    if os.getenv("HEDGE_READS", "false").lower() != "true":
+        return None
+    from app.storage.hedging import HedgedReads
+    return HedgedReads(
+        "get_item",
+        percentile=float(os.getenv("HEDGE_PERCENTILE", "95")),
+        min_delay=float(os.getenv("HEDGE_MIN_DELAY_MS", "5")) / 1000,
+        max_delay=float(os.getenv("HEDGE_MAX_DELAY_MS", "500")) / 1000,
+        workers=int(os.getenv("HEDGE_WORKERS", "32")),
+        budget=float(os.getenv("HEDGE_BUDGET", "0.05"))
+    )
+
+
+def _build_backend(backend):
+    # Daily withdrawal counters restart at midnight of this timezone
+    timezone = os.getenv("DAILY_LIMIT_TIMEZONE", "UTC")
+
+    if backend == "memory":
+        from app.storage.memory import MemoryStorage
+        return MemoryStorage(timezone=timezone)
+
+    if backend == "sqlite":
+        from app.storage.sqlite import SQLiteStorage
+        return SQLiteStorage(os.getenv("SQLITE_PATH", "accounts.db"), timezone=timezone)
+
+    if backend == "dynamodb":
+        from app.storage.dynamodb import DynamoDBStorage
+        return DynamoDBStorage(
+            # Set the DyanmoDB table to Accounts
+            table_name=os.getenv("DDB_TABLE", "Accounts"),
+            # default region set to Singapore
+            region_name=os.getenv("AWS_REGION", "ap-southeast-1"),
+            batch_workers=int(os.getenv("BATCH_GET_WORKERS", "8")),
+            batch_max_retries=int(os.getenv("BATCH_GET_MAX_RETRIES", "5")),
+            withdraw_max_attempts=int(os.getenv("WITHDRAW_MAX_ATTEMPTS", "3")),
+            daily_limit_memo_size=int(os.getenv("DAILY_LIMIT_MEMO_SIZE", "100000")),
+            timezone=timezone,
+            ledger_table=os.getenv("LEDGER_TABLE") or None,
+            pool=build_dynamodb_pool(),
+            warm_connections=int(os.getenv("DDB_POOL_WARM", "4")),
+            hedging=build_hedging()
+        )
+
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def seed_accounts(storage, count, balance="10000", daily_limit="5000"):
+    """
+    Create accounts "1".."count" for local load and capacity tests.
+    """
+    for account_id in range(1, count + 1):
+        storage.put({
+            "account_id": str(account_id),
+            "current_balance": Decimal(balance),
+            "daily_limit": Decimal(daily_limit),
+            "daily_amount_withdrawn": Decimal("0")
+        })
@@ -0,0 +1,342 @@
+import json
+import uuid
+import base64
+from datetime import datetime
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+
+UTC = ZoneInfo("UTC")
+
+# Ledger entry types, the debits take money out of the account
+DEPOSIT, WITHDRAW, TRANSFER_IN, TRANSFER_OUT = "deposit", "withdraw", "transfer_in", "transfer_out"
+DEBITS = (WITHDRAW, TRANSFER_OUT)
+
+
+class StorageError(Exception):
+    """
+    Base of the errors an account storage raises for a rejected
+    operation. Each carries the HTTP status the API answers with, the
+    account it concerns and, when known, the current item of it.
+    """
+    status = 500
+
+    def __init__(self, message, item=None, account_id=None):
+        super().__init__(message)
+        self.item = item
+        self.account_id = account_id
+
+
+class AccountNotFound(StorageError):
+    status = 404
+
+
+class InsufficientBalance(StorageError):
+    status = 409
+
+
+class DailyLimitExceeded(StorageError):
+    status = 400
+
+
+class AccountBusy(StorageError):
+    status = 503
+
+
+class InvalidTransfer(StorageError):
+    status = 400
+
+
+class InvalidCursor(StorageError):
+    status = 400
+
+
+class LedgerUnavailable(StorageError):
+    status = 501
+
+
+class UncachedItem(dict):
+    """
+    Account item returned by a write that is not a snapshot of the
+    account at its version, e.g. a balance summed from the last known
+    state of other shards. It is returned to the caller, but must not be
+    put in a read cache, where it would be served under a version that
+    belongs to another balance.
+    """
+
+
+def to_decimal(value):
+    return Decimal(str(value if value is not None else 0))
+
+def encode_item(item):
+    # DynamoDB wire format keeps Decimal values exact
+    return json.dumps({k: serializer.serialize(v) for k, v in item.items()})
+
+def decode_item(raw):
+    return {k: deserializer.deserialize(v) for k, v in json.loads(raw).items()}
+
+def business_date(zone):
+    # Date the daily withdrawal counters are kept for, e.g. "2024-06-30"
+    return datetime.now(zone).date().isoformat()
+
+def withdrawn_on(item, today):
+    """
+    Amount withdrawn from item on today. The counter belongs to the
+    date in withdrawal_date, a counter of an earlier day (or of no
+    recorded day) has expired and counts as 0.
+    """
+    if item.get("withdrawal_date") != today:
+        return Decimal("0")
+    return to_decimal(item.get("daily_amount_withdrawn"))
+
+def check_withdraw(account_id, item, amount, today):
+    """
+    Raise the error a withdrawal of amount from item fails with. A
+    missing daily_limit is treated as 0, as in the DynamoDB condition.
+    """
+    if item is None:
+        raise AccountNotFound(f"Account {account_id} not found", account_id=account_id)
+
+    if to_decimal(item.get("current_balance")) < amount:
+        raise InsufficientBalance("Insufficient balance", item=item, account_id=account_id)
+
+    daily_limit = to_decimal(item.get("daily_limit"))
+    if withdrawn_on(item, today) + amount > daily_limit:
+        raise DailyLimitExceeded("Daily limit exceeded", item=item, account_id=account_id)
+
+def next_version(item):
+    # Every balance change bumps the version of the item, items written
+    # before versions were kept start at 0
+    return to_decimal(item.get("version")) + 1
+
+def apply_deposit(account_id, item, amount):
+    """
+    Deposit amount into a copy of item, with the same conditions as the
+    DynamoDB update. Used by the engines that update items in Python.
+    """
+    if item is None:
+        raise AccountNotFound(f"Account {account_id} not found", account_id=account_id)
+
+    item = dict(item)
+    item["current_balance"] = to_decimal(item.get("current_balance")) + amount
+    item["version"] = next_version(item)
+    return item
+
+def check_transfer(source_id, destination_id):
+    if source_id == destination_id:
+        raise InvalidTransfer("Cannot transfer to the same account", account_id=source_id)
+
+def apply_withdraw(account_id, item, amount, today):
+    check_withdraw(account_id, item, amount, today)
+
+    # The first withdrawal of a day restarts the counter
+    withdrawn = withdrawn_on(item, today)
+    item = dict(item)
+    item["current_balance"] = to_decimal(item.get("current_balance")) - amount
+    item["daily_amount_withdrawn"] = withdrawn + amount
+    item["withdrawal_date"] = today
+    item["version"] = next_version(item)
+    return item
+
+def ledger_timestamp(moment):
+    # Sortable UTC timestamp, e.g. "2024-06-30T08:15:00.000000Z"
+    return moment.astimezone(UTC).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+def ledger_entry(account_id, kind, amount, balance, counterparty=None):
+    """
+    Ledger item of one balance change. Entries of an account sort by
+    entry_id in time order, the random suffix keeps ids unique.
+    """
+    created_at = ledger_timestamp(datetime.now(UTC))
+    entry = {
+        "account_id": account_id,
+        "entry_id": f"{created_at}#{uuid.uuid4().hex[:12]}",
+        "type": kind,
+        "amount": amount,
+        "balance_after": balance,
+        "created_at": created_at
+    }
+    if counterparty is not None:
+        entry["counterparty"] = counterparty
+    return entry
+
+def encode_cursor(key):
+    # Opaque pagination cursor of a ledger key
+    raw = json.dumps({"account_id": key["account_id"], "entry_id": key["entry_id"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor, account_id):
+    """
+    :return: ledger key the next page starts after
+    :raises InvalidCursor: cursor is malformed or of another account
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        key = None
+    if (not isinstance(key, dict) or key.get("account_id") != account_id
+            or not isinstance(key.get("entry_id"), str)):
+        raise InvalidCursor("Invalid cursor", account_id=account_id)
+    return {"account_id": account_id, "entry_id": key["entry_id"]}
+
+def page_entries(entries, start=None, end=None, limit=50, cursor=None, newest_first=True):
+    """
+    One history page of an account's ledger entries held in Python,
+    with the same semantics as the DynamoDB Query: entries in [start,
+    end), in entry_id order, after the cursor.
+
+    :return: entries and the cursor of the next page, or None
+    :rtype: tuple
+    """
+    entries = sorted(entries, key=lambda e: e["entry_id"], reverse=newest_first)
+    if start is not None:
+        entries = [e for e in entries if e["entry_id"] >= start]
+    if end is not None:
+        entries = [e for e in entries if e["entry_id"] < end]
+    if cursor is not None:
+        after = cursor["entry_id"]
+        entries = [e for e in entries if (e["entry_id"] < after if newest_first else e["entry_id"] > after)]
+
+    page = entries[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(entries) > limit else None
+    return page, next_cursor
+
+def apply_change(item, change, today):
+    """
+    Apply an (account_id, kind, amount, counterparty) change to a copy
+    of item, as a withdrawal for the debit kinds and a deposit otherwise.
+    """
+    account_id, kind, amount, _ = change
+    if kind in DEBITS:
+        return apply_withdraw(account_id, item, amount, today)
+    return apply_deposit(account_id, item, amount)
+
+def daily_allowance(item, today):
+    # What is left of the daily limit of item on today
+    return max(to_decimal(item.get("daily_limit")) - withdrawn_on(item, today), Decimal("0"))
+
+
+class AccountStorage:
+    """
+    Interface of the account storage backends. Items are dicts of the
+    same shape as the DynamoDB Accounts table, numbers as Decimal.
+
+    Daily withdrawals are counted per date of the storage's timezone.
+    """
+    timezone = ZoneInfo("UTC")
+
+    # Deposits one deposit_many call can apply, None for no limit
+    deposit_batch_limit = None
+
+    def today(self):
+        """Date the daily withdrawal counters are kept for."""
+        return business_date(self.timezone)
+
+    def warm(self):
+        """Open connections before the first request, if the backend has any."""
+
+    def get(self, account_id, consistent=False):
+        """
+        :return: account item or None when it does not exist
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def batch_get(self, account_ids, consistent=False):
+        """
+        :return: found items keyed by account id and the ids left unprocessed
+        :rtype: tuple
+        """
+        items = {}
+        for account_id in account_ids:
+            item = self.get(account_id, consistent)
+            if item is not None:
+                items[account_id] = item
+        return items, []
+
+    def put(self, item):
+        """Create or replace an account item."""
+        raise NotImplementedError
+
+    def put_many(self, items):
+        """
+        Create or replace many account items, e.g. for a bulk import.
+
+        :return: items that could not be written
+        :rtype: list
+        """
+        for item in items:
+            self.put(item)
+        return []
+
+    def deposit(self, account_id, amount):
+        """
+        :return: updated account item
+        :rtype: dict
+        :raises AccountNotFound: account does not exist
+        """
+        raise NotImplementedError
+
+    def deposit_many(self, account_id, amounts):
+        """
+        Apply deposits to one account with a single write, e.g. a
+        coalesced batch. A storage keeping a ledger records an entry per
+        deposit; this default, for storage without one, deposits the sum.
+
+        :return: account item after the last deposit
+        :rtype: dict
+        :raises AccountNotFound: account does not exist
+        """
+        return self.deposit(account_id, sum(amounts))
+
+    def withdraw(self, account_id, amount):
+        """
+        :return: updated account item
+        :rtype: dict
+        :raises AccountNotFound: account does not exist
+        :raises InsufficientBalance: balance below amount
+        :raises DailyLimitExceeded: withdrawal above the daily limit
+        """
+        raise NotImplementedError
+
+    def transfer(self, source_id, destination_id, amount):
+        """
+        Withdraw amount from source_id and deposit it to destination_id
+        atomically, with the conditions of withdraw() and deposit().
+
+        :raises InvalidTransfer: source and destination are the same account
+        :raises StorageError: as withdraw() for the source and deposit() for the destination
+        """
+        raise NotImplementedError
+
+    def scan(self, segments=1, read_capacity=0, page_size=1000):
+        """
+        Read every account item, in pages and in no particular order,
+        for reports. Items carry at least account_id, current_balance,
+        daily_limit, daily_amount_withdrawn and withdrawal_date. The
+        shard items of a sharded account are included, marked with
+        shard_of and holding only current_balance.
+
+        :param int segments: Parts of the table read in parallel
+        :param float read_capacity: Read capacity units per second the scan may use, 0 for no limit
+        :return: generator of item lists
+        """
+        raise NotImplementedError
+
+    def history(self, account_id, start=None, end=None, limit=50, cursor=None, newest_first=True):
+        """
+        One page of the ledger of an account, entries with an entry_id
+        in [start, end).
+
+        :param str start: Lower bound, a ledger timestamp
+        :param str end: Upper bound (exclusive), a ledger timestamp
+        :param str cursor: next_cursor of the previous page
+        :return: ledger entries and the cursor of the next page, or None
+        :rtype: tuple
+        :raises InvalidCursor: cursor is malformed or of another account
+        :raises LedgerUnavailable: the storage keeps no ledger
+        """
+        raise LedgerUnavailable("Transaction history is not enabled", account_id=account_id)
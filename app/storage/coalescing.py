@@ -0,0 +1,129 @@
+import threading
+from app.storage.base import AccountStorage, UncachedItem
+from app.utils.metrics import registry
+
+deposit_batch_size = registry.histogram(
+    "deposit_batch_size", "Deposits applied by one coalesced storage write.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+deposits_coalesced = registry.counter(
+    "deposits_coalesced_total", "Deposits that rode on another request's storage write.")
+
+
+class _Batch:
+    """Deposits to one account waiting for a single write."""
+
+    def __init__(self):
+        self.amounts = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.item = None
+        self.error = None
+
+    def result(self, index):
+        # The write returns the balance after the whole batch, each
+        # depositor sees it as if the deposits were applied in order.
+        # Only the last one is the item at its version, the balances
+        # before it never existed under any version and are not cached.
+        if index == len(self.amounts) - 1:
+            return self.item
+        if "current_balance" not in self.item:
+            # The write committed but its balance is unknown, e.g. a
+            # sharded account whose other shards could not be read
+            return UncachedItem(self.item)
+        item = UncachedItem(self.item)
+        item["current_balance"] = item["current_balance"] - sum(self.amounts[index + 1:])
+        return item
+
+
+class CoalescingStorage(AccountStorage):
+    """
+    Group commit for deposits. The first deposit to an account opens a
+    batch and waits up to window seconds, or until max_batch deposits
+    joined, then applies them with one storage deposit_many. A storage
+    keeping a ledger still records an entry per deposit. Every
+    depositor gets the item with the balance right after its own
+    deposit, or the error of the shared write.
+
+    Other operations go straight to the wrapped storage.
+
+    :param storage: AccountStorage the writes are applied to
+    :param float window: Seconds a batch stays open
+    :param int max_batch: Deposits that close a batch early
+    """
+
+    def __init__(self, storage, window=0.002, max_batch=64):
+        self.storage = storage
+        self.window = window
+        # A batch never takes more deposits than one write of the storage can
+        self.max_batch = min(max_batch, storage.deposit_batch_limit or max_batch)
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Keep backend attributes, e.g. the DynamoDB table, reachable
+        return getattr(self.storage, name)
+
+    def today(self):
+        return self.storage.today()
+
+    def warm(self):
+        self.storage.warm()
+
+    def get(self, account_id, consistent=False):
+        return self.storage.get(account_id, consistent)
+
+    def batch_get(self, account_ids, consistent=False):
+        return self.storage.batch_get(account_ids, consistent)
+
+    def put(self, item):
+        self.storage.put(item)
+
+    def put_many(self, items):
+        return self.storage.put_many(items)
+
+    def withdraw(self, account_id, amount):
+        return self.storage.withdraw(account_id, amount)
+
+    def transfer(self, source_id, destination_id, amount):
+        return self.storage.transfer(source_id, destination_id, amount)
+
+    def history(self, account_id, start=None, end=None, limit=50, cursor=None, newest_first=True):
+        return self.storage.history(account_id, start, end, limit, cursor, newest_first)
+
+    def scan(self, segments=1, read_capacity=0, page_size=1000):
+        return self.storage.scan(segments, read_capacity, page_size)
+
+    def deposit(self, account_id, amount):
+        with self._lock:
+            batch = self._open.get(account_id)
+            leader = batch is None
+            if leader:
+                batch = self._open[account_id] = _Batch()
+            index = len(batch.amounts)
+            batch.amounts.append(amount)
+            if len(batch.amounts) >= self.max_batch:
+                del self._open[account_id]
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open.get(account_id) is batch:
+                    del self._open[account_id]
+            self._commit(account_id, batch)
+        else:
+            deposits_coalesced.inc()
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.result(index)
+
+    def _commit(self, account_id, batch):
+        deposit_batch_size.observe(len(batch.amounts))
+        try:
+            batch.item = self.storage.deposit_many(account_id, batch.amounts)
+        except Exception as e:
+            batch.error = e
+        finally:
+            batch.done.set()
@@ -0,0 +1,264 @@
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ConnectionError as BotoConnectionError
+from app.utils import deadline
+from app.utils.deadline import DeadlineExceeded
+from app.utils.metrics import registry, INSTRUMENTED_OPERATIONS
+
+dynamodb_pool_connections = registry.gauge(
+    "dynamodb_pool_connections", "DynamoDB connections opened by the pool.")
+dynamodb_pool_in_use = registry.gauge(
+    "dynamodb_pool_in_use", "DynamoDB connections leased to a call.")
+dynamodb_pool_waits = registry.counter(
+    "dynamodb_pool_waits_total", "DynamoDB calls that waited for a connection because the pool was saturated.")
+dynamodb_pool_wait_duration = registry.histogram(
+    "dynamodb_pool_wait_seconds", "Time DynamoDB calls waited for a free connection.")
+
+
+# Read operations botocore stops retrying once the request deadline is
+# spent. A write is never abandoned after it was sent, since a retried
+# write may already have been applied.
+READ_OPERATIONS = {
+    "GetItem": "get_item", "BatchGetItem": "batch_get_item", "Query": "query",
+    "Scan": "scan", "TransactGetItems": "transact_get_items"
+}
+READ_METHODS = frozenset(READ_OPERATIONS.values())
+
+
+class PoolTimeout(BotoCoreError):
+    fmt = "Timed out waiting for a DynamoDB connection"
+
+
+def never_sent(error):
+    """
+    Whether a botocore error proves the call never reached DynamoDB:
+    no pooled connection, or no connection made by any attempt. botocore
+    also retries after read timeouts, so a connect error following an
+    attempt that was sent proves nothing.
+    """
+    if isinstance(error, PoolTimeout):
+        return True
+    return isinstance(error, BotoConnectionError) and not getattr(error, "after_sent", False)
+
+
+def client_config(connect_timeout=2.0, read_timeout=5.0, tcp_keepalive=True, retry_mode="adaptive", max_attempts=3):
+    """
+    botocore settings of the pooled clients. Each client serves one call
+    at a time, so it keeps a single connection.
+    """
+    return Config(
+        max_pool_connections=1,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        tcp_keepalive=tcp_keepalive,
+        retries={"mode": retry_mode, "max_attempts": max_attempts}
+    )
+
+
+class _Connection:
+    """A DynamoDB resource with its own session, client and tables."""
+
+    def __init__(self, region_name, config):
+        # boto3 sessions and resources are not thread-safe, so nothing
+        # here is shared with another connection
+        self.resource = boto3.session.Session().resource("dynamodb", region_name=region_name, config=config)
+        self._tables = {}
+
+        # before-send runs ahead of every attempt, retries included
+        events = self.resource.meta.client.meta.events
+        for operation, name in READ_OPERATIONS.items():
+            events.register(f"before-send.dynamodb.{operation}", _deadline_check(name))
+        events.register("response-received.dynamodb", _track_sent)
+
+    def target(self, kind, name=None):
+        if kind == "table":
+            table = self._tables.get(name)
+            if table is None:
+                table = self._tables[name] = self.resource.Table(name)
+            return table
+        if kind == "client":
+            return self.resource.meta.client
+        return self.resource
+
+
+def _track_sent(exception=None, context=None, **kwargs):
+    # Runs after every attempt, the context is shared by the attempts of
+    # one call. Any outcome but a failed connection may have reached
+    # DynamoDB, a later connect error is marked for never_sent.
+    if context is None:
+        return
+    if isinstance(exception, BotoConnectionError):
+        if context.get("attempt_sent"):
+            exception.after_sent = True
+    else:
+        context["attempt_sent"] = True
+
+def _deadline_check(name):
+    def check(**kwargs):
+        deadline.check(name)
+    return check
+
+
+class DynamoDBPool:
+    """
+    Bounded pool of DynamoDB connections. A call leases a connection for
+    its duration, so at most size calls run at once per process and the
+    others wait, up to timeout seconds, for one to be returned.
+    Connections are opened on first need and reused last in, first out
+    to keep the warmest sockets busy.
+
+    :param str region_name: AWS region of the tables
+    :param int size: Connections kept by the pool
+    :param float timeout: Seconds a call waits for a free connection, at
+        most until the request deadline
+    :param config: botocore Config of the clients, see client_config
+    """
+
+    def __init__(self, region_name, size=50, timeout=5.0, config=None):
+        self.region_name = region_name
+        self.size = size
+        self.timeout = timeout
+        self.config = config or client_config()
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._reads = None
+
+    def _open(self):
+        with self._lock:
+            if self._opened >= self.size:
+                return None
+            self._opened += 1
+        try:
+            connection = _Connection(self.region_name, self.config)
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+        dynamodb_pool_connections.inc()
+        return connection
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        connection = self._open()
+        if connection is not None:
+            return connection
+
+        # Every connection is leased, the pool is saturated
+        dynamodb_pool_waits.inc()
+        started = time.perf_counter()
+        timeout = deadline.bounded(self.timeout)
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            if timeout < self.timeout:
+                deadline.check("pool")
+            raise PoolTimeout()
+        finally:
+            dynamodb_pool_wait_duration.observe(time.perf_counter() - started)
+
+    @contextmanager
+    def lease(self):
+        connection = self._acquire()
+        dynamodb_pool_in_use.inc()
+        try:
+            yield connection
+        finally:
+            dynamodb_pool_in_use.dec()
+            self._idle.put(connection)
+
+    def bounded(self, stage, read):
+        """
+        Run read on a pool thread and stop waiting for it at the request
+        deadline. The read itself is not interrupted, it keeps its
+        connection until it answers or the client read_timeout ends it,
+        and its answer is discarded. Only for reads, a write cut this
+        way may still be applied.
+
+        :raises DeadlineExceeded: no answer before the request deadline
+        """
+        with self._lock:
+            if self._reads is None:
+                # One thread per connection, a read on a thread holds one
+                self._reads = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="dynamodb-read")
+        future = self._reads.submit(deadline.propagate(read))
+        done, _ = wait([future], timeout=deadline.bounded(None))
+        if not done:
+            deadline.check(stage)
+            raise DeadlineExceeded(stage)
+        return future.result()
+
+    def warm(self, count, probe):
+        """
+        Open count connections and run probe(connection) on each in
+        parallel, so the TCP and TLS handshakes happen before the first
+        request. Warming is best effort, failed probes are ignored.
+        """
+        connections = [self._acquire() for _ in range(min(count, self.size))]
+
+        def run(connection):
+            try:
+                probe(connection)
+            except Exception:  # nosec B110
+                pass
+            finally:
+                self._idle.put(connection)
+
+        threads = [threading.Thread(target=run, args=(connection,), daemon=True) for connection in connections]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+class PooledDynamoDB:
+    """
+    Stand-in for a boto3 DynamoDB resource, table or client whose calls
+    each run on a connection leased from the pool, so it can be shared
+    by any number of threads. Other attributes are read from a leased
+    connection. Under a request deadline a read runs on a pool thread
+    so a slow answer can be given up, see DynamoDBPool.bounded.
+
+    :param pool: DynamoDBPool
+    :param str kind: "resource", "table" or "client"
+    :param str name: Table name when kind is "table"
+    """
+
+    def __init__(self, pool, kind="resource", name=None):
+        self._pool = pool
+        self._kind = kind
+        self._name = name
+
+    def Table(self, name):
+        return PooledDynamoDB(self._pool, "table", name)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        if name not in INSTRUMENTED_OPERATIONS:
+            with self._pool.lease() as connection:
+                return getattr(connection.target(self._kind, self._name), name)
+
+        def run(*args, **kwargs):
+            with self._pool.lease() as connection:
+                return getattr(connection.target(self._kind, self._name), name)(*args, **kwargs)
+
+        def call(*args, **kwargs):
+            # A spent budget fails the call before it waits for a connection
+            deadline.check(name)
+            if name in READ_METHODS and deadline.remaining() is not None:
+                # A slow read in flight is cut at the deadline, not only
+                # its retries
+                return self._pool.bounded(name, lambda: run(*args, **kwargs))
+            return run(*args, **kwargs)
+        return call
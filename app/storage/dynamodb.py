@@ -0,0 +1,804 @@
+import time
+import functools
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError, BotoCoreError
+from boto3.dynamodb.conditions import Key
+from app.storage.base import (
+    AccountStorage, AccountNotFound, AccountBusy, check_withdraw,
+    check_transfer, serializer, deserializer, DEPOSIT, WITHDRAW, TRANSFER_IN, TRANSFER_OUT,
+    DEBITS, StorageError, UncachedItem, apply_change, apply_withdraw, ledger_entry, encode_cursor,
+    decode_cursor, to_decimal
+)
+from app.storage.sharding import (
+    MAX_BALANCE_SHARDS, shard_key, shard_count, choose_shard, shard_item, plan_debits
+)
+from app.storage.connections import DynamoDBPool, PooledDynamoDB
+from app.storage.scan import ReadBudget, parallel_scan
+from app.utils.cache import LRUCache
+from app.utils.metrics import InstrumentedDynamoDB
+from app.utils.deadline import DeadlineExceeded
+
+# DynamoDB caps a single BatchGetItem call at 100 keys and a single
+# BatchWriteItem call at 25 requests
+BATCH_GET_CHUNK_SIZE = 100
+BATCH_WRITE_CHUNK_SIZE = 25
+
+# and a single TransactWriteItems call at 100 items
+TRANSACT_MAX_ITEMS = 100
+
+# Attributes a report scan reads, shard_of tells shard items apart
+SCAN_PROJECTION = ("account_id, current_balance, daily_limit, daily_amount_withdrawn, "
+                   "withdrawal_date, shard_of")
+
+# Every balance change bumps the item's version in the same update,
+# ADD treats a missing version as 0
+DEPOSIT_UPDATE = "SET current_balance = current_balance + :val ADD version :one"
+SAME_DAY_WITHDRAW_UPDATE = ("SET current_balance = current_balance - :val, "
+                            "daily_amount_withdrawn = daily_amount_withdrawn + :val ADD version :one")
+NEW_DAY_WITHDRAW_UPDATE = ("SET current_balance = current_balance - :val, "
+                           "daily_amount_withdrawn = :val, withdrawal_date = :today ADD version :one")
+SHARD_DEBIT_UPDATE = "SET current_balance = current_balance - :val ADD version :one"
+
+def _deserialize(item):
+    # Items returned with errors are in DynamoDB wire format
+    if item is None:
+        return None
+    return {k: deserializer.deserialize(v) for k, v in item.items()}
+
+def _serialize(values):
+    return {k: serializer.serialize(v) for k, v in values.items()}
+
+
+class DynamoDBStorage(AccountStorage):
+    """
+    Account storage on the DynamoDB Accounts table.
+
+    :param str table_name: Name of the accounts table
+    :param str region_name: AWS region of the table
+    :param int batch_workers: Parallel BatchGetItem calls
+    :param int batch_max_retries: Retries of UnprocessedKeys
+    :param int withdraw_max_attempts: Conditional writes per withdrawal
+    :param int daily_limit_memo_size: Accounts whose daily limit is remembered
+    :param str timezone: Timezone of the daily withdrawal counters
+    :param str ledger_table: Table the transaction ledger is written to, None keeps no ledger
+    :param pool: DynamoDBPool the calls run on, None opens one with default settings
+    :param int warm_connections: Connections warm() opens before the first request
+    :param hedging: HedgedReads account lookups run with, None reads once
+    """
+
+    def __init__(self, table_name, region_name, batch_workers=8, batch_max_retries=5,
+                 withdraw_max_attempts=3, daily_limit_memo_size=100000, timezone="UTC",
+                 ledger_table=None, pool=None, warm_connections=0, hedging=None):
+        self.table_name = table_name
+        self.timezone = ZoneInfo(timezone)
+
+        # Calls lease a connection of their own from the pool, boto3
+        # resources must not be shared between request threads
+        self.pool = pool or DynamoDBPool(region_name)
+        self.warm_connections = warm_connections
+        self.hedging = hedging
+        resource = PooledDynamoDB(self.pool)
+
+        # Every DynamoDB call is timed and counted for /metrics
+        self.resource = InstrumentedDynamoDB(resource)
+        self.table = InstrumentedDynamoDB(resource.Table(table_name))
+        self.client = InstrumentedDynamoDB(PooledDynamoDB(self.pool, "client"))
+
+        # Ledger of balance changes, partition key account_id and sort key
+        # entry_id (a UTC timestamp with a random suffix)
+        self.ledger_table = ledger_table
+        self.ledger = InstrumentedDynamoDB(resource.Table(ledger_table)) if ledger_table else None
+        self.batch_max_retries = batch_max_retries
+        self.withdraw_max_attempts = withdraw_max_attempts
+
+        # Worker pool used to run BatchGetItem chunks in parallel
+        self.batch_executor = ThreadPoolExecutor(max_workers=batch_workers)
+
+        # Last known (daily limit, withdrawal date) per account. DynamoDB
+        # condition expressions cannot add numbers, so the limit check is
+        # written as "daily_amount_withdrawn <= daily_limit - amount" using
+        # this value, and the date picks the same-day or new-day update.
+        self.daily_limits = LRUCache(daily_limit_memo_size)
+
+        # Balance shards of the sharded accounts, learnt from their items.
+        # Deposits to an account missing here go to the account item.
+        self.balance_shards = LRUCache(daily_limit_memo_size)
+
+        # Last known item of each shard of the sharded accounts, keyed by
+        # shard key. A write to one shard answers with its own new values
+        # and these for the others, rather than reading them again.
+        self.shard_state = LRUCache(daily_limit_memo_size)
+
+    @property
+    def deposit_batch_limit(self):
+        # With a ledger a batch is one transaction: the update and an entry per deposit
+        return TRANSACT_MAX_ITEMS - 1 if self.ledger is not None else None
+
+    def warm(self):
+        # A cheap read per connection opens its socket before traffic arrives
+        self.pool.warm(self.warm_connections, lambda connection: connection.target("table", self.table_name).get_item(
+            Key={"account_id": "0"}, ProjectionExpression="account_id"))
+
+    def get(self, account_id, consistent=False):
+        # Retrieve account id from DDB table
+        if consistent:
+            read = functools.partial(self.table.get_item, Key={"account_id": account_id}, ConsistentRead=True)
+        else:
+            read = functools.partial(self.table.get_item, Key={"account_id": account_id})
+
+        # A read slower than the hedge delay is sent a second time
+        response = self.hedging.call(read) if self.hedging is not None else read()
+
+        # Validate if the account exists in the DDB table
+        if "Item" not in response:
+            return None
+
+        item = response["Item"]
+        self._remember_shards(account_id, item)
+        if shard_count(item) > 1:
+            item = self._with_shards(account_id, item, consistent)
+        return item
+
+    def _remember_shards(self, account_id, item):
+        if shard_count(item) > 1:
+            self.balance_shards.set(account_id, shard_count(item))
+        else:
+            self.balance_shards.delete(account_id)
+
+    def _shard_items(self, account_id, item, consistent=False):
+        """
+        Items of the shards of an account, shard 0 is its item and the
+        others are read with one BatchGetItem.
+
+        :return: item per shard index, empty for a missing shard
+        :rtype: dict
+        """
+        items = {0: item}
+        keys = [shard_key(account_id, index) for index in range(1, shard_count(item))]
+        if keys:
+            shards, unprocessed = self._batch_get_chunk(keys, consistent)
+            if unprocessed:
+                raise AccountBusy("Account is busy, please retry", account_id=account_id)
+            for index in range(1, shard_count(item)):
+                items[index] = shards.get(shard_key(account_id, index), {})
+        for index, shard in items.items():
+            self.shard_state.set(shard_key(account_id, index), shard)
+        return items
+
+    def _with_shards(self, account_id, item, consistent=False, shards=None):
+        # The account item with the balance and version summed over its
+        # shards. Each shard only ever bumps its own version, so the sum
+        # grows with every change of the account.
+        shards = shards or self._shard_items(account_id, item, consistent)
+        item = dict(item)
+        item["current_balance"] = sum(to_decimal(shard.get("current_balance")) for shard in shards.values())
+        item["version"] = sum(to_decimal(shard.get("version")) for shard in shards.values())
+        return item
+
+    def _after_shard_write(self, account_id, index, written):
+        """
+        Account item after a write to one shard of a sharded account,
+        from the written shard's new values and the last known state of
+        the other shards. The write has committed, so when a shard was
+        never seen the read of the account may not fail it: the item is
+        then returned without a balance.
+
+        :param dict written: ALL_NEW values of the shard written
+        :rtype: UncachedItem
+        """
+        self.shard_state.set(shard_key(account_id, index), written)
+        account = self.shard_state.get(account_id)
+        shards = {}
+        if account is not None:
+            for shard in range(shard_count(account)):
+                shards[shard] = self.shard_state.get(shard_key(account_id, shard))
+        if account is not None and None not in shards.values():
+            return UncachedItem(self._with_shards(account_id, account, shards=shards))
+
+        try:
+            item = self.get(account_id)
+        except (ClientError, BotoCoreError, StorageError, DeadlineExceeded):
+            item = None
+        if item is None:
+            return UncachedItem(account_id=account_id)
+        return UncachedItem(item)
+
+    def _batch_get_chunk(self, account_ids, consistent=False):
+        """
+        Fetch up to 100 accounts with BatchGetItem, retrying any
+        UnprocessedKeys with exponential backoff.
+
+        :return: found items keyed by account id and the ids still unprocessed
+        :rtype: tuple
+        """
+        request_items = {
+            self.table_name: {
+                "Keys": [{"account_id": account_id} for account_id in account_ids],
+                "ProjectionExpression": "account_id, current_balance, balance_shards, version",
+                "ConsistentRead": consistent
+            }
+        }
+        items = {}
+        for attempt in range(self.batch_max_retries + 1):
+            response = self.resource.batch_get_item(RequestItems=request_items)
+            for item in response.get("Responses", {}).get(self.table_name, []):
+                items[item["account_id"]] = item
+
+            request_items = response.get("UnprocessedKeys") or {}
+            if not request_items:
+                return items, []
+
+            if attempt < self.batch_max_retries:
+                time.sleep(min(0.05 * (2 ** attempt), 1.0))
+
+        unprocessed = [key["account_id"] for key in request_items[self.table_name]["Keys"]]
+        return items, unprocessed
+
+    def batch_get(self, account_ids, consistent=False):
+        """
+        Resolve many accounts by splitting the ids into BatchGetItem
+        sized chunks and fetching the chunks in parallel. Items only
+        carry account_id and current_balance.
+
+        :param bool consistent: Strongly consistent reads of the items and their shards
+        """
+        chunks = [
+            account_ids[i:i + BATCH_GET_CHUNK_SIZE]
+            for i in range(0, len(account_ids), BATCH_GET_CHUNK_SIZE)
+        ]
+        items, unprocessed = {}, []
+        for chunk_items, chunk_unprocessed in self.batch_executor.map(
+                functools.partial(self._batch_get_chunk, consistent=consistent), chunks):
+            items.update(chunk_items)
+            unprocessed.extend(chunk_unprocessed)
+
+        # Sharded accounts hold only part of their balance in the item, one
+        # whose shards were not all read is reported unprocessed
+        for account_id, item in list(items.items()):
+            if shard_count(item) > 1:
+                try:
+                    items[account_id] = self._with_shards(account_id, item, consistent)
+                except AccountBusy:
+                    del items[account_id]
+                    unprocessed.append(account_id)
+        return items, unprocessed
+
+    def put(self, item):
+        self.table.put_item(Item=item)
+
+    def _batch_write_chunk(self, items):
+        """
+        Put up to 25 items with BatchWriteItem, retrying any
+        UnprocessedItems with exponential backoff.
+
+        :return: items still unprocessed
+        :rtype: list
+        """
+        # A batch may not put the same key twice, the last one wins
+        items = {item["account_id"]: item for item in items}
+        request_items = {self.table_name: [{"PutRequest": {"Item": item}} for item in items.values()]}
+        for attempt in range(self.batch_max_retries + 1):
+            response = self.resource.batch_write_item(RequestItems=request_items)
+            request_items = response.get("UnprocessedItems") or {}
+            if not request_items:
+                return []
+
+            if attempt < self.batch_max_retries:
+                time.sleep(min(0.05 * (2 ** attempt), 1.0))
+
+        return [request["PutRequest"]["Item"] for request in request_items[self.table_name]]
+
+    def put_many(self, items):
+        """
+        Create or replace many accounts in BatchWriteItem sized chunks.
+        The chunks are written one after the other, callers such as the
+        bulk import run put_many calls in parallel themselves.
+        """
+        unprocessed = []
+        for i in range(0, len(items), BATCH_WRITE_CHUNK_SIZE):
+            unprocessed.extend(self._batch_write_chunk(items[i:i + BATCH_WRITE_CHUNK_SIZE]))
+        return unprocessed
+
+    def deposit_many(self, account_id, amounts):
+        if self.ledger is not None:
+            return self._write_with_ledger(*[(account_id, DEPOSIT, amount, None) for amount in amounts])[-1]
+        return self.deposit(account_id, sum(amounts))
+
+    def deposit(self, account_id, amount):
+        if self.ledger is not None:
+            return self._write_with_ledger((account_id, DEPOSIT, amount, None))[0]
+
+        # A sharded account takes the deposit on a random shard
+        index = choose_shard(self.balance_shards.get(account_id) or 1)
+        try:
+            # Update the records in the DynamoDB
+            response = self.table.update_item(
+                Key={"account_id": shard_key(account_id, index)},
+                UpdateExpression=DEPOSIT_UPDATE,
+                ExpressionAttributeValues={":val": amount, ":one": 1},
+                ConditionExpression="attribute_exists(account_id)",
+                ReturnValues="ALL_NEW"
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            if index:
+                # The shard was folded back into the account by a reshard
+                self.balance_shards.delete(account_id)
+                return self.deposit(account_id, amount)
+            raise AccountNotFound(f"Account {account_id} not found", account_id=account_id)
+
+        item = response["Attributes"]
+        if index == 0:
+            self._remember_shards(account_id, item)
+        if index or shard_count(item) > 1:
+            return self._after_shard_write(account_id, index, item)
+        return item
+
+    def _remember(self, account_id, item):
+        if "daily_limit" in item:
+            self.daily_limits.set(account_id, (Decimal(str(item["daily_limit"])), item.get("withdrawal_date")))
+
+    def _withdraw_update(self, amount, known, today, debit=None):
+        """
+        Build the update expression, condition and values of a withdrawal.
+
+        The daily counter belongs to the date in withdrawal_date. When the
+        account last withdrew today, the counter is added to and the
+        condition checks the remaining headroom against the known limit.
+        Otherwise the update restarts the counter at amount for today,
+        which only needs daily_limit >= amount. A stale guess fails the
+        condition and returns the item, so the limit and date are learnt
+        and the write retried.
+
+        A sharded account debits only part of the amount, debit, from
+        its item while the whole amount counts against the daily limit.
+        """
+        values = {":val": amount, ":today": today, ":one": 1}
+        if debit is not None:
+            values[":debit"] = debit
+        condition = "attribute_exists(account_id) AND current_balance >= :val"
+        if known is not None and known[1] == today:
+            values[":limit"] = known[0]
+            values[":headroom"] = known[0] - amount
+            condition += (" AND daily_limit = :limit AND withdrawal_date = :today"
+                          " AND daily_amount_withdrawn <= :headroom")
+            update = SAME_DAY_WITHDRAW_UPDATE
+        else:
+            condition += (" AND daily_limit >= :val AND (attribute_not_exists(withdrawal_date)"
+                          " OR withdrawal_date <> :today)")
+            update = NEW_DAY_WITHDRAW_UPDATE
+
+        if debit is not None:
+            update = update.replace("current_balance - :val", "current_balance - :debit")
+            condition = condition.replace("current_balance >= :val", "current_balance >= :debit")
+        return update, condition, values
+
+    def withdraw(self, account_id, amount):
+        """
+        Withdraw from an account with a single conditional UpdateItem that
+        checks existence, balance and the daily limit atomically, and
+        restarts the daily counter on the first withdrawal of a day. When
+        the condition fails, the item is returned with the error
+        (ReturnValuesOnConditionCheckFailure) to tell the cause apart
+        without another read.
+        """
+        if self.ledger is not None:
+            return self._write_with_ledger((account_id, WITHDRAW, amount, None))[0]
+
+        for _ in range(self.withdraw_max_attempts):
+            if self.balance_shards.get(account_id):
+                return self._debit_shards(account_id, amount)
+
+            today = self.today()
+            # Only a guess for the condition, the limit may have been raised
+            # since; a stale one fails the condition and the item decides
+            known = self.daily_limits.get(account_id)
+            update, condition, values = self._withdraw_update(amount, known, today)
+            try:
+                # Update the records in the DynamoDB
+                response = self.table.update_item(
+                    Key={"account_id": account_id},
+                    UpdateExpression=update,
+                    ExpressionAttributeValues=values,
+                    ConditionExpression=condition,
+                    ReturnValues="ALL_NEW",
+                    ReturnValuesOnConditionCheckFailure="ALL_OLD"
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+
+                account = _deserialize(e.response.get("Item"))
+                self._remember_shards(account_id, account)
+                if shard_count(account) > 1:
+                    # Only part of the balance is on the account item
+                    continue
+                check_withdraw(account_id, account, amount, today)
+
+                # The condition was built from a stale limit or date
+                self._remember(account_id, account)
+                continue
+
+            item = response["Attributes"]
+            self._remember(account_id, item)
+            if shard_count(item) > 1:
+                self._remember_shards(account_id, item)
+                return self._after_shard_write(account_id, 0, item)
+            return item
+
+        raise AccountBusy("Account is busy, please retry", account_id=account_id)
+
+    def transfer(self, source_id, destination_id, amount):
+        """
+        Move money between two accounts with one TransactWriteItems call:
+        the debit uses the withdraw condition (existence, balance, daily
+        limit) and the credit the deposit condition (existence). The
+        cancellation reasons, with the items returned by
+        ReturnValuesOnConditionCheckFailure, tell which check failed.
+        """
+        check_transfer(source_id, destination_id)
+        if self.ledger is not None:
+            self._write_with_ledger(
+                (source_id, TRANSFER_OUT, amount, destination_id),
+                (destination_id, TRANSFER_IN, amount, source_id)
+            )
+            return
+
+        for _ in range(self.withdraw_max_attempts):
+            if self.balance_shards.get(source_id):
+                self._debit_shards(source_id, amount, destination_id)
+                return
+
+            today = self.today()
+            known = self.daily_limits.get(source_id)
+            update, condition, values = self._withdraw_update(amount, known, today)
+            try:
+                self.client.transact_write_items(TransactItems=[
+                    {"Update": {
+                        "TableName": self.table_name,
+                        "Key": _serialize({"account_id": source_id}),
+                        "UpdateExpression": update,
+                        "ConditionExpression": condition,
+                        "ExpressionAttributeValues": _serialize(values),
+                        "ReturnValuesOnConditionCheckFailure": "ALL_OLD"
+                    }},
+                    {"Update": {
+                        "TableName": self.table_name,
+                        "Key": _serialize({"account_id": destination_id}),
+                        "UpdateExpression": DEPOSIT_UPDATE,
+                        "ConditionExpression": "attribute_exists(account_id)",
+                        "ExpressionAttributeValues": _serialize({":val": amount, ":one": 1}),
+                        "ReturnValuesOnConditionCheckFailure": "ALL_OLD"
+                    }}
+                ])
+                return
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "TransactionCanceledException":
+                    raise
+                reasons = e.response.get("CancellationReasons", [])
+                if not self._transfer_retryable(source_id, destination_id, amount, today, reasons):
+                    raise
+
+        raise AccountBusy("Account is busy, please retry", account_id=source_id)
+
+    def _transfer_retryable(self, source_id, destination_id, amount, today, reasons):
+        """
+        Map the cancellation reasons of a transfer to the storage error
+        of the failed check. Returns True when the transfer can be
+        retried: a stale daily limit or date, or a conflicting transaction.
+        """
+        codes = [reason.get("Code", "None") for reason in reasons]
+        if len(codes) < 2:
+            return False
+
+        if codes[1] == "ConditionalCheckFailed":
+            raise AccountNotFound(f"Account {destination_id} not found", account_id=destination_id)
+
+        if codes[0] == "ConditionalCheckFailed":
+            account = _deserialize(reasons[0].get("Item"))
+            self._remember_shards(source_id, account)
+            if shard_count(account) > 1:
+                return True
+            check_withdraw(source_id, account, amount, today)
+            self._remember(source_id, account)
+            return True
+
+        return "TransactionConflict" in codes
+
+    def _debit_shards(self, account_id, amount, destination_id=None):
+        """
+        Withdraw from a sharded account, or transfer from it when a
+        destination is given, with one TransactWriteItems call.
+
+        The shards are read consistently and the amount is split over
+        them, largest balance first. The account item takes its part of
+        the debit together with the daily counter update, so the daily
+        limit is checked as for any withdrawal, and every other shard
+        debited is conditioned on holding its part. A concurrent write
+        cancels the transaction and the shards are read again.
+
+        :return: account item after the withdrawal, balance summed over the shards
+        :rtype: dict
+        """
+        for _ in range(self.withdraw_max_attempts):
+            today = self.today()
+            response = self.table.get_item(Key={"account_id": account_id}, ConsistentRead=True)
+            item = response.get("Item")
+            items = self._shard_items(account_id, item, consistent=True) if item else {}
+            account = self._with_shards(account_id, item, shards=items) if item else None
+            check_withdraw(account_id, account, amount, today)
+            self._remember_shards(account_id, item)
+
+            # The debit is computed for the shards read, a reshard meanwhile cancels it
+            shards = shard_count(item)
+            guard = " AND balance_shards = :shards" if shards > 1 else (
+                " AND (attribute_not_exists(balance_shards) OR balance_shards = :shards)")
+
+            balances = {index: to_decimal(shard.get("current_balance")) for index, shard in items.items()}
+            debits = plan_debits(balances, amount)
+            known = (to_decimal(item.get("daily_limit")), item.get("withdrawal_date"))
+            own_debit = debits.pop(0, to_decimal(0))
+            update, condition, values = self._withdraw_update(amount, known, today, debit=own_debit)
+            transact_items = [{"Update": {
+                "TableName": self.table_name,
+                "Key": _serialize({"account_id": account_id}),
+                "UpdateExpression": update,
+                "ConditionExpression": condition + guard,
+                "ExpressionAttributeValues": _serialize(dict(values, **{":shards": shards}))
+            }}]
+            for index, debit in debits.items():
+                transact_items.append({"Update": {
+                    "TableName": self.table_name,
+                    "Key": _serialize({"account_id": shard_key(account_id, index)}),
+                    "UpdateExpression": SHARD_DEBIT_UPDATE,
+                    "ConditionExpression": "current_balance >= :val",
+                    "ExpressionAttributeValues": _serialize({":val": debit, ":one": 1})
+                }})
+            if destination_id is not None:
+                transact_items.append({"Update": {
+                    "TableName": self.table_name,
+                    "Key": _serialize({"account_id": destination_id}),
+                    "UpdateExpression": DEPOSIT_UPDATE,
+                    "ConditionExpression": "attribute_exists(account_id)",
+                    "ExpressionAttributeValues": _serialize({":val": amount, ":one": 1})
+                }})
+
+            try:
+                self.client.transact_write_items(TransactItems=transact_items)
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "TransactionCanceledException":
+                    raise
+                reasons = e.response.get("CancellationReasons", [])
+                if (destination_id is not None and len(reasons) == len(transact_items)
+                        and reasons[-1].get("Code") == "ConditionalCheckFailed"):
+                    raise AccountNotFound(f"Account {destination_id} not found", account_id=destination_id)
+                continue
+
+            # Every shard debited bumped its version
+            updated = apply_withdraw(account_id, account, amount, today)
+            updated["version"] += len(debits)
+            self._remember(account_id, updated)
+            if shards > 1:
+                # Shards not debited may have taken deposits meanwhile
+                self.shard_state.set(account_id, dict(
+                    updated, current_balance=to_decimal(item.get("current_balance")) - own_debit,
+                    version=to_decimal(item.get("version")) + 1))
+                for index, debit in debits.items():
+                    shard = items[index]
+                    self.shard_state.set(shard_key(account_id, index), dict(
+                        shard, current_balance=to_decimal(shard.get("current_balance")) - debit,
+                        version=to_decimal(shard.get("version")) + 1))
+                return UncachedItem(updated)
+            return updated
+
+        raise AccountBusy("Account is busy, please retry", account_id=account_id)
+
+    def reshard(self, account_id, shards):
+        """
+        Change the number of balance shards of an account while it takes
+        traffic.
+
+        Growing creates the new, empty shards before the account item
+        announces them, so no reader misses one. Shrinking folds the
+        highest shard into the account item and deletes it in one
+        transaction, conditioned on its balance, one shard at a time. A
+        deposit that still targets a deleted shard fails its condition
+        and is applied to the account item instead.
+
+        :return: shards the account had before
+        :rtype: int
+        :raises ValueError: shard count out of range, or the storage keeps a ledger
+        """
+        if self.ledger is not None:
+            raise ValueError("Sharded balances cannot be used together with the ledger")
+        if not 1 <= shards <= MAX_BALANCE_SHARDS:
+            raise ValueError(f"Shards must be between 1 and {MAX_BALANCE_SHARDS}")
+
+        item = self.table.get_item(Key={"account_id": account_id}, ConsistentRead=True).get("Item")
+        if item is None:
+            raise AccountNotFound(f"Account {account_id} not found", account_id=account_id)
+        current = shard_count(item)
+
+        if shards > current:
+            for index in range(current, shards):
+                try:
+                    self.table.put_item(Item=shard_item(account_id, index), ConditionExpression="attribute_not_exists(account_id)")
+                except ClientError as e:
+                    # Left by an interrupted reshard, its balance is kept
+                    if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                        raise
+            self.table.update_item(
+                Key={"account_id": account_id},
+                UpdateExpression="SET balance_shards = :shards",
+                ConditionExpression="attribute_not_exists(balance_shards) OR balance_shards = :current",
+                ExpressionAttributeValues={":shards": shards, ":current": current}
+            )
+
+        for index in range(current - 1, shards - 1, -1):
+            self._fold_shard(account_id, index)
+
+        self.balance_shards.delete(account_id)
+        return current
+
+    def _fold_shard(self, account_id, index):
+        # Move the balance of the highest shard to the account item and
+        # delete the shard, retried when a deposit lands on it meanwhile
+        key = shard_key(account_id, index)
+        for _ in range(self.withdraw_max_attempts):
+            shard = self.table.get_item(Key={"account_id": key}, ConsistentRead=True).get("Item")
+            balance = to_decimal(shard["current_balance"] if shard else 0)
+            version = to_decimal(shard.get("version") if shard else 0)
+            delete = {
+                "TableName": self.table_name,
+                "Key": _serialize({"account_id": key}),
+                "ConditionExpression": "attribute_not_exists(account_id)"
+            }
+            if shard:
+                # The account item takes over the version of the shard so
+                # the summed version still grows
+                delete["ConditionExpression"] = "current_balance = :val AND " + (
+                    "version = :version" if "version" in shard else "attribute_not_exists(version)")
+                delete["ExpressionAttributeValues"] = _serialize(
+                    {":val": balance, ":version": version} if "version" in shard else {":val": balance})
+            try:
+                self.client.transact_write_items(TransactItems=[
+                    {"Update": {
+                        "TableName": self.table_name,
+                        "Key": _serialize({"account_id": account_id}),
+                        "UpdateExpression": ("SET current_balance = current_balance + :val, "
+                                             "balance_shards = :shards ADD version :version"),
+                        "ConditionExpression": "balance_shards = :current",
+                        "ExpressionAttributeValues": _serialize(
+                            {":val": balance, ":shards": index, ":current": index + 1, ":version": version + 1})
+                    }},
+                    {"Delete": delete}
+                ])
+                return
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "TransactionCanceledException":
+                    raise
+
+        raise AccountBusy("Account is busy, please retry", account_id=account_id)
+
+    def _write_with_ledger(self, *changes):
+        """
+        Apply (account_id, kind, amount, counterparty) changes together
+        with their ledger entries in one TransactWriteItems call.
+
+        The ledger entries carry the balance after the change, which a
+        transaction cannot return, so the accounts are read first and
+        the changes are checked in Python with the same rules as the
+        local engines. Each update is conditioned on the balance it was
+        computed from; a concurrent change cancels the transaction and
+        the accounts are read again.
+
+        A transaction updates an item once, so further deposits to an
+        account, e.g. a coalesced batch, are added to its one update while
+        each keeps its own ledger entry.
+
+        :return: updated account items
+        :rtype: list
+        """
+        for _ in range(self.withdraw_max_attempts):
+            today = self.today()
+            updates, entries, results, current = {}, [], [], {}
+            for change in changes:
+                account_id, kind, amount, counterparty = change
+                if account_id not in current:
+                    current[account_id] = self.get(account_id, consistent=True)
+                item = current[account_id]
+                updated = current[account_id] = apply_change(item, change, today)
+
+                if account_id in updates:
+                    if kind in DEBITS or updates[account_id][0] != DEPOSIT_UPDATE:
+                        raise ValueError("Only deposits can change an account twice in one transaction")
+                    updates[account_id][2][":val"] += amount
+                    updates[account_id][2][":one"] += 1
+                else:
+                    if kind in DEBITS:
+                        known = (Decimal(str(item.get("daily_limit", 0))), item.get("withdrawal_date"))
+                        update, condition, values = self._withdraw_update(amount, known, today)
+                    else:
+                        update, condition, values = DEPOSIT_UPDATE, "attribute_exists(account_id)", {":val": amount, ":one": 1}
+                    values[":old"] = item["current_balance"]
+                    updates[account_id] = (update, condition, values)
+
+                entries.append(ledger_entry(account_id, kind, amount, updated["current_balance"], counterparty))
+                results.append(updated)
+
+            transact_items = [{"Update": {
+                "TableName": self.table_name,
+                "Key": _serialize({"account_id": account_id}),
+                "UpdateExpression": update,
+                "ConditionExpression": condition + " AND current_balance = :old",
+                "ExpressionAttributeValues": _serialize(values)
+            }} for account_id, (update, condition, values) in updates.items()]
+            transact_items.extend({"Put": {
+                "TableName": self.ledger_table,
+                "Item": _serialize(entry),
+                "ConditionExpression": "attribute_not_exists(entry_id)"
+            }} for entry in entries)
+
+            try:
+                self.client.transact_write_items(TransactItems=transact_items)
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "TransactionCanceledException":
+                    raise
+                continue
+            return results
+
+        raise AccountBusy("Account is busy, please retry", account_id=changes[0][0])
+
+    def scan(self, segments=1, read_capacity=0, page_size=1000):
+        """
+        Parallel Scan of the accounts table, one worker per segment. The
+        projection keeps items to the report attributes, which is what
+        the read capacity is charged for, and the segments share a
+        budget of read_capacity units per second so the scan leaves the
+        table's capacity to live traffic.
+        """
+        def scan_page(segment, start_key):
+            kwargs = {
+                "ProjectionExpression": SCAN_PROJECTION,
+                "Segment": segment,
+                "TotalSegments": segments,
+                "Limit": page_size,
+                "ReturnConsumedCapacity": "TOTAL"
+            }
+            if start_key is not None:
+                kwargs["ExclusiveStartKey"] = start_key
+            response = self.table.scan(**kwargs)
+            units = response.get("ConsumedCapacity", {}).get("CapacityUnits", 0)
+            return response.get("Items", []), response.get("LastEvaluatedKey"), units
+
+        for _, items in parallel_scan(scan_page, segments, ReadBudget(read_capacity)):
+            yield items
+
+    def history(self, account_id, start=None, end=None, limit=50, cursor=None, newest_first=True):
+        """
+        Query one page of the account's ledger. Reads cost the page, not
+        the whole history: the key condition bounds the time range and
+        the cursor is the LastEvaluatedKey of the previous page.
+        """
+        if self.ledger is None:
+            return super().history(account_id, start, end, limit, cursor, newest_first)
+
+        condition = Key("account_id").eq(account_id)
+        if start is not None and end is not None:
+            # BETWEEN is inclusive, but no entry_id equals a bare timestamp
+            condition &= Key("entry_id").between(start, end)
+        elif start is not None:
+            condition &= Key("entry_id").gte(start)
+        elif end is not None:
+            condition &= Key("entry_id").lt(end)
+
+        kwargs = {"KeyConditionExpression": condition, "Limit": limit, "ScanIndexForward": not newest_first}
+        if cursor is not None:
+            kwargs["ExclusiveStartKey"] = decode_cursor(cursor, account_id)
+
+        response = self.ledger.query(**kwargs)
+        last_key = response.get("LastEvaluatedKey")
+        return response.get("Items", []), encode_cursor(last_key) if last_key else None
@@ -0,0 +1,160 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from app.utils import deadline
+from app.utils.deadline import DeadlineExceeded
+from app.utils.metrics import registry
+
+hedged_reads = registry.counter(
+    "dynamodb_hedged_reads_total", "Reads run with a hedge ready.", ("operation",))
+hedges_sent = registry.counter(
+    "dynamodb_hedges_total", "Second requests sent for reads slower than the hedge delay.", ("operation",))
+hedge_wins = registry.counter(
+    "dynamodb_hedge_wins_total", "Hedges that answered before the first request.", ("operation",))
+hedges_skipped = registry.counter(
+    "dynamodb_hedges_skipped_total", "Slow reads not hedged, by reason (budget or saturated).", ("operation", "reason"))
+hedge_delay = registry.gauge(
+    "dynamodb_hedge_delay_seconds", "Current delay before a read is hedged.", ("operation",))
+
+
+class HedgedReads:
+    """
+    Tail latency cut for idempotent reads. A read still unanswered after
+    the percentile of recent read latencies is sent a second time, and
+    whichever answer arrives first is returned; the slower one finishes
+    in the background and is discarded. Only reads slower than the
+    percentile are hedged, so a 95th percentile delay adds about 5% of
+    reads.
+
+    When DynamoDB slows down as a whole every read passes the delay, so
+    hedges are also capped at budget of the reads: each read earns
+    budget of a hedge, up to burst, and a hedge spends one. A read that
+    finds every thread busy runs on the caller's thread unhedged, more
+    load would only queue behind the slow reads. The delay is measured
+    from when the read starts to run, not from when it was queued.
+
+    Until min_samples latencies are known the delay is max_delay.
+
+    :param str operation: Label of the hedge metrics
+    :param float percentile: Latency percentile the hedge waits for
+    :param float min_delay: Shortest delay in seconds
+    :param float max_delay: Longest delay in seconds
+    :param int window: Recent latencies the percentile is taken from
+    :param int min_samples: Latencies needed before the percentile is used
+    :param int workers: Threads the reads and hedges run on
+    :param float budget: Share of reads that may be hedged
+    :param float burst: Hedges that may be sent in a row before the budget applies
+    """
+
+    def __init__(self, operation, percentile=95, min_delay=0.005, max_delay=0.5, window=1000,
+                 min_samples=100, workers=32, budget=0.05, burst=10):
+        self.operation = operation
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.workers = workers
+        self.budget = budget
+        self.burst = burst
+        self._latencies = deque(maxlen=window)
+        self._delay = max_delay
+        self._observed = 0
+        self._tokens = burst
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hedge")
+        hedge_delay.set(self._delay, operation=operation)
+
+    @property
+    def delay(self):
+        return self._delay
+
+    def _observe(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+            self._observed += 1
+            # Sorting the window on every read would cost more than the
+            # read, the percentile is refreshed every few samples instead
+            if len(self._latencies) < self.min_samples or self._observed % 20:
+                return
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        self._delay = min(self.max_delay, max(self.min_delay, ordered[index]))
+        hedge_delay.set(self._delay, operation=self.operation)
+
+    def _submit(self, read):
+        run = deadline.propagate(read)
+        running = threading.Event()
+
+        def timed():
+            running.set()
+            started = time.perf_counter()
+            try:
+                result = run()
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+            self._observe(time.perf_counter() - started)
+            return result
+
+        with self._lock:
+            self._in_flight += 1
+        return self._executor.submit(timed), running
+
+    def _hedge_allowed(self):
+        with self._lock:
+            if self._in_flight >= self.workers:
+                reason = "saturated"
+            elif self._tokens < 1:
+                reason = "budget"
+            else:
+                self._tokens -= 1
+                return True
+        hedges_skipped.inc(operation=self.operation, reason=reason)
+        return False
+
+    def call(self, read):
+        """
+        :param read: callable without arguments, e.g. a GetItem
+        :return: the first successful result of read
+        :raises DeadlineExceeded: no answer before the request deadline
+        """
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.budget)
+            saturated = self._in_flight >= self.workers
+        if saturated:
+            hedges_skipped.inc(operation=self.operation, reason="saturated")
+            return read()
+
+        hedged_reads.inc(operation=self.operation)
+        first, running = self._submit(read)
+        running.wait(deadline.bounded(None))
+        done, _ = wait([first], timeout=deadline.bounded(self._delay))
+        if done:
+            return first.result()
+
+        deadline.check(self.operation)
+        if not self._hedge_allowed():
+            done, _ = wait([first], timeout=deadline.bounded(None))
+            if not done:
+                deadline.check(self.operation)
+                raise DeadlineExceeded(self.operation)
+            return first.result()
+
+        hedges_sent.inc(operation=self.operation)
+        second, _ = self._submit(read)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=deadline.bounded(None), return_when=FIRST_COMPLETED)
+            if not done:
+                deadline.check(self.operation)
+                raise DeadlineExceeded(self.operation)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        hedge_wins.inc(operation=self.operation)
+                    return future.result()
+                error = future.exception()
+        raise error
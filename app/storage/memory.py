@@ -0,0 +1,86 @@
+import threading
+from collections import defaultdict
+from zoneinfo import ZoneInfo
+from app.storage.base import (
+    AccountStorage, DEPOSIT, WITHDRAW, TRANSFER_IN, TRANSFER_OUT, apply_change,
+    check_transfer, ledger_entry, decode_cursor, page_entries
+)
+
+
+class MemoryStorage(AccountStorage):
+    """
+    Thread-safe in-process storage. Data lives only as long as the
+    process, so run a single worker when serving from it.
+
+    :param str timezone: Timezone of the daily withdrawal counters
+    """
+
+    def __init__(self, timezone="UTC"):
+        self.timezone = ZoneInfo(timezone)
+        self._items = {}
+        self._ledger = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def get(self, account_id, consistent=False):
+        with self._lock:
+            item = self._items.get(account_id)
+        return dict(item) if item is not None else None
+
+    def put(self, item):
+        with self._lock:
+            self._items[item["account_id"]] = dict(item)
+
+    def put_many(self, items):
+        with self._lock:
+            for item in items:
+                self._items[item["account_id"]] = dict(item)
+        return []
+
+    def _update(self, *changes):
+        """
+        Apply (account_id, kind, amount, counterparty) changes and record
+        their ledger entries; either every change is applied or none is.
+        A change applies to the item left by the changes before it.
+        """
+        today = self.today()
+        with self._lock:
+            items, pending = [], {}
+            for change in changes:
+                item = pending.get(change[0], self._items.get(change[0]))
+                item = pending[change[0]] = apply_change(item, change, today)
+                items.append(item)
+            for item, (account_id, kind, amount, counterparty) in zip(items, changes):
+                self._items[account_id] = item
+                self._ledger[account_id].append(
+                    ledger_entry(account_id, kind, amount, item["current_balance"], counterparty))
+        return [dict(item) for item in items]
+
+    def deposit(self, account_id, amount):
+        return self._update((account_id, DEPOSIT, amount, None))[0]
+
+    def deposit_many(self, account_id, amounts):
+        return self._update(*[(account_id, DEPOSIT, amount, None) for amount in amounts])[-1]
+
+    def withdraw(self, account_id, amount):
+        return self._update((account_id, WITHDRAW, amount, None))[0]
+
+    def transfer(self, source_id, destination_id, amount):
+        check_transfer(source_id, destination_id)
+        self._update(
+            (source_id, TRANSFER_OUT, amount, destination_id),
+            (destination_id, TRANSFER_IN, amount, source_id)
+        )
+
+    def scan(self, segments=1, read_capacity=0, page_size=1000):
+        # A snapshot of the items, nothing here to spread or throttle
+        with self._lock:
+            items = [dict(item) for item in self._items.values()]
+        for i in range(0, len(items), page_size):
+            yield items[i:i + page_size]
+
+    def history(self, account_id, start=None, end=None, limit=50, cursor=None, newest_first=True):
+        if cursor is not None:
+            cursor = decode_cursor(cursor, account_id)
+        with self._lock:
+            entries = list(self._ledger.get(account_id, ()))
+        return page_entries(entries, start, end, limit, cursor, newest_first)
@@ -0,0 +1,32 @@
+import sys
+import json
+import argparse
+from app.storage import build_storage, StorageError
+
+# Change the balance shards of an account on the DynamoDB table while
+# it takes traffic. Usage,
+#   python -m app.storage.reshard 12345 --shards 8
+#
+# More shards spread the deposits of a hot account over more partition
+# keys, --shards 1 folds the account back into a single item.
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reshard the balance of an account")
+    parser.add_argument("account_id")
+    parser.add_argument("--shards", type=int, required=True, help="Balance shards, 1 turns sharding off")
+    args = parser.parse_args(argv)
+
+    storage = build_storage("dynamodb")
+    try:
+        previous = storage.reshard(args.account_id, args.shards)
+    except (ValueError, StorageError) as e:
+        print(f"reshard: {e}", file=sys.stderr)
+        return 1
+
+    print(json.dumps({"account_id": args.account_id, "from": previous, "to": args.shards}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
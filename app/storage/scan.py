@@ -0,0 +1,110 @@
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.utils.metrics import registry
+
+scan_consumed_capacity = registry.counter(
+    "scan_consumed_capacity_units_total", "Read capacity consumed by report scans.")
+scan_budget_wait = registry.histogram(
+    "scan_budget_wait_seconds", "Time scan segments paused to stay within the read capacity budget.")
+
+# Marks the end of a segment on the page queue
+_DONE = object()
+
+
+class ReadBudget:
+    """
+    Read capacity budget shared by the segments of a scan. Each page
+    pays for the units it consumed afterwards, which DynamoDB only
+    reports after the read, so the budget runs into debt and the next
+    page of any segment waits until it is paid off. On average the scan
+    then reads at most units_per_second.
+
+    :param float units_per_second: Read capacity units the scan may use, 0 for no limit
+    """
+
+    def __init__(self, units_per_second, clock=time.monotonic, sleep=time.sleep):
+        self.units_per_second = units_per_second
+        self._clock = clock
+        self._sleep = sleep
+        self._available_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # Wait until the units consumed so far are paid off
+        if self.units_per_second <= 0:
+            return
+        with self._lock:
+            wait = self._available_at - self._clock()
+        if wait > 0:
+            scan_budget_wait.observe(wait)
+            self._sleep(wait)
+
+    def consume(self, units):
+        scan_consumed_capacity.inc(units)
+        if self.units_per_second <= 0:
+            return
+        with self._lock:
+            self._available_at = max(self._available_at, self._clock()) + units / self.units_per_second
+
+
+def parallel_scan(scan_page, segments, budget=None, max_pages=64):
+    """
+    Run a segmented scan on a worker per segment and yield the pages as
+    they arrive, in no particular order. Closing the generator stops
+    the workers after their current page.
+
+    :param scan_page: function(segment, start_key) returning the items,
+        the key to continue from (None at the end of the segment) and
+        the capacity units consumed
+    :param int segments: Segments scanned in parallel
+    :param budget: ReadBudget the pages are charged to
+    :param int max_pages: Pages buffered before the workers wait for the consumer
+    :return: generator of (segment, items)
+    """
+    pages = queue.Queue(maxsize=max_pages)
+    stopped = threading.Event()
+
+    def put(entry):
+        # Give up when the consumer is gone rather than block forever
+        while not stopped.is_set():
+            try:
+                pages.put(entry, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def run(segment):
+        try:
+            start_key = None
+            while not stopped.is_set():
+                if budget is not None:
+                    budget.acquire()
+                items, start_key, units = scan_page(segment, start_key)
+                if budget is not None:
+                    budget.consume(units)
+                put((segment, items))
+                if start_key is None:
+                    break
+            put((segment, _DONE))
+        except Exception as e:
+            put((segment, e))
+
+    executor = ThreadPoolExecutor(max_workers=segments, thread_name_prefix="scan")
+    for segment in range(segments):
+        executor.submit(run, segment)
+
+    try:
+        remaining = segments
+        while remaining:
+            segment, items = pages.get()
+            if items is _DONE:
+                remaining -= 1
+            elif isinstance(items, Exception):
+                raise items
+            else:
+                yield segment, items
+    finally:
+        stopped.set()
+        executor.shutdown(wait=False)
@@ -0,0 +1,44 @@
+import random
+from app.storage.base import to_decimal
+
+# Shards of one account. A sharded withdrawal updates every shard it
+# debits in one transaction, which takes at most 100 items.
+MAX_BALANCE_SHARDS = 64
+
+
+def shard_key(account_id, index):
+    # Shard 0 is the account item itself, the others are "<id>#<index>"
+    return account_id if index == 0 else f"{account_id}#{index}"
+
+def shard_count(item):
+    """
+    :return: balance shards of an account item, 1 when it is not sharded
+    :rtype: int
+    """
+    return int(item.get("balance_shards", 1)) if item else 1
+
+def choose_shard(shards):
+    # Random choice spreads concurrent deposits evenly over the shards
+    return random.randrange(shards)  # nosec B311
+
+def shard_item(account_id, index):
+    return {"account_id": shard_key(account_id, index), "shard_of": account_id, "current_balance": to_decimal(0)}
+
+def plan_debits(balances, amount):
+    """
+    Split a debit of amount over shard balances, largest balance first,
+    so it touches as few shards as possible.
+
+    :param dict balances: balance per shard index
+    :return: amount to debit per shard index
+    :rtype: dict
+    """
+    debits = {}
+    for index, balance in sorted(balances.items(), key=lambda entry: entry[1], reverse=True):
+        if amount <= 0:
+            break
+        debit = min(balance, amount)
+        if debit > 0:
+            debits[index] = debit
+            amount -= debit
+    return debits
@@ -0,0 +1,156 @@
+import os
+import sqlite3
+import threading
+from zoneinfo import ZoneInfo
+from app.storage.base import (
+    AccountStorage, DEPOSIT, WITHDRAW, TRANSFER_IN, TRANSFER_OUT, apply_change,
+    check_transfer, encode_item, decode_item, ledger_entry, encode_cursor, decode_cursor
+)
+
+
+class SQLiteStorage(AccountStorage):
+    """
+    SQLite storage in WAL mode. Every update reads and writes the item
+    inside a BEGIN IMMEDIATE transaction, which gives the same
+    all-or-nothing conditional semantics as a DynamoDB UpdateItem.
+    Ledger entries are written in the same transaction. Connections are
+    opened per thread and per process.
+
+    :param str path: Database file
+    :param str timezone: Timezone of the daily withdrawal counters
+    """
+
+    def __init__(self, path, timezone="UTC"):
+        self.path = path
+        self.timezone = ZoneInfo(timezone)
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS accounts ("
+            "account_id TEXT PRIMARY KEY, item TEXT NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ledger ("
+            "account_id TEXT NOT NULL, entry_id TEXT NOT NULL, item TEXT NOT NULL, "
+            "PRIMARY KEY (account_id, entry_id)) WITHOUT ROWID"
+        )
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, account_id, consistent=False):
+        row = self._connect().execute(
+            "SELECT item FROM accounts WHERE account_id = ?", (account_id,)
+        ).fetchone()
+        return decode_item(row[0]) if row else None
+
+    def put(self, item):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO accounts (account_id, item) VALUES (?, ?)",
+            (item["account_id"], encode_item(item))
+        )
+
+    def put_many(self, items):
+        # One transaction, a commit per item would sync the WAL per item
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO accounts (account_id, item) VALUES (?, ?)",
+                [(item["account_id"], encode_item(item)) for item in items]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return []
+
+    def _update(self, *changes):
+        """
+        Apply (account_id, kind, amount, counterparty) changes to their
+        items and record their ledger entries in one transaction; either
+        every change is written or none is. A change applies to the item
+        left by the changes before it.
+        """
+        today = self.today()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            items, pending = [], {}
+            for change in changes:
+                item = pending.get(change[0])
+                if item is None:
+                    row = conn.execute(
+                        "SELECT item FROM accounts WHERE account_id = ?", (change[0],)
+                    ).fetchone()
+                    item = decode_item(row[0]) if row else None
+                item = pending[change[0]] = apply_change(item, change, today)
+                items.append(item)
+            for item, (account_id, kind, amount, counterparty) in zip(items, changes):
+                conn.execute(
+                    "UPDATE accounts SET item = ? WHERE account_id = ?",
+                    (encode_item(item), account_id)
+                )
+                entry = ledger_entry(account_id, kind, amount, item["current_balance"], counterparty)
+                conn.execute(
+                    "INSERT INTO ledger (account_id, entry_id, item) VALUES (?, ?, ?)",
+                    (account_id, entry["entry_id"], encode_item(entry))
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return items
+
+    def deposit(self, account_id, amount):
+        return self._update((account_id, DEPOSIT, amount, None))[0]
+
+    def deposit_many(self, account_id, amounts):
+        return self._update(*[(account_id, DEPOSIT, amount, None) for amount in amounts])[-1]
+
+    def withdraw(self, account_id, amount):
+        return self._update((account_id, WITHDRAW, amount, None))[0]
+
+    def transfer(self, source_id, destination_id, amount):
+        check_transfer(source_id, destination_id)
+        self._update(
+            (source_id, TRANSFER_OUT, amount, destination_id),
+            (destination_id, TRANSFER_IN, amount, source_id)
+        )
+
+    def scan(self, segments=1, read_capacity=0, page_size=1000):
+        # Keyset pagination over the primary key, one page per query
+        last = ""
+        while True:
+            rows = self._connect().execute(
+                "SELECT account_id, item FROM accounts WHERE account_id > ? ORDER BY account_id LIMIT ?",
+                (last, page_size)
+            ).fetchall()
+            if not rows:
+                return
+            yield [decode_item(row[1]) for row in rows]
+            last = rows[-1][0]
+
+    def history(self, account_id, start=None, end=None, limit=50, cursor=None, newest_first=True):
+        # Range scan of the primary key index, one row past the page
+        # tells whether there is a next page
+        sql, params = "SELECT item FROM ledger WHERE account_id = ?", [account_id]
+        if start is not None:
+            sql, params = sql + " AND entry_id >= ?", params + [start]
+        if end is not None:
+            sql, params = sql + " AND entry_id < ?", params + [end]
+        if cursor is not None:
+            sql += " AND entry_id < ?" if newest_first else " AND entry_id > ?"
+            params.append(decode_cursor(cursor, account_id)["entry_id"])
+        sql += " ORDER BY entry_id DESC LIMIT ?" if newest_first else " ORDER BY entry_id LIMIT ?"
+        rows = self._connect().execute(sql, params + [limit + 1]).fetchall()
+
+        page = [decode_item(row[0]) for row in rows[:limit]]
+        return page, encode_cursor(page[-1]) if len(rows) > limit else None
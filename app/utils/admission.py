@@ -0,0 +1,193 @@
+import math
+import time
+import threading
+from collections import OrderedDict
+from app.utils.metrics import registry
+
+admission_rejected = registry.counter(
+    "admission_rejected_total", "Requests shed before reaching storage, by reason.", ("reason",))
+admission_queue_wait = registry.histogram(
+    "admission_queue_wait_seconds", "Time requests waited for a concurrency slot.")
+admission_buckets = registry.gauge(
+    "admission_buckets", "Token buckets held, by limiter.", ("limiter",))
+
+
+class Rejected(Exception):
+    """
+    Request refused by admission control, answered with 429.
+
+    :param str reason: "account", "credential" or "concurrency"
+    :param float retry_after: Seconds after which a retry may be admitted
+    """
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Too many requests ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self):
+        # Retry-After takes whole seconds
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class RateLimiter:
+    """
+    Token buckets per key, e.g. account id or credential. A bucket holds
+    up to burst tokens and refills at rate tokens per second, a request
+    takes one token.
+
+    Buckets are kept in least recently used order. A bucket idle long
+    enough to be full again is the same as a new one, so it is evicted
+    and the state stays proportional to the keys active in the last
+    burst / rate seconds.
+
+    :param float rate: Tokens added per second
+    :param float burst: Bucket capacity
+    :param str name: Label of the admission_buckets gauge
+    """
+
+    def __init__(self, rate, burst, name="", clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.name = name
+        self.idle = burst / rate
+        self._clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def acquire(self, key):
+        """
+        :return: 0 when a token was taken, otherwise seconds until one is available
+        :rtype: float
+        """
+        now = self._clock()
+        with self._lock:
+            self._evict(now)
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+        admission_buckets.set(len(self._buckets), limiter=self.name)
+        return wait
+
+    def _evict(self, now):
+        while self._buckets:
+            key, (tokens, updated) = next(iter(self._buckets.items()))
+            if now - updated < self.idle:
+                return
+            del self._buckets[key]
+
+
+class ConcurrencyLimiter:
+    """
+    Cap on requests served at once. Beyond limit, up to queue_size
+    requests wait at most timeout seconds for a slot, the others are
+    rejected at once.
+
+    :param int limit: Requests served at once
+    :param int queue_size: Requests allowed to wait for a slot
+    :param float timeout: Seconds a request waits in the queue
+    """
+
+    def __init__(self, limit, queue_size=0, timeout=0.05):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """
+        :return: True when a slot was taken
+        :rtype: bool
+        """
+        with self._cond:
+            if self.active < self.limit:
+                self.active += 1
+                return True
+            if self.waiting >= self.queue_size:
+                return False
+
+            self.waiting += 1
+            started = time.perf_counter()
+            try:
+                admitted = self._cond.wait_for(lambda: self.active < self.limit, self.timeout)
+            finally:
+                self.waiting -= 1
+                admission_queue_wait.observe(time.perf_counter() - started)
+            if admitted:
+                self.active += 1
+            return admitted
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+
+class AdmissionControl:
+    """
+    Admission of one request: the credential and account token buckets,
+    then a concurrency slot. Any part can be None to disable it.
+
+    :param credentials: RateLimiter keyed by username
+    :param accounts: RateLimiter keyed by account id
+    :param concurrency: ConcurrencyLimiter of the process
+    """
+
+    def __init__(self, credentials=None, accounts=None, concurrency=None):
+        self.credentials = credentials
+        self.accounts = accounts
+        self.concurrency = concurrency
+
+    def admit(self, credential=None, account_id=None):
+        """
+        :return: True when a concurrency slot was taken and must be released
+        :rtype: bool
+        :raises Rejected: request is over a limit
+        """
+        for reason, limiter, key in (("credential", self.credentials, credential),
+                                     ("account", self.accounts, account_id)):
+            if limiter is None or key is None:
+                continue
+            wait = limiter.acquire(key)
+            if wait:
+                admission_rejected.inc(reason=reason)
+                raise Rejected(reason, wait)
+
+        if self.concurrency is None:
+            return False
+        if not self.concurrency.acquire():
+            admission_rejected.inc(reason="concurrency")
+            raise Rejected("concurrency", self.concurrency.timeout)
+        return True
+
+    def release(self):
+        self.concurrency.release()
+
+
+def build_admission_control(account_rate=0, account_burst=None, credential_rate=0, credential_burst=None,
+                            max_concurrency=0, queue_size=0, queue_timeout=0.05):
+    """
+    Create admission control from configuration. A rate or concurrency
+    of 0 disables that limit, bursts default to one second of rate.
+    """
+    def limiter(rate, burst, name):
+        if rate <= 0:
+            return None
+        return RateLimiter(rate, burst or max(rate, 1), name=name)
+
+    return AdmissionControl(
+        credentials=limiter(credential_rate, credential_burst, "credential"),
+        accounts=limiter(account_rate, account_burst, "account"),
+        concurrency=ConcurrencyLimiter(max_concurrency, queue_size, queue_timeout) if max_concurrency > 0 else None
+    )
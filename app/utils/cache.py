@@ -0,0 +1,189 @@
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with an optional time to live.
+
+    :param int maxsize: Maximum number of entries kept, 0 disables the cache
+    :param float ttl: Seconds an entry stays valid, None keeps it until evicted
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class InMemoryRedis:
+    """
+    Minimal stand-in for the subset of the Redis client used by the
+    shared cache tier (get, set with px, delete). Used in tests and
+    local runs where no Redis server is available.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[name]
+                return None
+            return value
+
+    def set(self, name, value, px=None):
+        expires_at = time.monotonic() + px / 1000 if px else None
+        if isinstance(value, str):
+            value = value.encode()
+        with self._lock:
+            self._data[name] = (value, expires_at)
+        return True
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(self._data.pop(name, None) is not None for name in names)
+
+
+class AccountCache:
+    """
+    Read-through cache of account items with a local LRU+TTL tier and
+    an optional shared Redis-compatible tier. Items are stored in the
+    shared tier in DynamoDB wire format so Decimal values survive
+    exactly.
+
+    :param LRUCache local: In-process tier
+    :param shared: Redis-compatible client or None
+    :param float ttl: Seconds an item stays valid in the shared tier
+    """
+
+    def __init__(self, local, shared=None, ttl=None, prefix="account:"):
+        self.local = local
+        self.shared = shared
+        self.ttl = ttl
+        self.prefix = prefix
+        self.shared_hits = 0
+
+    @property
+    def enabled(self):
+        return self.local.maxsize > 0 or self.shared is not None
+
+    def get(self, account_id):
+        if not self.enabled:
+            return None
+
+        item = self.local.get(account_id)
+        if item is not None or self.shared is None:
+            return item
+
+        raw = self.shared.get(self.prefix + account_id)
+        if raw is None:
+            return None
+
+        item = {k: deserializer.deserialize(v) for k, v in json.loads(raw).items()}
+        self.shared_hits += 1
+        self.local.set(account_id, item)
+        return item
+
+    def put(self, account_id, item):
+        if not self.enabled:
+            return
+
+        self.local.set(account_id, item)
+        if self.shared is not None:
+            raw = json.dumps({k: serializer.serialize(v) for k, v in item.items()})
+            px = int(math.ceil(self.ttl * 1000)) if self.ttl else None
+            self.shared.set(self.prefix + account_id, raw, px=px)
+
+    def invalidate(self, account_id):
+        self.local.delete(account_id)
+        if self.shared is not None:
+            self.shared.delete(self.prefix + account_id)
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self):
+        return {
+            "hits": self.local.hits + self.shared_hits,
+            "local_hits": self.local.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.local.misses - self.shared_hits,
+            "evictions": self.local.evictions,
+            "size": len(self.local)
+        }
+
+
+def build_account_cache(size, ttl, redis_url=None):
+    """
+    Create the account cache from configuration. A TTL of 0 disables
+    caching entirely. The shared tier needs the optional redis package,
+    or "memory://" for the in-process stand-in.
+    """
+    if not ttl or ttl <= 0:
+        return AccountCache(LRUCache(0))
+
+    shared = None
+    if redis_url == "memory://":
+        shared = InMemoryRedis()
+    elif redis_url:
+        import redis
+        shared = redis.Redis.from_url(redis_url)
+
+    return AccountCache(LRUCache(size, ttl), shared=shared, ttl=ttl)
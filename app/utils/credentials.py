@@ -0,0 +1,88 @@
+import time
+import threading
+
+
+class CredentialProvider:
+    """
+    Lazily loaded, cached credentials with background refresh.
+
+    Nothing is fetched until the first call to get(), or to prefetch().
+    Once the cached value is older than the TTL it keeps being served
+    while a single background thread reloads it, so a rotated secret is
+    picked up without a restart and without blocking requests.
+
+    :param loader: callable returning the credentials
+    :param float ttl: Seconds before the cached credentials are refreshed
+    :param float min_refresh_interval: Minimum seconds between forced refreshes
+    """
+
+    def __init__(self, loader, ttl=300, min_refresh_interval=30):
+        self.loader = loader
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._value = None
+        self._next_refresh = 0.0
+        self._last_attempt = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    @property
+    def loaded(self):
+        return self._value is not None
+
+    def get(self):
+        """
+        Return the cached credentials, loading them on first use and
+        starting a background refresh once they are older than the TTL.
+        """
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._store(self.loader())
+            return self._value
+
+        if time.monotonic() >= self._next_refresh:
+            self.refresh_async()
+        return self._value
+
+    def refresh_async(self, force=False):
+        """
+        Reload the credentials on a background thread. A forced refresh,
+        e.g. after a failed login during secret rotation, is rate limited
+        by min_refresh_interval.
+        """
+        now = time.monotonic()
+        if force and now - self._last_attempt < self.min_refresh_interval:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self._last_attempt = now
+        threading.Thread(target=self._refresh, daemon=True).start()
+
+    def prefetch(self):
+        # Warm the cache without blocking, e.g. when a worker starts
+        if self._value is None:
+            self.refresh_async()
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+
+    def _refresh(self):
+        try:
+            value = self.loader()
+        except Exception:
+            # Keep serving the cached value and retry a little later
+            value = None
+        with self._lock:
+            if value is not None:
+                self._store(value)
+            else:
+                self._next_refresh = time.monotonic() + self.min_refresh_interval
+            self._refreshing = False
+
+    def _store(self, value):
+        self._value = value
+        self._next_refresh = time.monotonic() + self.ttl
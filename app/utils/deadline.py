@@ -0,0 +1,85 @@
+import time
+import contextvars
+from app.utils.metrics import registry
+
+deadline_exceeded = registry.counter(
+    "request_deadline_exceeded_total", "Requests that ran out of their time budget, by where it ran out.", ("stage",))
+
+# Monotonic time the current request must be answered by, None for no limit
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """
+    Time budget of the request spent, answered with 504. Not a botocore
+    error, so handlers catching ClientError let it through.
+
+    :param str stage: Where the budget ran out, e.g. "GetItem" or "pool"
+    """
+
+    def __init__(self, stage="request"):
+        super().__init__("Deadline exceeded")
+        self.stage = stage
+
+
+def request_budget(header=None, default=0):
+    """
+    Seconds a request may take: the X-Request-Timeout-Ms header, which
+    can only shorten a configured default, or the default alone.
+
+    :param str header: Header value in milliseconds
+    :param float default: Default budget in seconds, 0 for none
+    :return: budget in seconds, None when the request has none
+    """
+    budgets = [default] if default > 0 else []
+    try:
+        if header is not None and float(header) > 0:
+            budgets.append(float(header) / 1000)
+    except ValueError:
+        pass
+    return min(budgets) if budgets else None
+
+def start(budget):
+    """
+    Set the deadline of the current context budget seconds from now.
+
+    :return: token for reset()
+    """
+    return _deadline.set(time.monotonic() + budget if budget is not None else None)
+
+def reset(token):
+    _deadline.reset(token)
+
+def remaining():
+    """
+    :return: seconds left in the current budget, None without a deadline
+    :rtype: float
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def bounded(timeout):
+    # The smaller of timeout (None waits forever) and the time left
+    left = remaining()
+    if left is None:
+        return timeout
+    left = max(0.0, left)
+    return left if timeout is None else min(timeout, left)
+
+def check(stage):
+    """
+    :raises DeadlineExceeded: the budget of the current request is spent
+    """
+    left = remaining()
+    if left is not None and left <= 0:
+        deadline_exceeded.inc(stage=stage)
+        raise DeadlineExceeded(stage)
+
+def propagate(func):
+    """
+    Wrap func to run in a copy of the current context, so the deadline
+    follows work handed to another thread. A context cannot be entered
+    by two threads at once, so wrap once per task submitted.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
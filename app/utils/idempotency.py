@@ -0,0 +1,269 @@
+import json
+import time
+import hashlib
+import threading
+from botocore.exceptions import ClientError
+from app.utils.cache import LRUCache, deserializer
+from app.utils.metrics import registry, InstrumentedDynamoDB
+
+idempotent_replays = registry.counter(
+    "idempotent_replays_total", "Requests answered from a stored Idempotency-Key result.", ("tier",))
+
+# Marker for a key another request is still executing
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+# Result stored for a request that failed in a way that may have
+# applied it, retries replay it rather than apply it a second time
+FAILED_BODY = json.dumps({"error": "Internal server error"})
+
+
+class IdempotencyError(Exception):
+    """An Idempotency-Key that cannot be served, with its HTTP status."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class NotApplied(Exception):
+    """
+    Failure of an idempotent request that is known to have happened
+    before it changed anything, so its key is released and a retry runs
+    again. The request is answered with status and body, or error is
+    raised again when given.
+    """
+
+    def __init__(self, status=None, body=None, error=None):
+        super().__init__(str(error) if error is not None else body)
+        self.status = status
+        self.body = body
+        self.error = error
+
+
+def fingerprint(payload):
+    """
+    Compact digest of a request payload, to detect a key reused for a
+    different request.
+
+    :rtype: bytes
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).digest()
+
+
+class DynamoDBIdempotencyTier:
+    """
+    Idempotency records shared by every worker, in a DynamoDB table
+    with the string partition key idempotency_key and TTL enabled on
+    expires_at.
+
+    A request claims its key with a conditional put. The claim is a
+    lease: a worker that dies mid-request leaves a record the next
+    retry can take over once lease_expires has passed.
+
+    :param table: boto3 DynamoDB Table
+    """
+
+    def __init__(self, table):
+        self.table = InstrumentedDynamoDB(table)
+
+    def claim(self, key, digest, lease, ttl):
+        """
+        :return: None when the key was claimed, IN_PROGRESS or the
+            stored (fingerprint, status, body) entry otherwise
+        """
+        now = int(time.time())
+        try:
+            self.table.put_item(
+                Item={
+                    "idempotency_key": key,
+                    "state": IN_PROGRESS,
+                    "fingerprint": digest,
+                    "lease_expires": now + int(lease) + 1,
+                    "expires_at": now + int(ttl)
+                },
+                # DynamoDB deletes expired items lazily, treat them as absent
+                ConditionExpression="attribute_not_exists(idempotency_key) OR expires_at < :now "
+                                    "OR (#state = :progress AND lease_expires < :now)",
+                ExpressionAttributeNames={"#state": "state"},
+                ExpressionAttributeValues={":now": now, ":progress": IN_PROGRESS},
+                ReturnValuesOnConditionCheckFailure="ALL_OLD"
+            )
+            return None
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            item = e.response.get("Item")
+            if item is not None:
+                item = {k: deserializer.deserialize(v) for k, v in item.items()}
+            return self._decode(item) or IN_PROGRESS
+
+    def get(self, key):
+        response = self.table.get_item(Key={"idempotency_key": key}, ConsistentRead=True)
+        return self._decode(response.get("Item"))
+
+    def complete(self, key, entry, ttl):
+        digest, status, body = entry
+        self.table.put_item(Item={
+            "idempotency_key": key,
+            "state": COMPLETED,
+            "fingerprint": digest,
+            "status": status,
+            "body": body,
+            "expires_at": int(time.time()) + int(ttl)
+        })
+
+    def release(self, key):
+        try:
+            self.table.delete_item(
+                Key={"idempotency_key": key},
+                ConditionExpression="#state = :progress",
+                ExpressionAttributeNames={"#state": "state"},
+                ExpressionAttributeValues={":progress": IN_PROGRESS}
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+    @staticmethod
+    def _decode(item):
+        now = time.time()
+        if item is None or item.get("expires_at", now) < now:
+            return None
+        if item.get("state") == COMPLETED:
+            digest = item["fingerprint"]
+            return (getattr(digest, "value", digest), int(item["status"]), item["body"])
+        if item.get("lease_expires", 0) >= now:
+            return IN_PROGRESS
+        return None
+
+
+class IdempotencyStore:
+    """
+    Runs a request at most once per Idempotency-Key and replays the
+    stored result for retries.
+
+    Results live in a bounded in-process LRU+TTL tier as compact
+    (fingerprint, status, body) tuples, in front of an optional
+    persistent tier shared across workers. Duplicates that arrive while
+    the first request runs wait for its result instead of running
+    again. Only a NotApplied failure releases the key for a retry;
+    server errors and exceptions may come after the write committed,
+    so they are stored like any result, an exception as a 500.
+
+    :param LRUCache local: In-process tier
+    :param persistent: DynamoDBIdempotencyTier or None
+    :param float ttl: Seconds a result is replayed for
+    :param float wait: Seconds a duplicate waits for the first request
+    :param float lease: Seconds a claim of the persistent tier holds, at
+        least the longest a request can run, or a slow first request
+        loses its key to a retry on another worker
+    """
+
+    def __init__(self, local, persistent=None, ttl=86400, wait=10.0, poll_interval=0.05, lease=30.0):
+        self.local = local
+        self.persistent = persistent
+        self.ttl = ttl
+        self.wait = wait
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def execute(self, key, digest, func):
+        """
+        Run func, returning (status, body), unless key already has a
+        result.
+
+        :return: status and body, from func or replayed
+        :rtype: tuple
+        :raises IdempotencyError: key reused for another payload (422),
+            or still running after the wait (409)
+        """
+        deadline = time.monotonic() + self.wait
+        while True:
+            entry = self.local.get(key)
+            if entry is not None:
+                idempotent_replays.inc(tier="local")
+                return self._replay(entry, digest)
+
+            with self._lock:
+                event = self._pending.get(key)
+                leader = event is None
+                if leader:
+                    event = self._pending[key] = threading.Event()
+
+            if not leader:
+                # Same key in flight in this process, wait for its result
+                if not event.wait(max(deadline - time.monotonic(), 0)):
+                    raise IdempotencyError("A request with this Idempotency-Key is in progress", 409)
+                continue
+
+            try:
+                return self._execute(key, digest, func, deadline)
+            finally:
+                with self._lock:
+                    self._pending.pop(key, None)
+                event.set()
+
+    def _execute(self, key, digest, func, deadline):
+        if self.persistent is not None:
+            entry = self._claim(key, digest, deadline)
+            if entry is not None:
+                idempotent_replays.inc(tier="persistent")
+                self.local.set(key, entry)
+                return self._replay(entry, digest)
+
+        try:
+            status, body = func()
+        except NotApplied as e:
+            self._release(key)
+            if e.error is not None:
+                raise e.error
+            return e.status, e.body
+        except Exception:
+            self._complete(key, (digest, 500, FAILED_BODY))
+            raise
+
+        self._complete(key, (digest, status, body))
+        return status, body
+
+    def _complete(self, key, entry):
+        if self.persistent is not None:
+            self.persistent.complete(key, entry, self.ttl)
+        self.local.set(key, entry)
+
+    def _claim(self, key, digest, deadline):
+        # Another worker may hold the key, poll until it completes
+        entry = self.persistent.claim(key, digest, self.lease, self.ttl)
+        while entry is IN_PROGRESS:
+            if time.monotonic() >= deadline:
+                raise IdempotencyError("A request with this Idempotency-Key is in progress", 409)
+            time.sleep(self.poll_interval)
+            entry = self.persistent.get(key)
+            if entry is None:
+                entry = self.persistent.claim(key, digest, self.lease, self.ttl)
+        return entry
+
+    def _release(self, key):
+        if self.persistent is not None:
+            self.persistent.release(key)
+
+    @staticmethod
+    def _replay(entry, digest):
+        stored_digest, status, body = entry
+        if stored_digest != digest:
+            raise IdempotencyError("Idempotency-Key reused with a different payload", 422)
+        return status, body
+
+
+def build_idempotency_store(size, ttl, table_name=None, resource=None, wait=10.0, lease=30.0):
+    """
+    Create the idempotency store from configuration. The persistent
+    tier is used when a table name is given.
+    """
+    persistent = None
+    if table_name:
+        persistent = DynamoDBIdempotencyTier(resource.Table(table_name))
+    return IdempotencyStore(LRUCache(size, ttl), persistent=persistent, ttl=ttl, wait=wait, lease=lease)
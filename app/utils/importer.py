@@ -0,0 +1,240 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from app.utils.validator import ACCOUNT_IMPORT, parse_body
+
+# Items per put_many call, what one BatchWriteItem takes
+CHUNK_SIZE = 25
+
+
+class ImportFailed(Exception):
+    """A chunk could not be written, the import stopped at the checkpoint."""
+
+
+def read_ndjson(stream):
+    """
+    Yield (record, error) per non-blank line of an NDJSON stream, read
+    one line at a time.
+    """
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            record = parse_body(line)
+        except ValueError:
+            yield None, "Invalid JSON"
+            continue
+        yield (record, None) if isinstance(record, dict) else (None, "Record is not a JSON object")
+
+def read_csv(stream):
+    # Header row names the fields, empty cells count as missing
+    for row in csv.DictReader(stream):
+        yield row, None
+
+READERS = {"ndjson": read_ndjson, "csv": read_csv}
+
+
+class Checkpoint:
+    """
+    Number of leading records of a file that are imported, kept in a
+    small JSON file replaced atomically, so a crash leaves either the
+    old or the new count.
+
+    :param str path: Checkpoint file
+    :param str source: File being imported, a checkpoint of another file is refused
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = os.path.abspath(source)
+
+    def load(self):
+        """
+        :return: records to skip, 0 without a checkpoint
+        :raises ValueError: checkpoint of another file
+        """
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        if data.get("source") != self.source:
+            raise ValueError(f"Checkpoint {self.path} is for {data.get('source')}")
+        return data["records"]
+
+    def save(self, records):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"source": self.source, "records": records}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+class _Watermark:
+    """
+    Records [0, position) whose chunks all completed. Chunks finish out
+    of order, one that completes ahead waits in pending until the
+    chunks before it are done.
+    """
+
+    def __init__(self, position):
+        self.position = position
+        self._pending = {}
+
+    def complete(self, first, end):
+        self._pending[first] = end
+        while self.position in self._pending:
+            self.position = self._pending.pop(self.position)
+
+
+def import_accounts(storage, records, start=0, workers=8, chunk_size=CHUNK_SIZE, checkpoint=None,
+                    checkpoint_interval=5.0, rejects=None, progress=None, progress_interval=2.0):
+    """
+    Validate account records and write them with put_many calls of
+    chunk_size items on a pool of workers. At most two chunks per worker
+    are in flight, so memory stays flat whatever the size of the file.
+
+    Puts create or replace whole items, so records written again after
+    a resume end up the same. The checkpoint only moves past records
+    whose chunk and every chunk before it were written; a chunk that
+    fails, or keeps unprocessed items after the storage retries, stops
+    the import there.
+
+    :param records: iterable of (record, error) in file order
+    :param int start: leading records already imported, they are skipped
+    :param checkpoint: Checkpoint saved every checkpoint_interval seconds and at the end
+    :param rejects: stream invalid records are reported to, one JSON line each
+    :param progress: function called with the stats every progress_interval seconds
+    :return: stats of the import
+    :rtype: dict
+    :raises ImportFailed: a chunk was not written
+    """
+    watermark = _Watermark(start)
+    in_flight = {}
+    failures = []
+    written = rejected = 0
+    position = start
+    started = last_progress = last_checkpoint = time.monotonic()
+
+    def stats():
+        elapsed = time.monotonic() - started
+        return {
+            "skipped": start,
+            "records": position - start,
+            "written": written,
+            "rejected": rejected,
+            "checkpoint": watermark.position,
+            "elapsed_seconds": round(elapsed, 3),
+            "items_per_second": round(written / elapsed, 1) if elapsed > 0 else 0.0
+        }
+
+    def collect(futures):
+        nonlocal written
+        for future in futures:
+            first, end, count = in_flight.pop(future)
+            error = future.exception()
+            if error is None and future.result():
+                error = f"{len(future.result())} items unprocessed after retries"
+            if error is not None:
+                failures.append(ImportFailed(f"Records {first} to {end - 1} were not written: {error}"))
+                continue
+            written += count
+            watermark.complete(first, end)
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="import")
+    try:
+        chunk, first = [], start
+        for record, error in islice(records, start, None):
+            if error is None:
+                values, error = ACCOUNT_IMPORT.validate(record)
+            if error is not None:
+                rejected += 1
+                if rejects is not None:
+                    rejects.write(json.dumps({"record": position, "error": error}) + "\n")
+            else:
+                chunk.append(values)
+            position += 1
+
+            if len(chunk) == chunk_size:
+                while len(in_flight) >= workers * 2:
+                    collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+                if failures:
+                    break
+                in_flight[executor.submit(storage.put_many, chunk)] = (first, position, len(chunk))
+                chunk, first = [], position
+
+            now = time.monotonic()
+            if progress is not None and now - last_progress >= progress_interval:
+                last_progress = now
+                progress(stats())
+            if checkpoint is not None and now - last_checkpoint >= checkpoint_interval:
+                last_checkpoint = now
+                checkpoint.save(watermark.position)
+        else:
+            # Last partial chunk, or rejected records after the last chunk
+            if chunk:
+                in_flight[executor.submit(storage.put_many, chunk)] = (first, position, len(chunk))
+            else:
+                watermark.complete(first, position)
+    finally:
+        # Also on Ctrl-C, the chunks already sent still count
+        collect(wait(in_flight).done)
+        executor.shutdown()
+        if checkpoint is not None:
+            checkpoint.save(watermark.position)
+
+    if failures:
+        raise failures[0]
+    return stats()
+
+
+def main(argv=None):
+    # Usage, python -m app.utils.importer accounts.ndjson --checkpoint accounts.checkpoint
+    from app.storage import build_storage
+
+    parser = argparse.ArgumentParser(description="Import accounts from an NDJSON or CSV file")
+    parser.add_argument("file")
+    parser.add_argument("--format", choices=sorted(READERS), help="Defaults to the file extension, else ndjson")
+    parser.add_argument("--workers", type=int, default=8, help="Parallel BatchWriteItem calls")
+    parser.add_argument("--checkpoint", help="File the progress is kept in, an import resumes from it")
+    parser.add_argument("--rejects", help="File invalid records are appended to, one JSON line each")
+    parser.add_argument("--progress", type=float, default=2, help="Seconds between progress lines on stderr, 0 for none")
+    parser.add_argument("--backend", help="Storage backend, defaults to STORAGE_BACKEND")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.file.lower().endswith(".csv") else "ndjson")
+    checkpoint = Checkpoint(args.checkpoint, args.file) if args.checkpoint else None
+    try:
+        start = checkpoint.load() if checkpoint else 0
+    except ValueError as e:
+        parser.error(str(e))
+
+    def progress(stats):
+        print(json.dumps(stats), file=sys.stderr)
+
+    storage = build_storage(args.backend)
+    rejects = open(args.rejects, "a") if args.rejects else None
+    try:
+        with open(args.file, newline="" if fmt == "csv" else None, encoding="utf-8") as stream:
+            stats = import_accounts(storage, READERS[fmt](stream), start, args.workers, checkpoint=checkpoint,
+                                    rejects=rejects, progress=progress if args.progress else None,
+                                    progress_interval=args.progress)
+    except ImportFailed as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        return 1
+    finally:
+        if rejects is not None:
+            rejects.close()
+
+    print(json.dumps(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
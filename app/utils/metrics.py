@@ -0,0 +1,249 @@
+import time
+import threading
+
+# Latency buckets in seconds, fine grained at the low end for DynamoDB calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """
+    Base of the metric types. Values are kept per tuple of label values
+    in the order of labelnames.
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels):
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key, [("le", "+Inf")])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """
+    Collection of metrics rendered in the Prometheus text format.
+    Collectors are callables run at scrape time that set gauges from
+    state kept elsewhere, e.g. cache statistics.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Process wide registry exposed on /metrics
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status"))
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+http_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests being served.")
+
+dynamodb_request_duration = registry.histogram(
+    "dynamodb_request_duration_seconds", "DynamoDB call latency, including botocore retries.", ("operation",))
+dynamodb_in_flight = registry.gauge(
+    "dynamodb_requests_in_flight", "DynamoDB calls waiting for a response.", ("operation",))
+dynamodb_errors = registry.counter(
+    "dynamodb_errors_total", "DynamoDB calls that failed, by error code.", ("operation", "code"))
+dynamodb_throttles = registry.counter(
+    "dynamodb_throttles_total", "DynamoDB calls rejected for throughput.", ("operation",))
+dynamodb_retries = registry.counter(
+    "dynamodb_retries_total", "Retries botocore made for DynamoDB calls.", ("operation",))
+dynamodb_consumed_capacity = registry.counter(
+    "dynamodb_consumed_capacity_units_total", "Capacity units consumed by DynamoDB calls.", ("operation",))
+
+THROTTLING_CODES = {
+    "ProvisionedThroughputExceededException", "ThrottlingException", "RequestLimitExceeded"
+}
+
+# DynamoDB operations of a boto3 resource, table or client that are timed
+INSTRUMENTED_OPERATIONS = {
+    "get_item", "put_item", "update_item", "delete_item", "query", "scan",
+    "batch_get_item", "batch_write_item", "transact_get_items", "transact_write_items"
+}
+
+
+def _capacity_units(consumed):
+    if not consumed:
+        return 0.0
+    if isinstance(consumed, list):
+        return sum(entry.get("CapacityUnits", 0) for entry in consumed)
+    return consumed.get("CapacityUnits", 0)
+
+
+class InstrumentedDynamoDB:
+    """
+    Proxy around a boto3 DynamoDB resource, table or client that records
+    latency, in-flight calls, consumed capacity (ReturnConsumedCapacity
+    is requested on every call), errors, throttles and botocore retries.
+    Any other attribute is passed through to the wrapped object.
+    """
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name not in INSTRUMENTED_OPERATIONS:
+            return attr
+
+        def call(**kwargs):
+            kwargs.setdefault("ReturnConsumedCapacity", "TOTAL")
+            dynamodb_in_flight.inc(operation=name)
+            start = time.perf_counter()
+            try:
+                response = attr(**kwargs)
+            except Exception as e:
+                self._record_error(name, e)
+                raise
+            finally:
+                dynamodb_in_flight.dec(operation=name)
+                dynamodb_request_duration.observe(time.perf_counter() - start, operation=name)
+
+            self._record_response(name, response)
+            return response
+        return call
+
+    def _record_response(self, name, response):
+        metadata = response.get("ResponseMetadata", {})
+        if metadata.get("RetryAttempts"):
+            dynamodb_retries.inc(metadata["RetryAttempts"], operation=name)
+        units = _capacity_units(response.get("ConsumedCapacity"))
+        if units:
+            dynamodb_consumed_capacity.inc(units, operation=name)
+
+    def _record_error(self, name, error):
+        response = getattr(error, "response", None)
+        if response is None:
+            dynamodb_errors.inc(operation=name, code=type(error).__name__)
+            return
+
+        code = response.get("Error", {}).get("Code", "Unknown")
+        dynamodb_errors.inc(operation=name, code=code)
+        if code in THROTTLING_CODES:
+            dynamodb_throttles.inc(operation=name)
+        self._record_response(name, response)
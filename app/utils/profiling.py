@@ -0,0 +1,300 @@
+import os
+import json
+import time
+import random
+import marshal
+import pstats
+import cProfile
+import threading
+from app.utils.metrics import registry
+
+profiled_requests = registry.counter(
+    "profiled_requests_total", "Requests run under the sampling profiler, by route.", ("route",))
+
+# Frames of a collapsed stack beyond which deeper calls are cut
+MAX_STACK_DEPTH = 64
+
+
+class RequestProfiler:
+    """
+    cProfile of a sampled share of requests, merged per route. While
+    the rate is 0 a request costs one attribute read; a sampled request
+    runs under cProfile, which adds roughly a function call's worth of
+    overhead to every call it makes.
+
+    One request is profiled at a time, the samples that arrive while
+    another runs are skipped. cProfile only sees the thread it was
+    enabled on, so work a request hands to a thread pool (parallel
+    BatchGetItem chunks, hedged reads) shows up as the wait for it.
+
+    With a directory, the worker processes of a server share the rate
+    and the profiles through it: the rate set by any of them is picked
+    up by the others within refresh seconds, each writes its profiles
+    to a file of its own after every sampled request, and the profiles
+    read back merge the files of every worker. A reset bumps a
+    generation kept with the rate, older files are ignored and deleted.
+
+    :param float rate: Share of requests profiled, 0 switches profiling off
+    :param str directory: Directory shared by the worker processes, None keeps everything in this process
+    :param float refresh: Seconds between reads of the shared rate
+    """
+
+    def __init__(self, rate=0.0, directory=None, refresh=1.0):
+        self.rate = self._checked(rate)
+        self.directory = directory
+        self.refresh = refresh
+        self._generation = 0
+        self._next_poll = 0.0
+        self._running = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._requests = {}
+
+    @staticmethod
+    def _checked(rate):
+        rate = float(rate)
+        if not 0 <= rate <= 1:
+            raise ValueError("Rate must be between 0 and 1")
+        return rate
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _write(self, name, data):
+        # Replaced atomically, a reader sees the old or the new file
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self._path(f"{name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._path(name))
+
+    def _settings(self):
+        try:
+            with open(self._path("settings.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def poll(self):
+        """
+        The sample rate, re-read from the shared directory at most every
+        refresh seconds. A worker that sees a new generation drops the
+        profiles it holds.
+
+        :rtype: float
+        """
+        if self.directory is None:
+            return self.rate
+        now = time.monotonic()
+        if now >= self._next_poll:
+            self._next_poll = now + self.refresh
+            self._reload()
+        return self.rate
+
+    def _reload(self):
+        settings = self._settings()
+        if settings is not None:
+            self.rate = settings["rate"]
+            if settings["generation"] != self._generation:
+                with self._lock:
+                    self._generation = settings["generation"]
+                    self._stats.clear()
+                    self._requests.clear()
+
+    def _share(self, rate, generation):
+        self._write("settings.json", json.dumps({"rate": rate, "generation": generation}).encode())
+
+    def set_rate(self, rate):
+        """
+        :raises ValueError: rate is not between 0 and 1
+        """
+        self.rate = self._checked(rate)
+        if self.directory is not None:
+            settings = self._settings()
+            self._share(self.rate, settings["generation"] if settings else self._generation)
+
+    def start(self):
+        """
+        :return: the enabled profile of a sampled request, None otherwise
+        """
+        if self.rate <= 0 or random.random() >= self.rate:  # nosec B311
+            return None
+        if not self._running.acquire(blocking=False):
+            return None
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler, e.g. a debugger, holds the interpreter hook
+            self._running.release()
+            return None
+        return profile
+
+    def stop(self, profile, route):
+        try:
+            profile.disable()
+        finally:
+            self._running.release()
+
+        stats = pstats.Stats(profile)
+        with self._lock:
+            if route in self._stats:
+                self._stats[route].add(stats)
+            else:
+                self._stats[route] = stats
+            self._requests[route] = self._requests.get(route, 0) + 1
+            if self.directory is not None:
+                # Named after the process, the profiler is created before the fork
+                self._write(f"worker-{os.getpid()}-{id(self)}.prof", marshal.dumps({
+                    "generation": self._generation,
+                    "routes": {name: (self._requests[name], s.stats) for name, s in self._stats.items()}
+                }))
+        profiled_requests.inc(route=route)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._requests.clear()
+            if self.directory is None:
+                return
+            settings = self._settings()
+            self._generation = (settings["generation"] if settings else self._generation) + 1
+            for name in self._worker_files():
+                os.remove(self._path(name))
+        self._share(self.rate, self._generation)
+
+    def _worker_files(self):
+        try:
+            return [name for name in os.listdir(self.directory) if name.endswith(".prof")]
+        except FileNotFoundError:
+            return []
+
+    def _snapshot(self):
+        # Requests and stats per route, of every worker when shared
+        if self.directory is None:
+            with self._lock:
+                return {route: (self._requests[route], stats) for route, stats in self._stats.items()}
+
+        self._reload()
+        merged = {}
+        for name in self._worker_files():
+            try:
+                with open(self._path(name), "rb") as f:
+                    data = marshal.load(f)  # nosec B302
+            except (FileNotFoundError, EOFError, ValueError):
+                continue
+            if data["generation"] != self._generation:
+                continue
+            for route, (requests, entries) in data["routes"].items():
+                stats = pstats.Stats()
+                stats.stats = entries
+                stats.get_top_level_stats()
+                if route in merged:
+                    merged[route][1].add(stats)
+                    merged[route] = (merged[route][0] + requests, merged[route][1])
+                else:
+                    merged[route] = (requests, stats)
+        return merged
+
+    def routes(self):
+        """
+        :return: profiled requests and the time they spent per route
+        :rtype: dict
+        """
+        return {
+            route: {"requests": requests, "seconds": round(stats.total_tt, 6)}
+            for route, (requests, stats) in self._snapshot().items()
+        }
+
+    def _selected(self, route=None):
+        snapshot = self._snapshot()
+        if route is None:
+            return [(name, stats) for name, (_, stats) in snapshot.items()]
+        return [(route, snapshot[route][1])] if route in snapshot else []
+
+    def pstats(self, route=None):
+        """
+        Stats of one route, or of every route merged, in the marshal
+        format of pstats.Stats.dump_stats.
+
+        :return: file contents, None when nothing was profiled
+        :rtype: bytes
+        """
+        selected = self._selected(route)
+        if not selected:
+            return None
+        merged = pstats.Stats()
+        with self._lock:
+            merged.add(*(stats for _, stats in selected))
+        return marshal.dumps(merged.stats)
+
+    def collapsed(self, route=None):
+        """
+        Stacks in the collapsed format read by flamegraph.pl and
+        speedscope, each starting with its route.
+
+        :return: file contents, None when nothing was profiled
+        :rtype: str
+        """
+        selected = self._selected(route)
+        if not selected:
+            return None
+        lines = []
+        with self._lock:
+            for name, stats in selected:
+                stacks = collapsed_stacks(stats, (name,))
+                lines.extend(f"{stack} {value}" for stack, value in sorted(stacks.items()))
+        return "\n".join(lines) + "\n"
+
+
+def _frame(func):
+    filename, line, name = func
+    if filename == "~":
+        # Built-ins, e.g. <method 'dumps' of ...>
+        frame = name
+    else:
+        frame = f"{name} ({'/'.join(filename.split(os.sep)[-2:])}:{line})"
+    return frame.replace(";", ",")
+
+def collapsed_stacks(stats, prefix=()):
+    """
+    Rebuild call stacks from a pstats.Stats. cProfile records the time
+    per caller and callee pair, not whole stacks, so the time of a
+    function reached from several stacks is shared out in proportion
+    to the time each caller spent in it. Recursive calls end a stack.
+
+    :param prefix: frames put in front of every stack
+    :return: self time in microseconds keyed by ";" separated stack
+    :rtype: dict
+    """
+    entries = stats.stats
+    callees = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    stacks = {}
+
+    def walk(func, path, frames, share):
+        _, _, tottime, _, _ = entries[func]
+        frames = frames + (_frame(func),)
+        value = int(tottime * share * 1e6)
+        if value > 0:
+            key = ";".join(frames)
+            stacks[key] = stacks.get(key, 0) + value
+        if len(frames) - len(prefix) >= MAX_STACK_DEPTH:
+            return
+
+        path = path + (func,)
+        for callee, edge_time in callees.get(func, ()):
+            cumtime = entries[callee][3]
+            # Branches under a microsecond would only add empty lines
+            if callee in path or cumtime <= 0 or edge_time * share < 1e-6:
+                continue
+            walk(callee, path, frames, min(1.0, share * edge_time / cumtime))
+
+    for func, (_, _, _, _, callers) in entries.items():
+        if not callers:
+            walk(func, (), tuple(prefix), 1.0)
+    return stacks
@@ -0,0 +1,126 @@
+import sys
+import json
+import time
+import argparse
+from decimal import Decimal, InvalidOperation
+from app.storage.base import to_decimal, withdrawn_on
+
+# Upper bounds of the daily_amount_withdrawn distribution, the last
+# bucket takes everything above
+WITHDRAWN_BUCKETS = (0, 100, 500, 1000, 2500, 5000, 10000)
+
+
+class AccountReport:
+    """
+    Aggregates of account items over the whole table: total balance,
+    what was withdrawn today and its distribution, and the accounts
+    near their daily limit. Shard items of a sharded account only add
+    their balance.
+
+    :param str today: Date the daily counters are read for
+    :param float near_limit: Share of the daily limit from which an account counts as near it
+    :param buckets: Upper bounds of the withdrawn distribution
+    """
+
+    def __init__(self, today, near_limit=0.8, buckets=WITHDRAWN_BUCKETS):
+        self.today = today
+        self.near_limit = to_decimal(near_limit)
+        self.buckets = tuple(to_decimal(bound) for bound in buckets)
+        self.items = 0
+        self.accounts = 0
+        self.total_balance = Decimal("0")
+        self.withdrawn_today = Decimal("0")
+        self.near_daily_limit = 0
+        self.distribution = [0] * (len(self.buckets) + 1)
+
+    def add(self, items):
+        for item in items:
+            self.items += 1
+            self.total_balance += to_decimal(item.get("current_balance"))
+            if "shard_of" in item:
+                continue
+
+            self.accounts += 1
+            withdrawn = withdrawn_on(item, self.today)
+            self.withdrawn_today += withdrawn
+            daily_limit = to_decimal(item.get("daily_limit"))
+            if daily_limit > 0 and withdrawn >= daily_limit * self.near_limit:
+                self.near_daily_limit += 1
+
+            index = 0
+            while index < len(self.buckets) and withdrawn > self.buckets[index]:
+                index += 1
+            self.distribution[index] += 1
+
+    def to_dict(self):
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+        return {
+            "date": self.today,
+            "items_scanned": self.items,
+            "accounts": self.accounts,
+            "total_balance": self.total_balance,
+            "withdrawn_today": self.withdrawn_today,
+            "near_daily_limit": self.near_daily_limit,
+            "near_limit_ratio": self.near_limit,
+            "withdrawn_distribution": [{"le": le, "accounts": n} for le, n in zip(bounds, self.distribution)]
+        }
+
+
+def run_report(storage, segments=4, read_capacity=0, page_size=1000, near_limit=0.8,
+               buckets=WITHDRAWN_BUCKETS, progress_interval=2.0):
+    """
+    Scan the accounts and yield the report as it is built: the partial
+    aggregates of the pages read so far every progress_interval seconds,
+    then the final report.
+
+    :return: generator of report dicts, "partial" tells them apart
+    """
+    report = AccountReport(storage.today(), near_limit, buckets)
+    started = last = time.monotonic()
+    for page in storage.scan(segments, read_capacity, page_size):
+        report.add(page)
+        now = time.monotonic()
+        if progress_interval and now - last >= progress_interval:
+            last = now
+            yield dict(report.to_dict(), partial=True, elapsed_seconds=round(now - started, 3))
+    yield dict(report.to_dict(), partial=False, elapsed_seconds=round(time.monotonic() - started, 3))
+
+
+def parse_buckets(value):
+    """
+    :param str value: comma separated upper bounds, e.g. "100,500,1000"
+    :raises ValueError: not increasing numbers
+    """
+    try:
+        buckets = tuple(Decimal(bound.strip()) for bound in value.split(",") if bound.strip())
+    except InvalidOperation:
+        buckets = ()
+    if (not buckets or not all(bound.is_finite() for bound in buckets)
+            or list(buckets) != sorted(set(buckets))):
+        raise ValueError("Buckets must be increasing numbers")
+    return buckets
+
+
+def main(argv=None):
+    # Usage, python -m app.utils.report --segments 8 --read-capacity 100
+    from app.storage import build_storage
+    from app.utils.serialization import decimal_number
+
+    parser = argparse.ArgumentParser(description="Report balances and daily limit usage of every account")
+    parser.add_argument("--segments", type=int, default=4, help="Parallel scan segments")
+    parser.add_argument("--read-capacity", type=float, default=50, help="Read capacity units per second, 0 for no limit")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--near-limit", type=float, default=0.8, help="Share of the daily limit that counts as near it")
+    parser.add_argument("--buckets", type=parse_buckets, default=WITHDRAWN_BUCKETS)
+    parser.add_argument("--progress", type=float, default=0, help="Seconds between partial reports on stderr")
+    args = parser.parse_args(argv)
+
+    storage = build_storage()
+    for report in run_report(storage, args.segments, args.read_capacity, args.page_size,
+                             args.near_limit, args.buckets, args.progress):
+        print(json.dumps(report, default=decimal_number), file=sys.stderr if report["partial"] else sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import json
+from decimal import Decimal
+from flask.json.provider import JSONProvider
+
+# Decimals with at most this many significant digits survive a round
+# trip through float, so they can be written as JSON numbers exactly
+FLOAT_DIGITS = 15
+
+
+def decimal_number(value):
+    """
+    :return: the Decimal as a float when that keeps its exact value,
+        otherwise as a string
+    :rtype: float or str
+    """
+    text = str(value)
+    if not value.is_finite():
+        return text
+    # Short strings cannot hold more digits, skips the digit tuple
+    if len(text) <= FLOAT_DIGITS or len(value.as_tuple().digits) <= FLOAT_DIGITS:
+        return float(text)
+    return text
+
+def decimal_string(value):
+    return str(value)
+
+
+def select_fields(item, fields):
+    """
+    :param tuple fields: response fields to keep, None keeps the whole item
+    :return: item with only the whitelisted fields
+    :rtype: dict
+    """
+    if fields is None:
+        return item
+    return {field: item[field] for field in fields if field in item}
+
+
+def stdlib_encoder(default):
+    return json.JSONEncoder(default=default, ensure_ascii=False, separators=(",", ":")).encode
+
+def orjson_encoder(default):
+    import orjson
+
+    def dumps(obj):
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    return dumps
+
+ENCODERS = {"json": stdlib_encoder, "orjson": orjson_encoder}
+DECIMALS = {"number": decimal_number, "string": decimal_string}
+
+
+class FastJSONProvider(JSONProvider):
+    """
+    Flask JSON provider encoding Decimals, as returned by DynamoDB,
+    exactly: as a JSON number when a float holds the value (see
+    decimal_number), or always as a string. Responses are encoded with
+    orjson when it is installed and the standard library otherwise.
+
+    Parsing is left to the standard library, parse_body reads request
+    bodies to Decimal.
+
+    :param app: Flask application
+    :param str decimal: "number" or "string"
+    :param str encoder: "auto", "orjson" or "json"
+    """
+
+    def __init__(self, app, decimal="number", encoder="auto"):
+        super().__init__(app)
+        if decimal not in DECIMALS:
+            raise ValueError(f"Unknown JSON decimal format: {decimal}")
+        self._decimal = DECIMALS[decimal]
+
+        if encoder == "auto":
+            try:
+                import orjson  # noqa: F401
+                encoder = "orjson"
+            except ImportError:
+                encoder = "json"
+        if encoder not in ENCODERS:
+            raise ValueError(f"Unknown JSON encoder: {encoder}")
+        self.encoder = encoder
+        self._dumps = ENCODERS[encoder](self._default)
+
+    def _default(self, obj):
+        if isinstance(obj, Decimal):
+            return self._decimal(obj)
+        if isinstance(obj, (set, frozenset)):
+            return list(obj)
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Options such as indent are only understood by the stdlib encoder
+            kwargs.setdefault("default", self._default)
+            return json.dumps(obj, **kwargs)
+        return self._dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return json.loads(s, **kwargs)
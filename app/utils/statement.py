@@ -0,0 +1,99 @@
+import io
+import csv
+import functools
+from app.storage.base import DEBITS
+
+# Columns of a CSV statement, in order
+CSV_FIELDS = ("entry_id", "created_at", "type", "amount", "running_balance", "counterparty")
+
+
+def iter_ledger(storage, account_id, start=None, end=None, page_size=500, executor=None, first_page=None):
+    """
+    Yield the ledger entries of an account oldest first, one page in
+    memory at a time. With an executor the next page is fetched while
+    the current one is consumed.
+
+    :param first_page: (entries, cursor) already fetched, e.g. to
+        validate the request before streaming
+    """
+    fetch = functools.partial(storage.history, account_id, start, end, page_size, newest_first=False)
+    page, cursor = first_page if first_page is not None else fetch()
+    while True:
+        pending = executor.submit(fetch, cursor=cursor) if cursor and executor else None
+        yield from page
+        if cursor is None:
+            return
+        page, cursor = pending.result() if pending else fetch(cursor=cursor)
+
+
+def with_running_balance(entries, summary):
+    """
+    Add the running balance to ledger entries, starting from the
+    balance before the first one, and keep the totals in summary.
+    """
+    balance = None
+    for entry in entries:
+        amount = entry["amount"]
+        signed = -amount if entry["type"] in DEBITS else amount
+        if balance is None:
+            balance = entry["balance_after"] - signed
+            summary["opening_balance"] = balance
+        balance += signed
+
+        summary["entries"] += 1
+        summary["total_debits" if signed < 0 else "total_credits"] += amount
+        summary["closing_balance"] = balance
+        yield dict(entry, running_balance=balance)
+
+
+def chunked(lines, chunk_size):
+    # Join lines into chunks of at least chunk_size bytes before they
+    # are flushed to the client
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def ndjson_lines(entries, encode, summary):
+    for entry in with_running_balance(entries, summary):
+        yield encode(entry) + "\n"
+    # Last line totals the statement
+    yield encode(dict(summary, type="summary")) + "\n"
+
+
+def csv_lines(entries, summary):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=CSV_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for entry in with_running_balance(entries, summary):
+        writer.writerow(entry)
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    if out.tell():
+        yield out.getvalue()
+
+
+def render_statement(entries, fmt, encode, chunk_size=65536):
+    """
+    Render ledger entries as an NDJSON or CSV statement.
+
+    :param entries: iterable of ledger entries, oldest first
+    :param str fmt: "ndjson" or "csv"
+    :param encode: JSON encoder of one entry, e.g. the app's JSON provider
+    :return: byte chunks of the statement
+    :rtype: generator
+    """
+    summary = {
+        "entries": 0, "opening_balance": None, "closing_balance": None,
+        "total_credits": 0, "total_debits": 0
+    }
+    lines = csv_lines(entries, summary) if fmt == "csv" else ndjson_lines(entries, encode, summary)
+    return chunked(lines, chunk_size)
@@ -1,10 +1,165 @@
-def validate_amount(amount):
+import re
+import json
+from datetime import date
+from decimal import Decimal
+
+# Account ids are non-empty strings of ASCII digits
+ACCOUNT_ID_PATTERN = re.compile(r"[0-9]{1,32}")
+
+# Amounts have at most AMOUNT_SCALE decimal places and AMOUNT_PRECISION
+# significant digits in total
+AMOUNT_SCALE = 2
+AMOUNT_PRECISION = 15
+
+# Decoder built once, json.loads with parse_float builds one per call
+_decoder = json.JSONDecoder(parse_float=Decimal)
+
+
+def parse_body(raw):
+    """
+    Parse a JSON request body with numbers that have a fraction read
+    straight to Decimal, so amounts never pass through float.
+
+    :raises ValueError: body is not valid JSON
+    """
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode(json.detect_encoding(raw), "surrogatepass")
+    return _decoder.decode(raw)
+
+def is_account_id(value):
+    return isinstance(value, str) and ACCOUNT_ID_PATTERN.fullmatch(value) is not None
+
+def parse_account_id(value):
+    """
+    :return: account id as a string, from a digit string or a JSON integer
+    :rtype: str or None
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        value = str(value)
+    return value if is_account_id(value) else None
+
+
+def amount_parser(scale=AMOUNT_SCALE, precision=AMOUNT_PRECISION, allow_zero=False):
+    """
+    Build a parser of positive money amounts into Decimal, or of amounts
+    that may also be 0, e.g. balances, with allow_zero.
+
+    JSON numbers arrive as Decimal (see parse_body) or int and
+    strings are read as plain decimals, so the value is never rounded
+    through a float. Amounts with more than scale decimal places, e.g.
+    a float artefact like 0.30000000000000004, are rejected rather than
+    rounded.
+    """
+    integer_digits = precision - scale
+    pattern = re.compile(r"[0-9]+(\.[0-9]+)?")
+
+    def parse(value):
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, str):
+            if not pattern.fullmatch(value):
+                return None
+            value = Decimal(value)
+        elif isinstance(value, float):
+            # Shortest repr keeps what the client most likely sent
+            value = Decimal(repr(value))
+        elif isinstance(value, int):
+            value = Decimal(value)
+        elif not isinstance(value, Decimal):
+            return None
+
+        if not value.is_finite() or value < 0 or (value == 0 and not allow_zero):
+            return None
+        # Trailing zeros, as in "1.500", are not extra decimal places
+        exponent = value.as_tuple().exponent
+        if exponent < -scale and value.normalize().as_tuple().exponent < -scale:
+            return None
+        if value.adjusted() >= integer_digits:
+            return None
+        return value
+
+    return parse
+
+parse_amount = amount_parser()
+parse_balance = amount_parser(allow_zero=True)
+
+def parse_date(value):
+    # ISO date such as "2024-06-30", as kept in withdrawal_date
+    if not isinstance(value, str) or len(value) != 10:
+        return None
     try:
-        amount = float(amount)
-    except (TypeError, ValueError):
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
         return None
 
-    if amount <= 0:
-        return None
+def parse_name(value):
+    return value if isinstance(value, str) and 0 < len(value) <= 100 else None
+
+def optional(parse, default=None):
+    """
+    Parser of a field that may be missing (or an empty CSV cell), which
+    then takes default. A default of None leaves the field out.
+    """
+    def parse_optional(value):
+        if value is None or value == "":
+            return OMITTED if default is None else default
+        return parse(value)
+    return parse_optional
+
+# Returned by an optional parser for a missing field without a default
+OMITTED = object()
+
+
+class Schema:
+    """
+    Request body schema compiled once at import into a tuple of
+    (field, parser, error) checks, run in one pass per request. A parser
+    returns the parsed value or None when the value is invalid.
+
+    :param fields: (field, parser, error message) in the order they are checked
+    """
+
+    def __init__(self, *fields):
+        self._fields = tuple(fields)
+
+    def validate(self, data):
+        """
+        :return: parsed values and None, or None and the error message
+        :rtype: tuple
+        """
+        if not data or not isinstance(data, dict):
+            return None, "Empty request body"
+
+        values = {}
+        for field, parse, error in self._fields:
+            value = parse(data.get(field))
+            if value is None:
+                return None, error
+            if value is not OMITTED:
+                values[field] = value
+        return values, None
+
+
+# Body of /deposit and /withdraw
+ACCOUNT_WRITE = Schema(
+    ("account_id", parse_account_id, "Invalid account_id"),
+    ("amount", parse_amount, "Invalid amount")
+)
+
+# One account record of a bulk import, as stored in the Accounts table
+ACCOUNT_IMPORT = Schema(
+    ("account_id", parse_account_id, "Invalid account_id"),
+    ("current_balance", parse_balance, "Invalid current_balance"),
+    ("daily_limit", parse_balance, "Invalid daily_limit"),
+    ("daily_amount_withdrawn", optional(parse_balance, Decimal("0")), "Invalid daily_amount_withdrawn"),
+    ("withdrawal_date", optional(parse_date), "Invalid withdrawal_date"),
+    ("first_name", optional(parse_name), "Invalid first_name"),
+    ("last_name", optional(parse_name), "Invalid last_name")
+)
 
-    return amount
\ No newline at end of file
+# One transfer of /transfer
+TRANSFER = Schema(
+    ("from_account_id", parse_account_id, "Invalid account_id"),
+    ("to_account_id", parse_account_id, "Invalid account_id"),
+    ("amount", parse_amount, "Invalid amount")
+)
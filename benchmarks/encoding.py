@@ -0,0 +1,73 @@
+import os
+import sys
+import json
+import timeit
+import argparse
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from app.utils.serialization import FastJSONProvider, ENCODERS
+
+# Micro-benchmark of the JSON encode time per response.
+#
+# Usage,
+#   python -m benchmarks.encoding --iterations 20000
+#
+# Compares Flask's default provider with FastJSONProvider for every
+# installed encoder, on bodies shaped like the API's responses.
+
+ENTRY = {
+    "account_id": "12345", "entry_id": "2024-06-30T08:15:00.000000Z#3f2a9c1b7d4e",
+    "created_at": "2024-06-30T08:15:00.000000Z", "type": "withdraw",
+    "amount": Decimal("11.67"), "balance_after": Decimal("2488.43"), "counterparty": None
+}
+
+BODIES = {
+    "balance": {"current_balance": Decimal("2500.10")},
+    "deposit": {
+        "account_id": "12345", "current_balance": Decimal("2500.10"), "daily_limit": Decimal("5000"),
+        "daily_amount_withdrawn": Decimal("11.67"), "withdrawal_date": "2024-06-30"
+    },
+    "transactions": {"account_id": "12345", "transactions": [ENTRY] * 50, "next_cursor": None}
+}
+
+
+def providers():
+    app = Flask(__name__)
+    yield "flask", DefaultJSONProvider(app)
+    for encoder in ENCODERS:
+        try:
+            yield encoder, FastJSONProvider(app, encoder=encoder)
+        except ImportError:
+            continue
+
+
+def measure(dumps, body, iterations):
+    # Best of 5 runs, in microseconds per response
+    best = min(timeit.repeat(lambda: dumps(body), number=iterations, repeat=5))
+    return round(best / iterations * 1e6, 2)
+
+def run(iterations=20000):
+    """
+    :return: microseconds per response of each provider and body
+    :rtype: dict
+    """
+    report = {}
+    for name, provider in providers():
+        report[name] = {body: measure(provider.dumps, value, iterations) for body, value in BODIES.items()}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON response encoding micro-benchmark")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.iterations), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import time
+import base64
+import random
+import bisect
+import argparse
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Load generation and latency benchmark for the banking API.
+#
+# Usage,
+#   python -m benchmarks.loadtest generate --requests 10000 --read-ratio 0.8 -o workload.jsonl
+#   python -m benchmarks.loadtest run workload.jsonl --target http://localhost:80 --clients 32
+#   python -m benchmarks.loadtest run workload.jsonl --in-process --baseline baseline.json
+#
+# A workload is JSONL, one request per line,
+#   {"method": "GET", "path": "/balance/17"}
+#   {"method": "POST", "path": "/deposit", "json": {"account_id": "17", "amount": "12.50"}}
+
+PERCENTILES = {"p50": 50, "p95": 95, "p99": 99, "p999": 99.9}
+
+
+def generate_workload(requests, read_ratio=0.8, deposit_ratio=0.5, accounts=1000,
+                      skew=1.0, seed=None):
+    """
+    Generate a synthetic workload. Account ids follow a Zipf-like
+    distribution, a skew of 0 picks accounts uniformly and higher
+    values concentrate traffic on a few hot accounts.
+
+    :return: workload entries
+    :rtype: list
+    """
+    rng = random.Random(seed)  # nosec B311
+    cum_weights, total = [], 0.0
+    for rank in range(1, accounts + 1):
+        total += 1.0 / (rank ** skew)
+        cum_weights.append(total)
+
+    workload = []
+    for _ in range(requests):
+        account_id = str(bisect.bisect_left(cum_weights, rng.random() * total) + 1)
+        if rng.random() < read_ratio:
+            workload.append({"method": "GET", "path": f"/balance/{account_id}"})
+            continue
+
+        path = "/deposit" if rng.random() < deposit_ratio else "/withdraw"
+        amount = f"{rng.randint(1, 5000) / 100:.2f}"
+        workload.append({"method": "POST", "path": path, "json": {"account_id": account_id, "amount": amount}})
+    return workload
+
+def load_workload(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def save_workload(workload, path):
+    with open(path, "w") as f:
+        for entry in workload:
+            f.write(json.dumps(entry) + "\n")
+
+def endpoint_of(path):
+    # Group /balance/17 and /balance/18 under /balance
+    return "/" + path.strip("/").split("/")[0]
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile of already sorted values
+    if not sorted_values:
+        return 0.0
+    rank = max(int(-(-pct * len(sorted_values) // 100)), 1)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarise(latencies):
+    latencies = sorted(latencies)
+    summary = {name: round(percentile(latencies, pct) * 1000, 3) for name, pct in PERCENTILES.items()}
+    summary["max"] = round(latencies[-1] * 1000, 3) if latencies else 0.0
+    summary["mean"] = round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0
+    return summary
+
+
+class HttpTarget:
+    """Sends workload requests to a running server, one session per client thread."""
+
+    def __init__(self, base_url, username, password):
+        import requests
+        self.requests = requests
+        self.base_url = base_url.rstrip("/")
+        self.auth = (username, password)
+        self.local = threading.local()
+
+    def send(self, entry):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = self.requests.Session()
+            session.auth = self.auth
+        response = session.request(entry["method"], self.base_url + entry["path"], json=entry.get("json"))
+        return response.status_code
+
+
+class InProcessTarget:
+    """
+    Sends workload requests to the Flask app in this process, to
+    measure the HTTP layer without a network or DynamoDB. Combine with
+    STORAGE_BACKEND=memory and STORAGE_SEED_ACCOUNTS.
+    """
+
+    def __init__(self, username, password):
+        import werkzeug
+        if not hasattr(werkzeug, "__version__"):
+            werkzeug.__version__ = "3.0.0"
+        from app import main
+        from app.utils.credentials import CredentialProvider
+        main.credentials = CredentialProvider(lambda: (username, password))
+        self.app = main.app
+        token = base64.b64encode(f"{username}:{password}".encode()).decode()
+        self.headers = {"Authorization": f"Basic {token}"}
+        self.local = threading.local()
+
+    def send(self, entry):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(entry["path"], method=entry["method"], json=entry.get("json"), headers=self.headers)
+        return response.status_code
+
+
+def run_workload(target, workload, clients=16):
+    """
+    Replay the workload with a number of concurrent clients.
+
+    :return: report with latency percentiles (ms), throughput and error rates
+    :rtype: dict
+    """
+    results = [None] * len(workload)
+
+    def send(index):
+        entry = workload[index]
+        start = time.perf_counter()
+        try:
+            status = target.send(entry)
+        except Exception:
+            status = None
+        results[index] = (endpoint_of(entry["path"]), status, time.perf_counter() - start)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(send, range(len(workload))))
+    duration = time.perf_counter() - started
+
+    by_endpoint = defaultdict(list)
+    statuses = Counter()
+    for endpoint, status, latency in results:
+        by_endpoint[endpoint].append((status, latency))
+        statuses[str(status)] += 1
+
+    def rates(samples):
+        total = len(samples)
+        errors = sum(1 for status, _ in samples if status is None or status >= 500)
+        rejected = sum(1 for status, _ in samples if status is not None and 400 <= status < 500)
+        return {
+            "requests": total,
+            "error_rate": round(errors / total, 6) if total else 0.0,
+            "rejected_rate": round(rejected / total, 6) if total else 0.0,
+            "latency_ms": summarise([latency for _, latency in samples])
+        }
+
+    all_samples = [(status, latency) for _, status, latency in results]
+    report = rates(all_samples)
+    report.update({
+        "clients": clients,
+        "duration_s": round(duration, 3),
+        "rps": round(len(workload) / duration, 2) if duration else 0.0,
+        "status_codes": dict(statuses),
+        "endpoints": {endpoint: rates(samples) for endpoint, samples in sorted(by_endpoint.items())}
+    })
+    return report
+
+def compare_to_baseline(report, baseline, tolerance=0.10):
+    """
+    Compare a report with a stored baseline. Latency percentiles may
+    grow and throughput may drop by at most the tolerance, and the error
+    rate may not grow by more than the tolerance in absolute terms.
+
+    :return: list of regressions, empty when within tolerance
+    :rtype: list
+    """
+    regressions = []
+    for name in PERCENTILES:
+        current, previous = report["latency_ms"][name], baseline["latency_ms"][name]
+        if previous and current > previous * (1 + tolerance):
+            regressions.append(f"{name} latency {current}ms > baseline {previous}ms")
+
+    if baseline["rps"] and report["rps"] < baseline["rps"] * (1 - tolerance):
+        regressions.append(f"throughput {report['rps']} rps < baseline {baseline['rps']} rps")
+
+    if report["error_rate"] > baseline["error_rate"] + tolerance:
+        regressions.append(f"error rate {report['error_rate']} > baseline {baseline['error_rate']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banking API load generator")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gen = commands.add_parser("generate", help="write a synthetic JSONL workload")
+    gen.add_argument("--requests", type=int, default=10000)
+    gen.add_argument("--read-ratio", type=float, default=0.8)
+    gen.add_argument("--deposit-ratio", type=float, default=0.5, help="share of writes that are deposits")
+    gen.add_argument("--accounts", type=int, default=1000)
+    gen.add_argument("--skew", type=float, default=1.0, help="Zipf exponent, 0 for uniform")
+    gen.add_argument("--seed", type=int)
+    gen.add_argument("-o", "--output", default="workload.jsonl")
+
+    run = commands.add_parser("run", help="replay a JSONL workload and report latency as JSON")
+    run.add_argument("workload")
+    run.add_argument("--target", default="http://localhost:80")
+    run.add_argument("--in-process", action="store_true", help="call the Flask app directly")
+    run.add_argument("--clients", type=int, default=16)
+    run.add_argument("--user", default=os.getenv("BENCH_USER", "user"))
+    run.add_argument("--password", default=os.getenv("BENCH_PASSWORD", "pass"))
+    run.add_argument("-o", "--output", help="also write the report to this file")
+    run.add_argument("--baseline", help="fail when the report regresses from this report")
+    run.add_argument("--tolerance", type=float, default=0.10)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        workload = generate_workload(args.requests, args.read_ratio, args.deposit_ratio,
+                                     args.accounts, args.skew, args.seed)
+        save_workload(workload, args.output)
+        return 0
+
+    if args.in_process:
+        target = InProcessTarget(args.user, args.password)
+    else:
+        target = HttpTarget(args.target, args.user, args.password)
+
+    report = run_workload(target, load_workload(args.workload), args.clients)
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare_to_baseline(report, json.load(f), args.tolerance)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
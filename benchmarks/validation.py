@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import timeit
+import argparse
+from decimal import Decimal, InvalidOperation
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils.validator import parse_body, ACCOUNT_WRITE
+
+# Micro-benchmark of the per-request validation cost of /deposit.
+#
+# Usage,
+#   python -m benchmarks.validation --iterations 200000
+#
+# Compares the compiled request schema with the validation it replaced
+# (float conversion in validate_amount, then Decimal(str(amount))).
+
+BODIES = {
+    "integer": b'{"account_id": "12345", "amount": 500}',
+    "fraction": b'{"account_id": "12345", "amount": 11.67}',
+    "string": b'{"account_id": "12345", "amount": "11.67"}',
+    "invalid": b'{"account_id": "12345", "amount": "32432f4242"}'
+}
+
+
+def legacy_validate(raw):
+    # Previous /deposit validation, kept here as the baseline
+    data = json.loads(raw)
+    account_id = data.get("account_id")
+    try:
+        amount = float(data.get("amount"))
+    except (TypeError, ValueError):
+        return None
+    if amount <= 0 or not account_id:
+        return None
+    try:
+        amount = Decimal(str(amount))
+    except InvalidOperation:
+        return None
+    return account_id, amount
+
+def schema_validate(raw):
+    values, error = ACCOUNT_WRITE.validate(parse_body(raw))
+    return None if error else (values["account_id"], values["amount"])
+
+
+def measure(func, raw, iterations):
+    # Best of 5 runs, in nanoseconds per call
+    best = min(timeit.repeat(lambda: func(raw), number=iterations, repeat=5))
+    return round(best / iterations * 1e9, 1)
+
+def run(iterations=100000):
+    """
+    :return: nanoseconds per request of each validator and body
+    :rtype: dict
+    """
+    report = {}
+    for name, raw in BODIES.items():
+        legacy, schema = measure(legacy_validate, raw, iterations), measure(schema_validate, raw, iterations)
+        report[name] = {"legacy_ns": legacy, "schema_ns": schema, "speedup": round(legacy / schema, 2)}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Request validation micro-benchmark")
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.iterations), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import json
+import time
+import threading
+import unittest
+from contextlib import contextmanager
+import base64
+from unittest.mock import patch, MagicMock
+from decimal import Decimal
+from botocore.exceptions import ClientError
+from fastapi.testclient import TestClient
+from app.main import app
+from app.asgi import api
+
+import werkzeug
+if not hasattr(werkzeug, "__version__"):
+    werkzeug.__version__ = "3.0.0"
+
+"""
+Contract test cases shared by the Flask (WSGI) and FastAPI (ASGI) apps.
+
+Every test case in ApiContract runs once per app so both serving -
+modes keep the same auth, validation and error responses.
+"""
+class ApiContract:
+
+    def setUp(self):
+        self.account_id = "12345"
+
+        # Mocking credentials
+        self.username = "user"  # nosec B105
+        self.password = "pass" # nosec B105
+
+        patcher = patch("app.main.credentials.get", return_value=(self.username, self.password))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        token = base64.b64encode(f"{self.username}:{self.password}".encode()).decode()
+        self.auth_header = {"Authorization": f"Basic {token}"}
+
+    def request(self, method, path, **kwargs):
+        raise NotImplementedError
+
+    def test_health_skips_auth(self):
+        status, body = self.request("GET", "/")
+        self.assertEqual((status, body), (200, {"status": "ok"}))
+
+    def test_metrics_skips_auth(self):
+        self.request("GET", "/")
+        status, body = self.request("GET", "/metrics", raw=True)
+        self.assertEqual(status, 200)
+        self.assertIn('http_requests_total{method="GET",route="/",status="200"}', body)
+
+    def test_unauthorized(self):
+        status, body = self.request("GET", f"/balance/{self.account_id}")
+        self.assertEqual((status, body), (401, {"error": "Unauthorized"}))
+
+    @patch("app.main.table.get_item")
+    def test_balance(self, mock_get):
+        mock_get.return_value = {"Item": {"account_id": self.account_id, "current_balance": Decimal("2000.5")}}
+        status, body = self.request("GET", f"/balance/{self.account_id}", headers=self.auth_header)
+        self.assertEqual((status, body), (200, {"current_balance": 2000.5}))
+
+    @patch("app.main.table.get_item")
+    def test_balance_daily_allowance(self, mock_get):
+        from app import main
+        mock_get.return_value = {"Item": {
+            "account_id": self.account_id, "current_balance": Decimal("2000"), "daily_limit": Decimal("1000"),
+            "daily_amount_withdrawn": Decimal("300"), "withdrawal_date": main.storage.today()
+        }}
+        status, body = self.request("GET", f"/balance/{self.account_id}?allowance=true", headers=self.auth_header)
+        self.assertEqual((status, body), (200, {"current_balance": 2000.0, "daily_allowance_remaining": 700.0}))
+
+    @patch("app.main.table.get_item")
+    def test_balance_not_modified(self, mock_get):
+        mock_get.return_value = {"Item": {"account_id": self.account_id, "current_balance": Decimal("2000"), "version": Decimal("3")}}
+        headers = dict(self.auth_header, **{"If-None-Match": '"3"'})
+        status, body = self.request("GET", f"/balance/{self.account_id}", headers=headers, raw=True)
+        self.assertEqual((status, body), (304, ""))
+
+        headers["If-None-Match"] = 'W/"2", "4"'
+        status, body = self.request("GET", f"/balance/{self.account_id}", headers=headers)
+        self.assertEqual((status, body), (200, {"current_balance": 2000.0}))
+
+    def test_balance_deadline_exceeded(self):
+        from app import main
+
+        # A connection whose GetItem hangs, standing in for a slow DynamoDB
+        release = threading.Event()
+        connection = MagicMock()
+        connection.target.return_value.get_item.side_effect = lambda **kwargs: release.wait(2) and {}
+
+        @contextmanager
+        def lease():
+            yield connection
+
+        headers = dict(self.auth_header, **{"X-Request-Timeout-Ms": "50"})
+        started = time.monotonic()
+        try:
+            with patch.object(main.storage.pool, "lease", lease):
+                status, body = self.request("GET", f"/balance/{self.account_id}?consistent=true", headers=headers)
+        finally:
+            release.set()
+        self.assertEqual((status, body), (504, {"error": "Deadline exceeded"}))
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_pool_timeout(self):
+        from app import main
+        from app.storage.connections import PoolTimeout
+
+        with patch.object(main.storage.pool, "lease", side_effect=PoolTimeout()):
+            status, body = self.request("GET", f"/balance/{self.account_id}?consistent=true",
+                                        headers=self.auth_header, raw=True)
+            self.assertEqual(status, 503)
+            self.assertEqual(self.last_headers["Retry-After"], "1")
+            self.assertEqual(json.loads(body), {"error": "Service unavailable"})
+
+            headers = dict(self.auth_header, **{"Idempotency-Key": f"pool-{type(self).__name__}"})
+            status, body = self.request("POST", "/deposit", json={"account_id": self.account_id, "amount": 10},
+                                        headers=headers)
+            self.assertEqual((status, body), (503, {"error": "Service unavailable"}))
+            self.assertEqual(self.last_headers["Retry-After"], "1")
+
+    @patch("app.main.table.update_item")
+    def test_connection_errors_idempotent(self, mock_update):
+        from botocore.exceptions import EndpointConnectionError, ReadTimeoutError
+        applied = {"Attributes": {"account_id": self.account_id, "current_balance": Decimal("2510")}}
+        payload = {"account_id": self.account_id, "amount": 10}
+
+        # Never sent: the retry with the same key runs the deposit
+        mock_update.side_effect = [EndpointConnectionError(endpoint_url="http://dynamodb"), applied]
+        headers = dict(self.auth_header, **{"Idempotency-Key": f"connect-{type(self).__name__}"})
+        self.assertEqual(self.request("POST", "/deposit", json=payload, headers=headers),
+                         (503, {"error": "Service unavailable"}))
+        self.assertEqual(self.last_headers["Retry-After"], "1")
+        self.assertEqual(self.request("POST", "/deposit", json=payload, headers=headers),
+                         (200, {"account_id": self.account_id, "current_balance": 2510.0}))
+
+        # Maybe applied: the retry gets the same 503, the deposit runs once
+        mock_update.reset_mock()
+        mock_update.side_effect = [ReadTimeoutError(endpoint_url="http://dynamodb"), applied]
+        headers["Idempotency-Key"] = f"timeout-{type(self).__name__}"
+        for _ in range(2):
+            self.assertEqual(self.request("POST", "/deposit", json=payload, headers=headers),
+                             (503, {"error": "Service unavailable"}))
+            self.assertEqual(self.last_headers["Retry-After"], "1")
+        self.assertEqual(mock_update.call_count, 1)
+
+    @patch("app.main.table.get_item")
+    @patch("app.main.table.update_item")
+    def test_admission_account_rate(self, mock_update, mock_get):
+        from app import main
+        from app.utils.admission import build_admission_control
+        mock_update.return_value = {"Attributes": {"account_id": self.account_id, "current_balance": Decimal("2500")}}
+        mock_get.return_value = {"Item": {"account_id": self.account_id, "current_balance": Decimal("2500")}}
+
+        with patch.object(main, "admission", build_admission_control(account_rate=0.5, account_burst=2, max_concurrency=4)):
+            status, _ = self.request("POST", "/deposit", json={"account_id": self.account_id, "amount": 500}, headers=self.auth_header)
+            self.assertEqual(status, 200)
+            status, _ = self.request("GET", f"/balance/{self.account_id}?consistent=true", headers=self.auth_header)
+            self.assertEqual(status, 200)
+
+            status, body = self.request("POST", "/deposit", json={"account_id": int(self.account_id), "amount": 500}, headers=self.auth_header)
+            self.assertEqual((status, body), (429, {"error": "Too many requests"}))
+            self.assertEqual(self.last_headers["Retry-After"], "2")
+            self.assertEqual(mock_update.call_count, 1)
+
+            status, _ = self.request("POST", "/deposit", json={"account_id": "67899", "amount": 500}, headers=self.auth_header)
+            self.assertEqual(status, 200)
+            self.assertEqual(main.admission.concurrency.active, 0)
+
+    @patch("app.main.table.scan")
+    def test_report(self, mock_scan):
+        import json
+        mock_scan.side_effect = lambda **kwargs: {"Items": [
+            {"account_id": str(kwargs["Segment"]), "current_balance": Decimal("10.5"), "daily_limit": Decimal("100")}
+        ]}
+        status, body = self.request("GET", "/admin/report?segments=3", headers=self.auth_header, raw=True)
+        report = json.loads(body.splitlines()[-1])
+        self.assertEqual(status, 200)
+        self.assertEqual((report["partial"], report["accounts"], report["total_balance"]), (False, 3, 31.5))
+
+        status, body = self.request("GET", "/admin/report?segments=0", headers=self.auth_header)
+        self.assertEqual(status, 400)
+
+    @patch("app.main.table.get_item")
+    def test_balance_invalid_account(self, mock_get):
+        status, body = self.request("GET", "/balance/abc", headers=self.auth_header)
+        self.assertEqual((status, body), (400, {"error": "Invalid account id : abc"}))
+
+    def test_deposit_invalid_json(self):
+        status, body = self.request("POST", "/deposit", content=b"{not json", headers=self.auth_header)
+        self.assertEqual((status, body), (400, {"error": "Invalid JSON payload"}))
+
+    def test_deposit_invalid_amount(self):
+        status, body = self.request("POST", "/deposit", json={"account_id": self.account_id, "amount": "abc"}, headers=self.auth_header)
+        self.assertEqual((status, body), (400, {"error": "Invalid amount"}))
+
+    @patch("app.main.table.update_item")
+    def test_deposit_float_artefact(self, mock_update):
+        status, body = self.request("POST", "/deposit", json={"account_id": self.account_id, "amount": 0.1 + 0.2}, headers=self.auth_header)
+        self.assertEqual((status, body), (400, {"error": "Invalid amount"}))
+        mock_update.assert_not_called()
+
+    @patch("app.main.table.update_item")
+    def test_deposit_decimal_encoding(self, mock_update):
+        mock_update.return_value = {"Attributes": {"account_id": self.account_id, "current_balance": Decimal("2500.10")}}
+        status, body = self.request("POST", "/deposit", json={"account_id": self.account_id, "amount": 500}, headers=self.auth_header)
+        self.assertEqual(status, 200)
+        self.assertEqual(body, {"account_id": self.account_id, "current_balance": 2500.1})
+
+    @patch("app.main.table.update_item")
+    def test_deposit_response_fields(self, mock_update):
+        mock_update.return_value = {"Attributes": {
+            "account_id": self.account_id, "current_balance": Decimal("2500"), "daily_limit": Decimal("1000"), "name": "Jane Doe"
+        }}
+        status, body = self.request("POST", "/deposit", json={"account_id": self.account_id, "amount": 500}, headers=self.auth_header)
+        self.assertEqual((status, body), (200, {"account_id": self.account_id, "current_balance": 2500.0, "daily_limit": 1000.0}))
+
+    @patch("app.main.table.update_item")
+    def test_withdraw_not_found(self, mock_update):
+        error_response = {"Error": {"Code": "ConditionalCheckFailedException", "Message": "Conditional check failed"}}
+        mock_update.side_effect = ClientError(error_response, "update_item")
+        status, body = self.request("POST", "/withdraw", json={"account_id": "67899", "amount": 10}, headers=self.auth_header)
+        self.assertEqual((status, body), (404, {"error": "Account 67899 not found"}))
+
+    @patch("app.main.table.update_item")
+    def test_deposit_idempotency_key(self, mock_update):
+        mock_update.return_value = {"Attributes": {"account_id": self.account_id, "current_balance": Decimal("2500.10")}}
+        headers = dict(self.auth_header, **{"Idempotency-Key": f"deposit-{type(self).__name__}"})
+        payload = {"account_id": self.account_id, "amount": 500}
+
+        first = self.request("POST", "/deposit", json=payload, headers=headers)
+        retry = self.request("POST", "/deposit", json=payload, headers=headers)
+        self.assertEqual(first, (200, {"account_id": self.account_id, "current_balance": 2500.1}))
+        self.assertEqual(retry, first)
+        self.assertEqual(mock_update.call_count, 1)
+
+        status, _ = self.request("POST", "/deposit", json=dict(payload, amount=600), headers=headers)
+        self.assertEqual(status, 422)
+
+
+    def test_statement_streams_pages(self):
+        from app import main
+        entry = {"account_id": self.account_id, "type": "deposit", "amount": Decimal("10"),
+                 "balance_after": Decimal("110"), "created_at": "2024-06-30T08:15:00.000000Z"}
+        ledger = MagicMock()
+        ledger.query.side_effect = [
+            {"Items": [dict(entry, entry_id="a")], "LastEvaluatedKey": {"account_id": self.account_id, "entry_id": "a"}},
+            {"Items": [dict(entry, entry_id="b", balance_after=Decimal("120"))]}
+        ]
+
+        with patch.object(main.storage, "ledger", ledger):
+            status, body = self.request("GET", f"/statement/{self.account_id}", headers=self.auth_header, raw=True)
+        self.assertEqual(status, 200)
+        lines = body.splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn('"running_balance":120.0', lines[1].replace(" ", ""))
+        self.assertEqual(ledger.query.call_args.kwargs["ExclusiveStartKey"]["entry_id"], "a")
+
+    def test_statement_invalid_format(self):
+        status, body = self.request("GET", f"/statement/{self.account_id}?format=xml", headers=self.auth_header)
+        self.assertEqual((status, body), (400, {"error": "Invalid format"}))
+
+class TestFlaskContract(ApiContract, unittest.TestCase):
+
+    def request(self, method, path, content=None, raw=False, **kwargs):
+        client = app.test_client()
+        if content is not None:
+            kwargs["data"] = content
+        response = client.open(path, method=method, **kwargs)
+        self.last_headers = response.headers
+        return response.status_code, response.get_data(as_text=True) if raw else response.get_json()
+
+
+class TestAsgiContract(ApiContract, unittest.TestCase):
+
+    def request(self, method, path, raw=False, **kwargs):
+        client = TestClient(api)
+        response = client.request(method, path, **kwargs)
+        self.last_headers = response.headers
+        return response.status_code, response.text if raw else response.json()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -41,13 +41,10 @@ class TestFullIntegration(unittest.TestCase):
         self.username = "user"  # nosec B105
         self.password = "pass" # nosec B105
 
-        patcher = patch("app.main.get_credentials", return_value=(self.username, self.password))
-        self.mock_get_credentials = patcher.start()
+        patcher = patch("app.main.credentials.get", return_value=(self.username, self.password))
+        self.mock_credentials = patcher.start()
         self.addCleanup(patcher.stop)
 
-        from app import main
-        main.USERNAME, main.PASSWORD = main.get_credentials()
-
         token = base64.b64encode(f"{self.username}:{self.password}".encode()).decode()
         self.auth_header = {"Authorization": f"Basic {token}"}
 
@@ -66,13 +63,13 @@ class TestFullIntegration(unittest.TestCase):
                 }
             }
 
-        def mock_update_item(Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression, ReturnValues):
+        def mock_update_item(Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression, ReturnValues, **kwargs):
             val = ExpressionAttributeValues[":val"]
 
             if isinstance(val, Decimal):
                 val = float(val)
 
-            if ConditionExpression.endswith(">= :val") and val > current_balance["value"]:
+            if "current_balance >= :val" in ConditionExpression and val > current_balance["value"]:
                 from botocore.exceptions import ClientError
                 raise ClientError(
                     {"Error": {"Code": "ConditionalCheckFailedException"}}, 
@@ -0,0 +1,139 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import threading
+import unittest
+from app.utils.admission import (
+    RateLimiter, ConcurrencyLimiter, AdmissionControl, Rejected, build_admission_control, admission_rejected
+)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdmission(unittest.TestCase):
+
+    """
+    Unit test case for token buckets
+
+    This test case verify that a bucket admits its burst, then one -
+    request per refilled token, and reports the wait for the next one.
+    """
+    def test_rate_limiter(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=2, burst=3, clock=clock)
+
+        self.assertEqual([limiter.acquire("a") for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(limiter.acquire("a"), 0.5)
+        self.assertEqual(limiter.acquire("b"), 0)
+
+        clock.now = 0.5
+        self.assertEqual(limiter.acquire("a"), 0)
+        self.assertGreater(limiter.acquire("a"), 0)
+
+    """
+    Unit test case for idle bucket eviction
+
+    This test case verify that buckets idle long enough to be full -
+    again are dropped, so only recently active keys are kept.
+    """
+    def test_rate_limiter_eviction(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=10, burst=10, clock=clock)
+        for key in range(100):
+            limiter.acquire(key)
+        self.assertEqual(len(limiter), 100)
+
+        clock.now = 0.5
+        limiter.acquire(0)
+        self.assertEqual(len(limiter), 100)
+
+        clock.now = 1.2
+        limiter.acquire("c")
+        self.assertEqual(len(limiter), 2)
+
+    """
+    Unit test case for the concurrency limit
+
+    This test case verify that requests beyond the limit wait in the -
+    queue for a released slot, and are refused when the queue is full -
+    or the wait times out.
+    """
+    def test_concurrency_limiter(self):
+        limiter = ConcurrencyLimiter(limit=1, queue_size=1, timeout=2)
+        self.assertTrue(limiter.acquire())
+
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(limiter.acquire()))
+        waiter.start()
+        while not limiter.waiting:
+            pass
+
+        # Queue is full, refused at once
+        self.assertFalse(limiter.acquire())
+
+        limiter.release()
+        waiter.join()
+        self.assertEqual(results, [True])
+        self.assertEqual(limiter.active, 1)
+
+        limiter.timeout = 0.01
+        self.assertFalse(limiter.acquire())
+
+    """
+    Unit test case for admission of a request
+
+    This test case verify that each limit rejects with its reason, -
+    and that a taken concurrency slot is reported for release.
+    """
+    def test_admission_control(self):
+        clock = FakeClock()
+        admission = AdmissionControl(
+            credentials=RateLimiter(1, 3, clock=clock),
+            accounts=RateLimiter(1, 1, clock=clock),
+            concurrency=ConcurrencyLimiter(1)
+        )
+        rejected = admission_rejected.value(reason="account")
+
+        self.assertTrue(admission.admit("user", "1"))
+        with self.assertRaises(Rejected) as raised:
+            admission.admit("user", "2")
+        self.assertEqual(raised.exception.reason, "concurrency")
+
+        admission.release()
+        with self.assertRaises(Rejected) as raised:
+            admission.admit("user", "1")
+        self.assertEqual((raised.exception.reason, raised.exception.retry_after_header), ("account", "1"))
+        self.assertEqual(admission_rejected.value(reason="account"), rejected + 1)
+
+        with self.assertRaises(Rejected) as raised:
+            admission.admit("user", None)
+        self.assertEqual(raised.exception.reason, "credential")
+
+    """
+    Unit test case for the admission configuration
+
+    This test case verify that limits set to 0 are disabled.
+    """
+    def test_build_admission_control(self):
+        admission = build_admission_control()
+        self.assertIsNone(admission.credentials)
+        self.assertIsNone(admission.accounts)
+        self.assertFalse(admission.admit("user", "1"))
+
+        admission = build_admission_control(account_rate=5, credential_rate=100, credential_burst=200, max_concurrency=8)
+        self.assertEqual((admission.accounts.rate, admission.accounts.burst), (5, 5))
+        self.assertEqual(admission.credentials.burst, 200)
+        self.assertEqual(admission.concurrency.limit, 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import unittest
+from unittest.mock import patch
+from decimal import Decimal
+from collections import Counter
+from app.storage import seed_accounts
+from app.storage.memory import MemoryStorage
+from benchmarks.loadtest import (
+    generate_workload, percentile, compare_to_baseline, run_workload, InProcessTarget
+)
+from benchmarks.validation import run as run_validation, legacy_validate, schema_validate
+from benchmarks.encoding import run as run_encoding
+
+
+class TestBenchmark(unittest.TestCase):
+
+    """
+    Unit test case for synthetic workloads
+
+    This test case verify that the generated workload follows the -
+    read/write mix and concentrates traffic on hot accounts when skewed.
+    """
+    def test_generate_workload(self):
+        workload = generate_workload(2000, read_ratio=0.75, accounts=100, skew=1.2, seed=7)
+        self.assertEqual(workload, generate_workload(2000, read_ratio=0.75, accounts=100, skew=1.2, seed=7))
+
+        reads = sum(1 for entry in workload if entry["method"] == "GET")
+        self.assertAlmostEqual(reads / len(workload), 0.75, delta=0.05)
+
+        accounts = Counter(entry["path"].split("/")[-1] for entry in workload if entry["method"] == "GET")
+        self.assertEqual(accounts.most_common(1)[0][0], "1")
+
+    """
+    Unit test case for percentiles
+
+    This test case verify the nearest-rank percentile calculation.
+    """
+    def test_percentile(self):
+        values = list(range(1, 1001))
+        self.assertEqual(percentile(values, 50), 500)
+        self.assertEqual(percentile(values, 99), 990)
+        self.assertEqual(percentile(values, 99.9), 999)
+        self.assertEqual(percentile([], 99), 0.0)
+
+    """
+    Unit test case for baseline comparison
+
+    This test case verify that latency and throughput regressions -
+    beyond the tolerance are reported.
+    """
+    def test_compare_to_baseline(self):
+        baseline = {"latency_ms": {"p50": 1, "p95": 2, "p99": 4, "p999": 8}, "rps": 1000, "error_rate": 0.0}
+        report = {"latency_ms": {"p50": 1, "p95": 2, "p99": 5, "p999": 8}, "rps": 850, "error_rate": 0.0}
+
+        regressions = compare_to_baseline(report, baseline, tolerance=0.10)
+        self.assertEqual(len(regressions), 2)
+        self.assertEqual(compare_to_baseline(baseline, baseline), [])
+
+    """
+    Unit test case for an in-process run
+
+    This test case verify that a workload replayed against the Flask -
+    app with in-memory storage reports every request.
+    """
+    def test_run_in_process(self):
+        storage = MemoryStorage()
+        seed_accounts(storage, 10)
+        with patch("app.main.storage", storage), patch("app.main.credentials"):
+            report = run_workload(InProcessTarget("user", "pass"), generate_workload(200, accounts=10, seed=1), clients=4)
+
+        self.assertEqual(report["requests"], 200)
+        self.assertEqual(report["error_rate"], 0.0)
+        self.assertIn("p999", report["latency_ms"])
+        self.assertEqual(set(report["endpoints"]) - {"/balance", "/deposit", "/withdraw"}, set())
+
+    """
+    Unit test case for the validation micro-benchmark
+
+    This test case verify that both validators agree on the benchmark -
+    bodies and every body is timed.
+    """
+    def test_validation_benchmark(self):
+        self.assertEqual(schema_validate(b'{"account_id": "1", "amount": 11.67}'), ("1", Decimal("11.67")))
+        self.assertIsNone(legacy_validate(b'{"account_id": "1", "amount": "32432f4242"}'))
+        self.assertIsNone(schema_validate(b'{"account_id": "1", "amount": "32432f4242"}'))
+
+        report = run_validation(iterations=10)
+        self.assertEqual(set(report), {"integer", "fraction", "string", "invalid"})
+        self.assertGreater(report["fraction"]["schema_ns"], 0)
+
+    """
+    Unit test case for the encoding micro-benchmark
+
+    This test case verify that Flask's provider and the stdlib encoder -
+    are timed for every response body.
+    """
+    def test_encoding_benchmark(self):
+        report = run_encoding(iterations=10)
+        self.assertTrue({"flask", "json"} <= set(report))
+        self.assertEqual(set(report["json"]), {"balance", "deposit", "transactions"})
+
+
+if __name__ == "__main__":
+    unittest.main()
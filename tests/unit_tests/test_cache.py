@@ -0,0 +1,84 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import unittest
+from unittest.mock import patch
+from decimal import Decimal
+from app.utils.cache import LRUCache, AccountCache, InMemoryRedis, build_account_cache
+
+
+class TestCache(unittest.TestCase):
+
+    """
+    Unit test case for LRU eviction
+
+    This test case verify that the least recently used entry is -
+    evicted once the cache is full and that evictions are counted.
+    """
+    def test_lru_eviction(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.evictions, 1)
+
+    """
+    Unit test case for TTL expiry
+
+    This test case verify that an entry older than the TTL is -
+    reported as a miss.
+
+    :param mock_time: Mock monotonic clock
+    """
+    @patch("app.utils.cache.time.monotonic")
+    def test_ttl_expiry(self, mock_time):
+        mock_time.return_value = 100.0
+        cache = LRUCache(10, ttl=5)
+        cache.set("a", 1)
+
+        mock_time.return_value = 104.0
+        self.assertEqual(cache.get("a"), 1)
+        mock_time.return_value = 105.0
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    """
+    Unit test case for the shared cache tier
+
+    This test case verify that an item written by one process is -
+    read back from the shared tier by another with exact Decimals.
+    """
+    def test_shared_tier_roundtrip(self):
+        shared = InMemoryRedis()
+        writer = AccountCache(LRUCache(10, ttl=60), shared=shared, ttl=60)
+        reader = AccountCache(LRUCache(10, ttl=60), shared=shared, ttl=60)
+
+        writer.put("12345", {"account_id": "12345", "current_balance": Decimal("10.10")})
+        item = reader.get("12345")
+
+        self.assertEqual(item["current_balance"], Decimal("10.10"))
+        self.assertEqual(reader.stats()["shared_hits"], 1)
+
+        writer.invalidate("12345")
+        reader.clear()
+        self.assertIsNone(reader.get("12345"))
+
+    """
+    Unit test case for a disabled cache
+
+    This test case verify that a TTL of 0 turns the cache off.
+    """
+    def test_disabled_cache(self):
+        cache = build_account_cache(size=10, ttl=0)
+        cache.put("12345", {"current_balance": Decimal("1")})
+        self.assertIsNone(cache.get("12345"))
+
+
+if __name__ == "__main__":
+    unittest.main()
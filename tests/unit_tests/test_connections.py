@@ -0,0 +1,147 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+from app.storage import build_dynamodb_pool
+from botocore.exceptions import EndpointConnectionError, ReadTimeoutError
+from app.storage.connections import (
+    DynamoDBPool, PooledDynamoDB, PoolTimeout, client_config, dynamodb_pool_waits, never_sent, _track_sent
+)
+
+
+class TestConnections(unittest.TestCase):
+
+    def setUp(self):
+        # Connections without boto3, each with its own resource mock
+        patcher = patch("app.storage.connections._Connection", side_effect=lambda *args: MagicMock())
+        self.connection = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    """
+    Unit test case for connection reuse
+
+    This test case verify that a returned connection is leased again -
+    instead of opening a new one.
+    """
+    def test_lease_reuses_connections(self):
+        pool = DynamoDBPool("ap-southeast-1", size=2)
+        with pool.lease() as first:
+            pass
+        with pool.lease() as second:
+            self.assertIs(second, first)
+        self.assertEqual(self.connection.call_count, 1)
+
+    """
+    Unit test case for a saturated pool
+
+    This test case verify that calls beyond the pool size wait for a -
+    connection, are counted, and time out when none is returned.
+    """
+    def test_saturated_pool(self):
+        pool = DynamoDBPool("ap-southeast-1", size=1, timeout=0.05)
+        waits = dynamodb_pool_waits.value()
+
+        with pool.lease():
+            with self.assertRaises(PoolTimeout):
+                with pool.lease():
+                    pass
+        self.assertEqual(dynamodb_pool_waits.value(), waits + 1)
+
+        # A waiting call gets the connection once it is returned
+        pool.timeout = 5
+        leased = []
+        with pool.lease() as held:
+            waiter = threading.Thread(target=lambda: leased.append(pool._acquire()))
+            waiter.start()
+        waiter.join()
+        self.assertEqual(leased, [held])
+        self.assertEqual(self.connection.call_count, 1)
+
+    """
+    Unit test case for pooled resources and tables
+
+    This test case verify that calls run on the table of a leased -
+    connection and other attributes are read from it.
+    """
+    def test_pooled_dynamodb(self):
+        pool = DynamoDBPool("ap-southeast-1", size=1)
+        table = PooledDynamoDB(pool).Table("Accounts")
+        with pool.lease() as connection:
+            connection.target.return_value.get_item.return_value = {"Item": {"account_id": "1"}}
+            connection.target.return_value.name = "Accounts"
+
+        self.assertEqual(table.get_item(Key={"account_id": "1"}), {"Item": {"account_id": "1"}})
+        connection.target.assert_called_with("table", "Accounts")
+        self.assertEqual(table.name, "Accounts")
+        with self.assertRaises(AttributeError):
+            table._private
+
+    """
+    Unit test case for warming the pool
+
+    This test case verify that warming opens the requested number of -
+    connections, probes each and ignores failed probes.
+    """
+    def test_warm(self):
+        pool = DynamoDBPool("ap-southeast-1", size=3)
+        probed = []
+
+        def probe(connection):
+            probed.append(connection)
+            raise ConnectionError("no network")
+
+        pool.warm(5, probe)
+        self.assertEqual(len(set(map(id, probed))), 3)
+        self.assertEqual(pool._idle.qsize(), 3)
+
+    """
+    Unit test case for the client settings
+
+    This test case verify that the pool and botocore settings are -
+    read from the environment.
+    """
+    def test_build_pool_from_env(self):
+        env = {
+            "DDB_MAX_POOL_CONNECTIONS": "16", "DDB_POOL_TIMEOUT": "0.5", "DDB_CONNECT_TIMEOUT": "0.3",
+            "DDB_READ_TIMEOUT": "1.5", "DDB_TCP_KEEPALIVE": "false", "DDB_RETRY_MODE": "standard",
+            "DDB_MAX_ATTEMPTS": "5"
+        }
+        with patch.dict(os.environ, env):
+            pool = build_dynamodb_pool()
+        self.assertEqual((pool.size, pool.timeout), (16, 0.5))
+        self.assertEqual((pool.config.connect_timeout, pool.config.read_timeout), (0.3, 1.5))
+        self.assertFalse(pool.config.tcp_keepalive)
+        self.assertEqual(pool.config.retries, {"mode": "standard", "max_attempts": 5})
+
+        config = client_config()
+        self.assertEqual(config.retries["mode"], "adaptive")
+        self.assertTrue(config.tcp_keepalive)
+
+
+    """
+    Unit test case for errors of calls never sent
+
+    This test case verify that a failed connection only counts as -
+    never sent when no earlier attempt of the call was sent.
+    """
+    def test_never_sent(self):
+        self.assertTrue(never_sent(PoolTimeout()))
+        self.assertFalse(never_sent(ReadTimeoutError(endpoint_url="http://dynamodb")))
+
+        context = {}
+        refused = EndpointConnectionError(endpoint_url="http://dynamodb")
+        _track_sent(exception=refused, context=context)
+        self.assertTrue(never_sent(refused))
+
+        _track_sent(exception=ReadTimeoutError(endpoint_url="http://dynamodb"), context=context)
+        refused = EndpointConnectionError(endpoint_url="http://dynamodb")
+        _track_sent(exception=refused, context=context)
+        self.assertFalse(never_sent(refused))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import unittest
+import subprocess  # nosec B404
+from unittest.mock import MagicMock, patch
+from app.utils.credentials import CredentialProvider
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+
+
+class TestCredentials(unittest.TestCase):
+
+    """
+    Unit test case for lazy credential loading
+
+    This test case verify that nothing is fetched until the -
+    credentials are first used and that they are cached afterwards.
+    """
+    def test_lazy_and_cached(self):
+        loader = MagicMock(return_value=("user", "pass"))
+        provider = CredentialProvider(loader, ttl=300)
+        loader.assert_not_called()
+
+        self.assertEqual(provider.get(), ("user", "pass"))
+        self.assertEqual(provider.get(), ("user", "pass"))
+        loader.assert_called_once()
+
+    """
+    Unit test case for background refresh
+
+    This test case verify that expired credentials keep being served -
+    while the rotated secret is loaded in the background.
+
+    :param mock_time: Mock monotonic clock
+    """
+    @patch("app.utils.credentials.time.monotonic")
+    def test_background_refresh(self, mock_time):
+        mock_time.return_value = 0.0
+        loader = MagicMock(side_effect=[("user", "old"), ("user", "new")])
+        provider = CredentialProvider(loader, ttl=300)
+        provider.get()
+
+        mock_time.return_value = 301.0
+        with patch("app.utils.credentials.threading.Thread") as mock_thread:
+            self.assertEqual(provider.get(), ("user", "old"))
+            mock_thread.return_value.start.assert_called_once()
+            provider._refresh()
+
+        self.assertEqual(provider.get(), ("user", "new"))
+
+    """
+    Unit test case for forced refresh rate limiting
+
+    This test case verify that failed logins cannot trigger secret -
+    reloads more often than the minimum refresh interval.
+    """
+    def test_forced_refresh_rate_limited(self):
+        provider = CredentialProvider(MagicMock(return_value=("user", "pass")), min_refresh_interval=30)
+        provider.get()
+        with patch("app.utils.credentials.threading.Thread") as mock_thread:
+            provider.refresh_async(force=True)
+            provider._refreshing = False
+            provider.refresh_async(force=True)
+            self.assertEqual(mock_thread.call_count, 1)
+
+    """
+    Unit test case for the import time budget
+
+    This test case verify that importing app.main makes no network -
+    calls and finishes within IMPORT_BUDGET_SECONDS.
+    """
+    def test_import_time_budget(self):
+        budget = float(os.getenv("IMPORT_BUDGET_SECONDS", "3"))
+        code = (
+            "import time; start = time.perf_counter(); import app.main; "
+            "print(time.perf_counter() - start)"
+        )
+        env = dict(os.environ, AWS_ACCESS_KEY_ID="", AWS_SECRET_ACCESS_KEY="")  # nosec B106
+        result = subprocess.run(  # nosec B603
+            [sys.executable, "-c", code], cwd=ROOT, env=env,
+            capture_output=True, text=True, timeout=60
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        elapsed = float(result.stdout.strip().splitlines()[-1])
+        self.assertLess(elapsed, budget, f"importing app.main took {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    unittest.main()
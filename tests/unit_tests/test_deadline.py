@@ -0,0 +1,242 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import time
+import threading
+import unittest
+from unittest.mock import patch
+from app.utils import deadline
+from app.utils.deadline import DeadlineExceeded, request_budget
+from app.storage.connections import DynamoDBPool, PooledDynamoDB, _Connection, client_config
+from app.storage.hedging import HedgedReads, hedges_sent, hedges_skipped, hedge_wins
+
+
+class TestDeadline(unittest.TestCase):
+
+    """
+    Unit test case for the request budget
+
+    This test case verify that the header can only shorten the -
+    configured default, and that invalid headers are ignored.
+    """
+    def test_request_budget(self):
+        self.assertIsNone(request_budget())
+        self.assertEqual(request_budget("250"), 0.25)
+        self.assertEqual(request_budget("250", default=0.1), 0.1)
+        self.assertEqual(request_budget("50", default=0.1), 0.05)
+        self.assertEqual(request_budget("soon", default=0.1), 0.1)
+        self.assertIsNone(request_budget("-5"))
+
+    """
+    Unit test case for a spent budget
+
+    This test case verify that check raises once the deadline has -
+    passed and that reset restores the outer context.
+    """
+    def test_check(self):
+        deadline.check("get_item")
+        token = deadline.start(0.01)
+        try:
+            self.assertLessEqual(deadline.bounded(5), 0.01)
+            time.sleep(0.02)
+            with self.assertRaises(DeadlineExceeded) as raised:
+                deadline.check("get_item")
+            self.assertEqual(raised.exception.stage, "get_item")
+            self.assertEqual(deadline.bounded(5), 0)
+        finally:
+            deadline.reset(token)
+        self.assertIsNone(deadline.remaining())
+
+    """
+    Unit test case for the connection pool wait
+
+    This test case verify that a call waiting for a connection of a -
+    saturated pool gives up at the request deadline.
+    """
+    @patch("app.storage.connections._Connection")
+    def test_pool_wait_bounded(self, mock_connection):
+        pool = DynamoDBPool("ap-southeast-1", size=1, timeout=5)
+        with pool.lease():
+            token = deadline.start(0.05)
+            try:
+                started = time.monotonic()
+                with self.assertRaises(DeadlineExceeded):
+                    with pool.lease():
+                        pass
+                self.assertLess(time.monotonic() - started, 1)
+            finally:
+                deadline.reset(token)
+
+    """
+    Unit test case for a slow read in flight
+
+    This test case verify that a read still unanswered at the -
+    deadline is given up, while a write is waited for.
+    """
+    @patch("app.storage.connections._Connection")
+    def test_read_in_flight_bounded(self, mock_connection):
+        release = threading.Event()
+        table = mock_connection.return_value.target.return_value
+        table.get_item.side_effect = lambda **kwargs: release.wait(2) and {}
+        table.update_item.side_effect = lambda **kwargs: time.sleep(0.1) or {"Attributes": {}}
+        pooled = PooledDynamoDB(DynamoDBPool("ap-southeast-1", size=2)).Table("Accounts")
+
+        token = deadline.start(0.05)
+        try:
+            started = time.monotonic()
+            with self.assertRaises(DeadlineExceeded) as raised:
+                pooled.get_item(Key={"account_id": "12345"})
+            self.assertEqual(raised.exception.stage, "get_item")
+            self.assertLess(time.monotonic() - started, 1)
+
+            token2 = deadline.start(0.05)
+            self.assertEqual(pooled.update_item(Key={"account_id": "12345"}), {"Attributes": {}})
+            deadline.reset(token2)
+        finally:
+            deadline.reset(token)
+            release.set()
+
+    """
+    Unit test case for botocore retries of reads
+
+    This test case verify that a read is stopped before it is sent -
+    once the deadline is spent, so botocore does not retry past it.
+    """
+    @patch.dict(os.environ, {"AWS_ACCESS_KEY_ID": "test", "AWS_SECRET_ACCESS_KEY": "test"})  # nosec B105
+    def test_read_stopped_before_send(self):
+        table = _Connection("ap-southeast-1", client_config(max_attempts=1)).target("table", "Accounts")
+        token = deadline.start(0)
+        try:
+            with self.assertRaises(DeadlineExceeded) as raised:
+                table.get_item(Key={"account_id": "12345"})
+            self.assertEqual(raised.exception.stage, "get_item")
+        finally:
+            deadline.reset(token)
+
+
+class TestHedgedReads(unittest.TestCase):
+
+    def setUp(self):
+        self.hedging = HedgedReads("test", min_delay=0.01, max_delay=0.01, min_samples=1000)
+
+    """
+    Unit test case for a fast read
+
+    This test case verify that a read answering within the delay is -
+    not hedged.
+    """
+    def test_fast_read(self):
+        calls = []
+        sent = hedges_sent.value(operation="test")
+        self.assertEqual(self.hedging.call(lambda: calls.append(1) or "item"), "item")
+        self.assertEqual((calls, hedges_sent.value(operation="test")), ([1], sent))
+
+    """
+    Unit test case for a slow read
+
+    This test case verify that a read slower than the delay is sent -
+    again and the first answer is returned, counted as a hedge win.
+    """
+    def test_hedge_wins(self):
+        release = threading.Event()
+        calls = []
+
+        def read():
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(2)
+                return "slow"
+            return "fast"
+
+        wins = hedge_wins.value(operation="test")
+        self.assertEqual(self.hedging.call(read), "fast")
+        self.assertEqual(hedge_wins.value(operation="test"), wins + 1)
+        release.set()
+
+    """
+    Unit test case for the hedge budget
+
+    This test case verify that once the budget is spent a slow read -
+    is waited for instead of hedged.
+    """
+    def test_hedge_budget(self):
+        hedging = HedgedReads("test", min_delay=0.01, max_delay=0.01, min_samples=1000, budget=0, burst=1)
+        calls = []
+
+        def read():
+            calls.append(1)
+            time.sleep(0.03)
+            return "item"
+
+        skipped = hedges_skipped.value(operation="test", reason="budget")
+        self.assertEqual(hedging.call(read), "item")
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(hedging.call(read), "item")
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(hedges_skipped.value(operation="test", reason="budget"), skipped + 1)
+
+    """
+    Unit test case for a saturated executor
+
+    This test case verify that a read finding every thread busy runs -
+    on the caller's thread, and a slow read is not hedged then.
+    """
+    def test_saturated(self):
+        hedging = HedgedReads("test", min_delay=0.01, max_delay=0.01, min_samples=1000, workers=1)
+        release = threading.Event()
+        calls = []
+
+        def slow_read():
+            calls.append(1)
+            release.wait(2)
+            return "slow"
+
+        results = []
+        caller = threading.Thread(target=lambda: results.append(hedging.call(slow_read)))
+        caller.start()
+        time.sleep(0.05)
+        try:
+            self.assertIs(hedging.call(threading.current_thread), threading.current_thread())
+            self.assertEqual(len(calls), 1)
+        finally:
+            release.set()
+            caller.join()
+        self.assertEqual(results, ["slow"])
+
+    """
+    Unit test case for hedged reads and the deadline
+
+    This test case verify that the wait for either read ends at the -
+    request deadline.
+    """
+    def test_deadline(self):
+        release = threading.Event()
+        token = deadline.start(0.05)
+        try:
+            with self.assertRaises(DeadlineExceeded):
+                self.hedging.call(lambda: release.wait(2))
+        finally:
+            deadline.reset(token)
+            release.set()
+
+    """
+    Unit test case for the hedge delay
+
+    This test case verify that the delay follows the percentile of -
+    the observed latencies within its bounds.
+    """
+    def test_delay_percentile(self):
+        hedging = HedgedReads("test", percentile=90, min_delay=0.001, max_delay=0.5, min_samples=10)
+        for latency in range(1, 101):
+            hedging._observe(latency / 1000)
+        self.assertAlmostEqual(hedging.delay, 0.091)
+
+        for _ in range(100):
+            hedging._observe(2.0)
+        self.assertEqual(hedging.delay, 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import time
+import unittest
+import threading
+from unittest.mock import MagicMock
+from botocore.exceptions import ClientError
+from app.utils.cache import LRUCache
+from app.utils.idempotency import (
+    IdempotencyStore, IdempotencyError, DynamoDBIdempotencyTier, NotApplied, fingerprint, IN_PROGRESS,
+    FAILED_BODY
+)
+
+
+class TestIdempotency(unittest.TestCase):
+
+    def setUp(self):
+        self.store = IdempotencyStore(LRUCache(100, ttl=60), wait=2)
+        self.calls = []
+
+    def run_once(self, status=200, delay=0):
+        def func():
+            self.calls.append(1)
+            time.sleep(delay)
+            return status, '{"current_balance":"10"}'
+        return func
+
+    """
+    Unit test case for replaying a stored result
+
+    This test case verify that a retry with the same key and payload -
+    gets the first result without running again, and a different -
+    payload under the same key is rejected.
+    """
+    def test_replay(self):
+        digest = fingerprint({"account_id": "1", "amount": 10})
+        self.assertEqual(self.store.execute("k", digest, self.run_once()), (200, '{"current_balance":"10"}'))
+        self.assertEqual(self.store.execute("k", digest, self.run_once()), (200, '{"current_balance":"10"}'))
+        self.assertEqual(len(self.calls), 1)
+
+        with self.assertRaises(IdempotencyError) as ctx:
+            self.store.execute("k", fingerprint({"account_id": "1", "amount": 20}), self.run_once())
+        self.assertEqual(ctx.exception.status, 422)
+
+    """
+    Unit test case for concurrent duplicates
+
+    This test case verify that duplicates sent while the first request -
+    runs wait for its result instead of running again.
+    """
+    def test_concurrent_duplicates_wait(self):
+        digest = fingerprint({"amount": 1})
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.store.execute("k", digest, self.run_once(delay=0.05))))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(len(results), 8)
+
+    """
+    Unit test case for server errors
+
+    This test case verify that only a failure known to come before the -
+    write releases the key for a retry, while a 5xx result or an -
+    exception, which may follow a committed write, is replayed.
+    """
+    def test_server_errors(self):
+        digest = fingerprint({})
+
+        def not_applied():
+            self.calls.append(1)
+            raise NotApplied(503, '{"error":"busy"}')
+
+        self.assertEqual(self.store.execute("a", digest, not_applied), (503, '{"error":"busy"}'))
+        self.store.execute("a", digest, self.run_once())
+        self.assertEqual(len(self.calls), 2)
+
+        self.store.execute("b", digest, self.run_once(status=500))
+        self.assertEqual(self.store.execute("b", digest, self.run_once())[0], 500)
+        self.assertEqual(len(self.calls), 3)
+
+        def failing():
+            self.calls.append(1)
+            raise RuntimeError("read after write failed")
+
+        with self.assertRaises(RuntimeError):
+            self.store.execute("c", digest, failing)
+        self.assertEqual(self.store.execute("c", digest, self.run_once()), (500, FAILED_BODY))
+        self.assertEqual(len(self.calls), 4)
+
+    """
+    Unit test case for the claim lease
+
+    This test case verify that the persistent claim holds for the -
+    lease, not for the wait of duplicates.
+    """
+    def test_claim_lease(self):
+        tier = MagicMock()
+        tier.claim.return_value = None
+        store = IdempotencyStore(LRUCache(100, ttl=60), persistent=tier, wait=2, lease=45)
+        store.execute("k", fingerprint({}), self.run_once())
+        self.assertEqual(tier.claim.call_args.args[2], 45)
+
+    """
+    Unit test case for the persistent tier
+
+    This test case verify that a key completed by another worker is -
+    replayed from the conditional put's ALL_OLD item, and a key still -
+    running elsewhere is polled until it completes.
+    """
+    def test_persistent_tier(self):
+        digest = fingerprint({"amount": 1})
+        now = int(time.time())
+        completed = {
+            "idempotency_key": {"S": "k"},
+            "state": {"S": "completed"},
+            "fingerprint": {"B": digest},
+            "status": {"N": "200"},
+            "body": {"S": "{}"},
+            "expires_at": {"N": str(now + 60)}
+        }
+        error_response = {"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}, "Item": completed}
+
+        table = MagicMock()
+        table.put_item.side_effect = ClientError(error_response, "put_item")
+        tier = DynamoDBIdempotencyTier(table)
+        self.assertEqual(tier.claim("k", digest, 10, 60), (digest, 200, "{}"))
+
+        tier = MagicMock()
+        tier.claim.return_value = IN_PROGRESS
+        tier.get.side_effect = [IN_PROGRESS, (digest, 201, "{}")]
+        store = IdempotencyStore(LRUCache(100, ttl=60), persistent=tier, wait=2, poll_interval=0.001)
+        self.assertEqual(store.execute("k", digest, self.run_once()), (201, "{}"))
+        self.assertEqual(self.calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import io
+import json
+import tempfile
+import unittest
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+from app.storage.memory import MemoryStorage
+from app.storage.sqlite import SQLiteStorage
+from app.storage.dynamodb import DynamoDBStorage
+from app.utils.importer import (
+    Checkpoint, ImportFailed, import_accounts, read_csv, read_ndjson, _Watermark
+)
+
+
+def ndjson(count, first=1):
+    return io.StringIO("".join(
+        json.dumps({"account_id": str(i), "current_balance": i, "daily_limit": 1000}) + "\n"
+        for i in range(first, first + count)
+    ))
+
+
+class FailingStorage(MemoryStorage):
+    """Memory storage whose put_many fails from the failing_call-th call on."""
+
+    def __init__(self, failing_call):
+        super().__init__()
+        self.calls = 0
+        self.failing_call = failing_call
+
+    def put_many(self, items):
+        self.calls += 1
+        if self.calls >= self.failing_call:
+            raise RuntimeError("throttled")
+        return super().put_many(items)
+
+
+class TestImporter(unittest.TestCase):
+
+    """
+    Unit test case for an NDJSON import into SQLite
+
+    This test case verify that valid records are written, that -
+    invalid lines and records are reported as rejects with their -
+    position, and that the checkpoint covers the whole file.
+    """
+    def test_import_ndjson(self):
+        stream = io.StringIO(
+            '{"account_id": "1", "current_balance": 10.50, "daily_limit": 100}\n'
+            '\n'
+            '{not json\n'
+            '{"account_id": "2", "current_balance": -5, "daily_limit": 100}\n'
+            '[1]\n'
+            '{"account_id": 3, "current_balance": 0, "daily_limit": 100, "first_name": "Ann"}\n'
+        )
+        rejects = io.StringIO()
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = SQLiteStorage(os.path.join(tmp, "accounts.db"))
+            checkpoint = Checkpoint(os.path.join(tmp, "import.checkpoint"), "accounts.ndjson")
+            stats = import_accounts(storage, read_ndjson(stream), workers=2, chunk_size=1,
+                                    checkpoint=checkpoint, rejects=rejects)
+
+            self.assertEqual((stats["records"], stats["written"], stats["rejected"]), (5, 2, 3))
+            self.assertEqual(checkpoint.load(), 5)
+            self.assertEqual(storage.get("1")["current_balance"], Decimal("10.50"))
+            self.assertEqual(storage.get("3")["daily_amount_withdrawn"], Decimal("0"))
+            self.assertEqual(storage.get("3")["first_name"], "Ann")
+            self.assertIsNone(storage.get("2"))
+
+        self.assertEqual([json.loads(line) for line in rejects.getvalue().splitlines()], [
+            {"record": 1, "error": "Invalid JSON"},
+            {"record": 2, "error": "Invalid current_balance"},
+            {"record": 3, "error": "Record is not a JSON object"}
+        ])
+
+    """
+    Unit test case for a CSV import
+
+    This test case verify that CSV rows are validated from their -
+    string cells, with empty cells read as missing fields.
+    """
+    def test_import_csv(self):
+        stream = io.StringIO(
+            "account_id,current_balance,daily_limit,daily_amount_withdrawn,withdrawal_date\n"
+            "1,100.25,500,20,2024-06-30\n"
+            "2,50,500,,\n"
+        )
+        storage = MemoryStorage()
+        stats = import_accounts(storage, read_csv(stream))
+        self.assertEqual((stats["written"], stats["rejected"]), (2, 0))
+        self.assertEqual(storage.get("1")["daily_amount_withdrawn"], Decimal("20"))
+        self.assertEqual(storage.get("1")["withdrawal_date"], "2024-06-30")
+        self.assertNotIn("withdrawal_date", storage.get("2"))
+
+    """
+    Unit test case for resuming an import
+
+    This test case verify that a failed chunk stops the import with -
+    the checkpoint before it, and that the next run skips the -
+    records already written and writes the rest.
+    """
+    def test_resume_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint = Checkpoint(os.path.join(tmp, "import.checkpoint"), "accounts.ndjson")
+            storage = FailingStorage(failing_call=3)
+            with self.assertRaises(ImportFailed):
+                import_accounts(storage, read_ndjson(ndjson(100)), workers=1, chunk_size=10, checkpoint=checkpoint)
+            self.assertEqual(checkpoint.load(), 20)
+
+            storage.failing_call = float("inf")
+            stats = import_accounts(storage, read_ndjson(ndjson(100)), start=checkpoint.load(),
+                                    workers=4, chunk_size=10, checkpoint=checkpoint)
+            self.assertEqual((stats["skipped"], stats["written"]), (20, 80))
+            self.assertEqual(checkpoint.load(), 100)
+            self.assertEqual(len(storage.batch_get([str(i) for i in range(1, 101)])[0]), 100)
+
+            with self.assertRaises(ValueError):
+                Checkpoint(checkpoint.path, "other.ndjson").load()
+
+    """
+    Unit test case for the checkpoint watermark
+
+    This test case verify that chunks completing out of order only -
+    move the checkpoint once every chunk before them completed.
+    """
+    def test_watermark(self):
+        watermark = _Watermark(0)
+        watermark.complete(10, 20)
+        watermark.complete(20, 30)
+        self.assertEqual(watermark.position, 0)
+        watermark.complete(0, 10)
+        self.assertEqual(watermark.position, 30)
+
+    """
+    Unit test case for DynamoDB batch writes
+
+    This test case verify that items are written in chunks of 25, -
+    that UnprocessedItems are retried and that a key repeated within -
+    a chunk is only put once.
+    """
+    @patch("app.storage.dynamodb.time.sleep")
+    def test_dynamodb_put_many(self, mock_sleep):
+        storage = DynamoDBStorage("Accounts", "ap-southeast-1", batch_max_retries=2)
+        storage.resource = MagicMock()
+        items = [{"account_id": str(i), "current_balance": Decimal("1")} for i in range(30)]
+        items.append({"account_id": "29", "current_balance": Decimal("2")})
+        unprocessed = {"Accounts": [{"PutRequest": {"Item": items[0]}}]}
+        storage.resource.batch_write_item.side_effect = [
+            {"UnprocessedItems": unprocessed}, {}, {}
+        ]
+
+        self.assertEqual(storage.put_many(items), [])
+        calls = [c.kwargs["RequestItems"]["Accounts"] for c in storage.resource.batch_write_item.call_args_list]
+        self.assertEqual([len(requests) for requests in calls], [25, 1, 5])
+        self.assertEqual(calls[2][-1], {"PutRequest": {"Item": items[-1]}})
+        mock_sleep.assert_called_once_with(0.05)
+
+        storage.resource.batch_write_item.side_effect = None
+        storage.resource.batch_write_item.return_value = {"UnprocessedItems": unprocessed}
+        self.assertEqual(storage.put_many(items[:1]), [items[0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import unittest
+import base64
+from unittest.mock import patch, MagicMock
+from botocore.exceptions import ClientError
+from app.main import app
+from app.utils.metrics import (
+    Registry, InstrumentedDynamoDB, dynamodb_consumed_capacity, dynamodb_throttles,
+    dynamodb_retries, dynamodb_request_duration
+)
+
+import werkzeug
+if not hasattr(werkzeug, "__version__"):
+    werkzeug.__version__ = "3.0.0"
+
+
+class TestMetrics(unittest.TestCase):
+
+    """
+    Unit test case for the text exposition format
+
+    This test case verify that counters and histograms render as -
+    Prometheus text with cumulative buckets.
+    """
+    def test_render(self):
+        registry = Registry()
+        registry.counter("requests_total", "Requests.", ("route",)).inc(route="/balance")
+        histogram = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        text = registry.render()
+        self.assertIn('requests_total{route="/balance"} 1.0', text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn("latency_seconds_count 3", text)
+
+    """
+    Unit test case for the instrumented DynamoDB client
+
+    This test case verify that consumed capacity is requested and -
+    recorded, and that throttling errors and retries are counted.
+    """
+    def test_instrumented_dynamodb(self):
+        table = MagicMock()
+        table.get_item.return_value = {
+            "Item": {}, "ConsumedCapacity": {"CapacityUnits": 0.5},
+            "ResponseMetadata": {"RetryAttempts": 2}
+        }
+        table.update_item.side_effect = ClientError(
+            {"Error": {"Code": "ProvisionedThroughputExceededException"}}, "UpdateItem")
+        instrumented = InstrumentedDynamoDB(table)
+
+        capacity = dynamodb_consumed_capacity.value(operation="get_item")
+        retries = dynamodb_retries.value(operation="get_item")
+        throttles = dynamodb_throttles.value(operation="update_item")
+        calls = dynamodb_request_duration.count(operation="get_item")
+
+        instrumented.get_item(Key={"account_id": "12345"})
+        with self.assertRaises(ClientError):
+            instrumented.update_item(Key={"account_id": "12345"})
+
+        table.get_item.assert_called_once_with(Key={"account_id": "12345"}, ReturnConsumedCapacity="TOTAL")
+        self.assertEqual(dynamodb_consumed_capacity.value(operation="get_item"), capacity + 0.5)
+        self.assertEqual(dynamodb_retries.value(operation="get_item"), retries + 2)
+        self.assertEqual(dynamodb_throttles.value(operation="update_item"), throttles + 1)
+        self.assertEqual(dynamodb_request_duration.count(operation="get_item"), calls + 1)
+        self.assertIs(instrumented.name, table.name)
+
+    """
+    Unit test case for the /metrics endpoint
+
+    This test case verify that /metrics needs no credentials and -
+    reports requests by route template and status code.
+
+    :param mock_get: Mock get values from Accounts table
+    """
+    @patch("app.main.table.get_item")
+    def test_metrics_endpoint(self, mock_get):
+        mock_get.return_value = {}
+        client = app.test_client()
+        with patch("app.main.credentials.get", return_value=("user", "pass")):
+            token = base64.b64encode(b"user:pass").decode()
+            client.get("/balance/67899", headers={"Authorization": f"Basic {token}"})
+            client.get("/balance/67899")
+
+        response = client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        text = response.get_data(as_text=True)
+        self.assertIn('http_requests_total{method="GET",route="/balance/<account_id>",status="404"}', text)
+        self.assertIn('http_requests_total{method="GET",route="/balance/<account_id>",status="401"}', text)
+        self.assertIn("balance_cache_hits", text)
+        self.assertIn("http_requests_in_flight 1.0", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
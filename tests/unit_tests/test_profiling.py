@@ -0,0 +1,106 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import pstats
+import marshal
+import tempfile
+import unittest
+from unittest.mock import patch
+from app.utils.profiling import RequestProfiler, collapsed_stacks
+
+
+def stats_of(entries):
+    stats = pstats.Stats()
+    stats.stats = entries
+    return stats
+
+
+class TestProfiling(unittest.TestCase):
+
+    """
+    Unit test case for a disabled or busy profiler
+
+    This test case verify that no profile is started at rate 0, and -
+    that only one request is profiled at a time.
+    """
+    def test_sampling(self):
+        profiler = RequestProfiler()
+        self.assertIsNone(profiler.start())
+        with self.assertRaises(ValueError):
+            profiler.set_rate(1.5)
+
+        profiler.set_rate(1)
+        profile = profiler.start()
+        try:
+            self.assertIsNotNone(profile)
+            self.assertIsNone(profiler.start())
+        finally:
+            profiler.stop(profile, "GET /")
+        self.assertEqual(profiler.routes()["GET /"]["requests"], 1)
+
+        with patch("app.utils.profiling.random.random", return_value=0.5):
+            profiler.set_rate(0.25)
+            self.assertIsNone(profiler.start())
+
+    """
+    Unit test case for collapsed stacks
+
+    This test case verify that the time of a function called from -
+    two callers is shared out by the time each spent in it, and that -
+    recursive calls end the stack.
+    """
+    def test_collapsed_stacks(self):
+        view = ("app/main.py", 10, "view")
+        auth = ("app/main.py", 20, "auth")
+        dumps = ("~", 0, "<built-in method dumps>")
+        stacks = collapsed_stacks(stats_of({
+            view: (1, 1, 0.001, 0.010, {}),
+            auth: (1, 1, 0.002, 0.005, {view: (1, 1, 0.002, 0.005)}),
+            dumps: (2, 2, 0.006, 0.006, {view: (1, 1, 0.002, 0.002), auth: (1, 1, 0.003, 0.003),
+                                         dumps: (1, 1, 0.001, 0.001)}),
+        }), ("GET /",))
+
+        self.assertEqual(stacks, {
+            "GET /;view (app/main.py:10)": 1000,
+            "GET /;view (app/main.py:10);auth (app/main.py:20)": 2000,
+            "GET /;view (app/main.py:10);<built-in method dumps>": 2000,
+            "GET /;view (app/main.py:10);auth (app/main.py:20);<built-in method dumps>": 3000
+        })
+
+    """
+    Unit test case for a profiler shared by worker processes
+
+    This test case verify that the rate set on one worker reaches the -
+    other, that the profiles of both are merged, and that a reset on -
+    one drops the profiles of both.
+    """
+    def test_shared_directory(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        first = RequestProfiler(directory=directory.name, refresh=0)
+        second = RequestProfiler(directory=directory.name, refresh=0)
+
+        first.set_rate(1)
+        self.assertEqual(second.poll(), 1.0)
+        for profiler in (first, second, second):
+            profile = profiler.start()
+            sum(range(10))
+            profiler.stop(profile, "GET /")
+
+        self.assertEqual(first.routes()["GET /"]["requests"], 3)
+        self.assertIn("GET /", second.collapsed())
+        self.assertTrue(marshal.loads(first.pstats("GET /")))  # nosec B302
+
+        first.reset()
+        self.assertEqual(second.routes(), {})
+        # A worker that missed the reset saves profiles of the old generation
+        stale = RequestProfiler(1, directory=directory.name)
+        stale.stop(stale.start(), "GET /stale")
+        self.assertEqual(second.routes(), {})
+        self.assertEqual(second.poll(), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
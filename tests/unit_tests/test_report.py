@@ -0,0 +1,152 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import unittest
+from decimal import Decimal
+from unittest.mock import MagicMock
+from app.storage.memory import MemoryStorage
+from app.storage.dynamodb import DynamoDBStorage, SCAN_PROJECTION
+from app.storage.scan import ReadBudget, parallel_scan
+from app.utils.report import AccountReport, run_report, parse_buckets
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TestReport(unittest.TestCase):
+
+    """
+    Unit test case for the report aggregates
+
+    This test case verify that shard items only add their balance, -
+    that counters of an earlier day count as nothing withdrawn, and -
+    that accounts near their limit and the distribution are counted.
+    """
+    def test_account_report(self):
+        today = "2024-06-30"
+        report = AccountReport(today, near_limit=0.8, buckets=(0, 100, 500))
+        report.add([
+            {"account_id": "1", "current_balance": Decimal("100"), "daily_limit": Decimal("1000"),
+             "daily_amount_withdrawn": Decimal("900"), "withdrawal_date": today},
+            {"account_id": "2", "current_balance": Decimal("50"), "daily_limit": Decimal("1000"),
+             "daily_amount_withdrawn": Decimal("900"), "withdrawal_date": "2024-06-29"},
+            {"account_id": "3", "current_balance": Decimal("10"), "daily_limit": Decimal("100"),
+             "daily_amount_withdrawn": Decimal("50"), "withdrawal_date": today},
+            {"account_id": "1#1", "shard_of": "1", "current_balance": Decimal("40")}
+        ])
+        self.assertEqual(report.to_dict(), {
+            "date": today, "items_scanned": 4, "accounts": 3, "total_balance": Decimal("200"),
+            "withdrawn_today": Decimal("950"), "near_daily_limit": 1, "near_limit_ratio": Decimal("0.8"),
+            "withdrawn_distribution": [
+                {"le": "0", "accounts": 1}, {"le": "100", "accounts": 1},
+                {"le": "500", "accounts": 0}, {"le": "+Inf", "accounts": 1}
+            ]
+        })
+
+    """
+    Unit test case for the report of a local engine
+
+    This test case verify that run_report reads every page and ends -
+    with the full report.
+    """
+    def test_run_report(self):
+        storage = MemoryStorage()
+        for account_id in range(1, 6):
+            storage.put({"account_id": str(account_id), "current_balance": Decimal("10"), "daily_limit": Decimal("100")})
+
+        reports = list(run_report(storage, page_size=2, progress_interval=0))
+        self.assertEqual(len(reports), 1)
+        self.assertEqual((reports[0]["partial"], reports[0]["accounts"]), (False, 5))
+        self.assertEqual(reports[0]["total_balance"], Decimal("50"))
+
+        with self.assertRaises(ValueError):
+            parse_buckets("500,100")
+
+
+class TestParallelScan(unittest.TestCase):
+
+    """
+    Unit test case for a parallel scan
+
+    This test case verify that every page of every segment is -
+    yielded, and that a failing segment fails the scan.
+    """
+    def test_parallel_scan(self):
+        def scan_page(segment, start_key):
+            page = start_key or 0
+            return [f"{segment}-{page}"], (page + 1 if page < 2 else None), 1
+
+        items = sorted(item for _, page in parallel_scan(scan_page, 3) for item in page)
+        self.assertEqual(items, sorted(f"{s}-{p}" for s in range(3) for p in range(3)))
+
+        def failing(segment, start_key):
+            raise RuntimeError("scan failed")
+
+        with self.assertRaises(RuntimeError):
+            list(parallel_scan(failing, 2))
+
+    """
+    Unit test case for the read capacity budget
+
+    This test case verify that consumed units are paid off at the -
+    budget rate before the next page is read.
+    """
+    def test_read_budget(self):
+        clock = FakeClock()
+        budget = ReadBudget(5, clock=clock, sleep=clock.sleep)
+        budget.acquire()
+        budget.consume(10)
+        budget.acquire()
+        self.assertEqual(clock.slept, [2.0])
+
+        clock.now += 10
+        budget.consume(5)
+        budget.acquire()
+        self.assertEqual(clock.slept, [2.0, 1.0])
+
+        unlimited = ReadBudget(0, clock=clock, sleep=clock.sleep)
+        unlimited.consume(1000)
+        unlimited.acquire()
+        self.assertEqual(len(clock.slept), 2)
+
+    """
+    Unit test case for the DynamoDB scan
+
+    This test case verify that each segment is scanned with the -
+    projection and continues from its LastEvaluatedKey.
+    """
+    def test_dynamodb_scan(self):
+        storage = DynamoDBStorage("Accounts", "ap-southeast-1")
+        storage.table = MagicMock()
+
+        def scan(**kwargs):
+            if kwargs["Segment"] == 0 and "ExclusiveStartKey" not in kwargs:
+                return {"Items": [{"account_id": "1"}], "LastEvaluatedKey": {"account_id": "1"},
+                        "ConsumedCapacity": {"CapacityUnits": 0.5}}
+            return {"Items": [{"account_id": str(kwargs["Segment"] + 2)}], "ConsumedCapacity": {"CapacityUnits": 0.5}}
+
+        storage.table.scan.side_effect = scan
+        items = sorted(item["account_id"] for page in storage.scan(segments=2, page_size=10) for item in page)
+        self.assertEqual(items, ["1", "2", "3"])
+
+        calls = [c.kwargs for c in storage.table.scan.call_args_list]
+        self.assertEqual(len(calls), 3)
+        self.assertTrue(all(c["ProjectionExpression"] == SCAN_PROJECTION and c["TotalSegments"] == 2 for c in calls))
+        self.assertIn({"account_id": "1"}, [c.get("ExclusiveStartKey") for c in calls])
+
+
+if __name__ == "__main__":
+    unittest.main()
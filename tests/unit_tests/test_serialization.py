@@ -0,0 +1,83 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import json
+import unittest
+from decimal import Decimal
+from flask import Flask
+from app.utils.serialization import FastJSONProvider, decimal_number, select_fields
+
+
+class TestSerialization(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+
+    """
+    Unit test case for Decimal numbers
+
+    This test case verify that Decimals are written as floats only -
+    when the float keeps their exact value.
+    """
+    def test_decimal_number(self):
+        self.assertEqual(decimal_number(Decimal("2500.10")), 2500.1)
+        self.assertEqual(decimal_number(Decimal("1E+3")), 1000.0)
+        self.assertEqual(decimal_number(Decimal("-1234567890123.45")), -1234567890123.45)
+        self.assertEqual(decimal_number(Decimal("12345678901234.567")), "12345678901234.567")
+        self.assertEqual(decimal_number(Decimal("NaN")), "NaN")
+
+    """
+    Unit test case for the JSON provider encoders
+
+    This test case verify that every encoder renders the same -
+    response, in number and string Decimal format.
+    """
+    def test_encoders_agree(self):
+        body = {"account_id": "12345", "current_balance": Decimal("0.30"), "name": "Zoë", 7: [Decimal("12345678901234.567")]}
+        expected = {"account_id": "12345", "current_balance": 0.3, "name": "Zoë", "7": ["12345678901234.567"]}
+        for encoder in ("json", "orjson"):
+            provider = FastJSONProvider(self.app, encoder=encoder)
+            self.assertEqual(json.loads(provider.dumps(body)), expected, encoder)
+
+            provider = FastJSONProvider(self.app, decimal="string", encoder=encoder)
+            self.assertEqual(json.loads(provider.dumps(body))["current_balance"], "0.30", encoder)
+
+    """
+    Unit test case for the JSON provider configuration
+
+    This test case verify that unknown formats are rejected, that -
+    unsupported objects fail to encode and that responses are JSON.
+    """
+    def test_provider(self):
+        with self.assertRaises(ValueError):
+            FastJSONProvider(self.app, decimal="float")
+        with self.assertRaises(ValueError):
+            FastJSONProvider(self.app, encoder="yaml")
+
+        provider = FastJSONProvider(self.app)
+        self.assertIn(provider.encoder, ("json", "orjson"))
+        with self.assertRaises(TypeError):
+            provider.dumps({"value": object()})
+        self.assertEqual(provider.dumps({"a": 1}, indent=2), '{\n  "a": 1\n}')
+
+        with self.app.app_context():
+            response = provider.response({"current_balance": Decimal("5")})
+        self.assertEqual(response.mimetype, "application/json")
+        self.assertEqual(response.get_data(as_text=True), '{"current_balance":5.0}')
+
+    """
+    Unit test case for response field whitelists
+
+    This test case verify that only whitelisted fields are returned.
+    """
+    def test_select_fields(self):
+        item = {"account_id": "1", "current_balance": Decimal("5"), "name": "Jane"}
+        self.assertEqual(select_fields(item, ("account_id", "current_balance", "daily_limit")),
+                         {"account_id": "1", "current_balance": Decimal("5")})
+        self.assertIs(select_fields(item, None), item)
+
+
+if __name__ == "__main__":
+    unittest.main()
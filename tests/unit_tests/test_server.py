@@ -0,0 +1,81 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import unittest
+from unittest.mock import patch
+from app import main
+from app.server import build_options, post_fork, Server
+
+
+class TestServer(unittest.TestCase):
+
+    """
+    Unit test case for server settings
+
+    This test case verify that worker, thread, keep-alive and backlog -
+    settings are read from the environment.
+    """
+    def test_build_options_from_env(self):
+        options = build_options({
+            "WEB_WORKERS": "3",
+            "WEB_THREADS": "16",
+            "WEB_KEEPALIVE": "90",
+            "WEB_BACKLOG": "512"
+        })
+        self.assertEqual(options["workers"], 3)
+        self.assertEqual(options["threads"], 16)
+        self.assertEqual(options["keepalive"], 90)
+        self.assertEqual(options["backlog"], 512)
+        self.assertEqual(options["worker_class"], "gthread")
+        self.assertTrue(options["preload_app"])
+
+    """
+    Unit test case for server defaults
+
+    This test case verify that the worker count defaults to the -
+    CPU count and that the ASGI app uses uvicorn workers.
+    """
+    def test_build_options_defaults(self):
+        options = build_options({"WEB_APP": "asgi"})
+        self.assertEqual(options["workers"], os.cpu_count())
+        self.assertEqual(options["worker_class"], "uvicorn.workers.UvicornWorker")
+        self.assertLess(options["graceful_timeout"], 30)
+
+    """
+    Unit test case for the post fork hook
+
+    This test case verify that a forked worker builds its own -
+    storage and DynamoDB connection pool instead of reusing the preloaded -
+    one, and warms it.
+    """
+    @patch("app.storage.dynamodb.DynamoDBStorage.warm")
+    @patch("app.main.credentials.prefetch")
+    def test_post_fork_rebuilds_storage(self, mock_prefetch, mock_warm):
+        storage, dynamodb, table = main.storage, main.dynamodb, main.table
+        try:
+            post_fork(None, None)
+            self.assertIsNot(main.storage, storage)
+            self.assertIsNot(main.dynamodb, dynamodb)
+            self.assertIsNot(main.storage.pool, storage.pool)
+            self.assertIs(main.table, main.storage.table)
+            mock_warm.assert_called_once()
+            mock_prefetch.assert_called_once()
+        finally:
+            main.storage, main.dynamodb, main.table = storage, dynamodb, table
+
+    """
+    Unit test case for the loaded app
+
+    This test case verify that the server loads the Flask app by -
+    default and applies the settings.
+    """
+    def test_server_loads_app(self):
+        server = Server(build_options({"WEB_WORKERS": "2"}))
+        self.assertIs(server.load(), main.app)
+        self.assertEqual(server.cfg.workers, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,270 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import unittest
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+from botocore.exceptions import ClientError
+from app.storage.dynamodb import DynamoDBStorage
+from app.storage.base import InsufficientBalance, AccountNotFound, UncachedItem
+from app.storage.sharding import plan_debits, shard_key, shard_count
+from app.storage.reshard import main as reshard_main
+
+
+def conditional_check_failed(operation="update_item"):
+    return ClientError({"Error": {"Code": "ConditionalCheckFailedException", "Message": "failed"}}, operation)
+
+
+class TestSharding(unittest.TestCase):
+
+    def setUp(self):
+        self.account_id = "12345"
+        self.storage = DynamoDBStorage("Accounts", "ap-southeast-1")
+        self.storage.table = MagicMock()
+        self.storage.client = MagicMock()
+        self.storage.resource = MagicMock()
+        self.today = self.storage.today()
+
+        # Account item holding shard 0, and shards 1 and 2
+        self.item = {
+            "account_id": self.account_id, "current_balance": Decimal("100"), "balance_shards": Decimal("3"),
+            "daily_limit": Decimal("1000"), "daily_amount_withdrawn": Decimal("0"), "withdrawal_date": self.today
+        }
+        self.storage.table.get_item.return_value = {"Item": self.item}
+        self.storage.resource.batch_get_item.return_value = {"Responses": {"Accounts": [
+            {"account_id": "12345#1", "current_balance": Decimal("300"), "version": Decimal("2")},
+            {"account_id": "12345#2", "current_balance": Decimal("50")}
+        ]}}
+
+    """
+    Unit test case for splitting a debit
+
+    This test case verify that a debit is taken from the largest -
+    shard balances first.
+    """
+    def test_plan_debits(self):
+        self.assertEqual(plan_debits({0: Decimal("100"), 1: Decimal("300"), 2: Decimal("50")}, Decimal("350")),
+                         {1: Decimal("300"), 0: Decimal("50")})
+        self.assertEqual(plan_debits({0: Decimal("10")}, Decimal("5")), {0: Decimal("5")})
+        self.assertEqual(shard_key("1", 0), "1")
+        self.assertEqual(shard_key("1", 2), "1#2")
+        self.assertEqual(shard_count({"account_id": "1"}), 1)
+
+    """
+    Unit test case for the balance of a sharded account
+
+    This test case verify that the shards are read with one -
+    BatchGetItem and summed into the account balance.
+    """
+    def test_get_sums_shards(self):
+        item = self.storage.get(self.account_id, consistent=True)
+        self.assertEqual(item["current_balance"], Decimal("450"))
+        self.assertEqual(item["version"], 2)
+
+        request = self.storage.resource.batch_get_item.call_args.kwargs["RequestItems"]["Accounts"]
+        self.assertEqual(request["Keys"], [{"account_id": "12345#1"}, {"account_id": "12345#2"}])
+        self.assertTrue(request["ConsistentRead"])
+        self.assertEqual(self.storage.balance_shards.get(self.account_id), 3)
+
+        shards = self.storage.resource.batch_get_item.return_value
+        self.storage.resource.batch_get_item.side_effect = [{"Responses": {"Accounts": [self.item]}}, shards]
+        items, _ = self.storage.batch_get([self.account_id])
+        self.assertEqual(items[self.account_id]["current_balance"], Decimal("450"))
+
+    """
+    Unit test case for deposits to a sharded account
+
+    This test case verify that a deposit updates one shard item, and -
+    falls back to the account item when the shard was folded away.
+    """
+    @patch("app.storage.dynamodb.choose_shard", return_value=2)
+    def test_deposit_to_shard(self, mock_choose):
+        self.storage.balance_shards.set(self.account_id, 3)
+        self.storage.table.update_item.return_value = {"Attributes": {"account_id": "12345#2", "current_balance": Decimal("60")}}
+
+        item = self.storage.deposit(self.account_id, Decimal("10"))
+        self.assertEqual(self.storage.table.update_item.call_args.kwargs["Key"], {"account_id": "12345#2"})
+        self.assertEqual(item["current_balance"], Decimal("450"))
+
+        mock_choose.side_effect = [2, 0]
+        self.storage.table.update_item.reset_mock()
+        self.storage.table.update_item.side_effect = [
+            conditional_check_failed(), {"Attributes": dict(self.item, balance_shards=Decimal("1"))}
+        ]
+        item = self.storage.deposit(self.account_id, Decimal("10"))
+        self.assertEqual(self.storage.table.update_item.call_args.kwargs["Key"], {"account_id": self.account_id})
+        self.assertEqual(item["current_balance"], Decimal("100"))
+        self.assertIsNone(self.storage.balance_shards.get(self.account_id))
+
+    """
+    Unit test case for the answer of a deposit to a shard
+
+    This test case verify that a deposit answers from the written -
+    shard and the known state of the others without reading them, -
+    and that a failing read after the write does not fail the -
+    deposit, which has committed.
+    """
+    @patch("app.storage.dynamodb.choose_shard", return_value=2)
+    def test_deposit_without_read_after_write(self, mock_choose):
+        self.storage.get(self.account_id)
+        self.storage.table.get_item.reset_mock()
+        self.storage.resource.batch_get_item.reset_mock()
+        self.storage.table.update_item.return_value = {"Attributes": {
+            "account_id": "12345#2", "shard_of": self.account_id, "current_balance": Decimal("60"), "version": Decimal("1")
+        }}
+
+        item = self.storage.deposit(self.account_id, Decimal("10"))
+        self.assertIsInstance(item, UncachedItem)
+        self.assertEqual((item["current_balance"], item["version"]), (Decimal("460"), 3))
+        self.storage.table.get_item.assert_not_called()
+        self.storage.resource.batch_get_item.assert_not_called()
+
+        self.storage.shard_state.clear()
+        self.storage.table.get_item.side_effect = ClientError(
+            {"Error": {"Code": "ProvisionedThroughputExceededException", "Message": "throttled"}}, "GetItem")
+        item = self.storage.deposit(self.account_id, Decimal("10"))
+        self.assertEqual(item, {"account_id": self.account_id})
+        self.assertIsInstance(item, UncachedItem)
+        self.assertEqual(self.storage.table.update_item.call_count, 2)
+
+    """
+    Unit test case for withdrawals from a sharded account
+
+    This test case verify that the debit is split over the shards in -
+    one transaction, with the daily counter on the account item, and -
+    that the balance check uses the sum of the shards.
+    """
+    def test_withdraw_across_shards(self):
+        self.storage.balance_shards.set(self.account_id, 3)
+        item = self.storage.withdraw(self.account_id, Decimal("350"))
+        self.assertEqual(item["current_balance"], Decimal("100"))
+        self.assertEqual(item["daily_amount_withdrawn"], Decimal("350"))
+        self.assertEqual(item["version"], 4)
+
+        transact = self.storage.client.transact_write_items.call_args.kwargs["TransactItems"]
+        self.assertEqual(len(transact), 2)
+        main, shard = transact[0]["Update"], transact[1]["Update"]
+        self.assertIn("current_balance - :debit", main["UpdateExpression"])
+        self.assertIn("daily_amount_withdrawn + :val", main["UpdateExpression"])
+        self.assertEqual(main["ExpressionAttributeValues"][":debit"], {"N": "50"})
+        self.assertEqual(main["ExpressionAttributeValues"][":val"], {"N": "350"})
+        self.assertIn("balance_shards = :shards", main["ConditionExpression"])
+        self.assertEqual(shard["Key"], {"account_id": {"S": "12345#1"}})
+        self.assertEqual(shard["ExpressionAttributeValues"][":val"], {"N": "300"})
+
+        with self.assertRaises(InsufficientBalance):
+            self.storage.withdraw(self.account_id, Decimal("451"))
+        self.assertEqual(self.storage.client.transact_write_items.call_count, 1)
+
+    """
+    Unit test case for learning that an account is sharded
+
+    This test case verify that a withdrawal the account item alone -
+    cannot cover is retried across the shards instead of rejected.
+    """
+    def test_withdraw_learns_shards(self):
+        error = conditional_check_failed()
+        error.response["Item"] = {
+            "account_id": {"S": self.account_id}, "current_balance": {"N": "100"}, "balance_shards": {"N": "3"}
+        }
+        self.storage.table.update_item.side_effect = error
+
+        item = self.storage.withdraw(self.account_id, Decimal("200"))
+        self.assertEqual(item["current_balance"], Decimal("250"))
+        self.assertEqual(self.storage.table.update_item.call_count, 1)
+        self.storage.client.transact_write_items.assert_called_once()
+
+    """
+    Unit test case for a transfer from a sharded account
+
+    This test case verify that the credit joins the shard debits in -
+    the same transaction and a missing destination is reported.
+    """
+    def test_transfer_from_shards(self):
+        self.storage.balance_shards.set(self.account_id, 3)
+        self.storage.transfer(self.account_id, "67899", Decimal("120"))
+        transact = self.storage.client.transact_write_items.call_args.kwargs["TransactItems"]
+        self.assertEqual(transact[-1]["Update"]["Key"], {"account_id": {"S": "67899"}})
+
+        self.storage.client.transact_write_items.side_effect = ClientError({
+            "Error": {"Code": "TransactionCanceledException", "Message": "cancelled"},
+            "CancellationReasons": [{"Code": "None"}, {"Code": "None"}, {"Code": "ConditionalCheckFailed"}]
+        }, "transact_write_items")
+        with self.assertRaises(AccountNotFound):
+            self.storage.transfer(self.account_id, "67899", Decimal("120"))
+
+    """
+    Unit test case for growing the shards of an account
+
+    This test case verify that new shards are created empty before -
+    the account item announces them.
+    """
+    def test_reshard_grow(self):
+        self.storage.table.get_item.return_value = {"Item": {"account_id": self.account_id, "current_balance": Decimal("10")}}
+        self.assertEqual(self.storage.reshard(self.account_id, 3), 1)
+
+        puts = [c.kwargs["Item"]["account_id"] for c in self.storage.table.put_item.call_args_list]
+        self.assertEqual(puts, ["12345#1", "12345#2"])
+        update = self.storage.table.update_item.call_args.kwargs
+        self.assertEqual(update["ExpressionAttributeValues"], {":shards": 3, ":current": 1})
+
+        with self.assertRaises(ValueError):
+            self.storage.reshard(self.account_id, 0)
+        self.storage.ledger = MagicMock()
+        with self.assertRaises(ValueError):
+            self.storage.reshard(self.account_id, 2)
+
+    """
+    Unit test case for shrinking the shards of an account
+
+    This test case verify that each shard above the new count is -
+    folded into the account item and deleted in one transaction.
+    """
+    def test_reshard_shrink(self):
+        shards = {
+            "12345#2": {"account_id": "12345#2", "current_balance": Decimal("50"), "version": Decimal("4")},
+            "12345#1": {"account_id": "12345#1", "current_balance": Decimal("300")}
+        }
+
+        def get_item(Key, ConsistentRead=False):
+            if Key["account_id"] == self.account_id:
+                return {"Item": self.item}
+            return {"Item": shards[Key["account_id"]]}
+
+        self.storage.table.get_item.side_effect = get_item
+        self.assertEqual(self.storage.reshard(self.account_id, 1), 3)
+
+        calls = self.storage.client.transact_write_items.call_args_list
+        self.assertEqual(len(calls), 2)
+        first = calls[0].kwargs["TransactItems"]
+        self.assertEqual(first[0]["Update"]["ExpressionAttributeValues"],
+                         {":val": {"N": "50"}, ":shards": {"N": "2"}, ":current": {"N": "3"}, ":version": {"N": "5"}})
+        self.assertEqual(first[1]["Delete"]["Key"], {"account_id": {"S": "12345#2"}})
+        self.assertEqual(first[1]["Delete"]["ConditionExpression"], "current_balance = :val AND version = :version")
+
+        second = calls[1].kwargs["TransactItems"]
+        self.assertEqual(second[1]["Delete"]["Key"], {"account_id": {"S": "12345#1"}})
+        self.assertEqual(second[1]["Delete"]["ConditionExpression"], "current_balance = :val AND attribute_not_exists(version)")
+
+    """
+    Unit test case for the reshard tool
+
+    This test case verify that the tool reports the change and exits -
+    with an error for an invalid shard count.
+    """
+    @patch("app.storage.reshard.build_storage")
+    def test_reshard_tool(self, mock_build):
+        mock_build.return_value.reshard.return_value = 1
+        with patch("builtins.print") as mock_print:
+            self.assertEqual(reshard_main(["12345", "--shards", "4"]), 0)
+        mock_print.assert_called_once_with('{"account_id": "12345", "from": 1, "to": 4}')
+
+        mock_build.return_value.reshard.side_effect = ValueError("Shards must be between 1 and 64")
+        with patch("builtins.print"):
+            self.assertEqual(reshard_main(["12345", "--shards", "65"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
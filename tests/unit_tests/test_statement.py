@@ -0,0 +1,73 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import json
+import unittest
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from app.storage.memory import MemoryStorage
+from app.utils.statement import iter_ledger, render_statement
+
+
+class TestStatement(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = MemoryStorage()
+        self.storage.put({"account_id": "1", "current_balance": Decimal("100"), "daily_limit": Decimal("1000")})
+        self.storage.put({"account_id": "2", "current_balance": Decimal("0"), "daily_limit": Decimal("1000")})
+        for _ in range(5):
+            self.storage.deposit("1", Decimal("10"))
+        self.storage.withdraw("1", Decimal("30"))
+        self.storage.transfer("1", "2", Decimal("5"))
+
+    """
+    Unit test case for lazy ledger paging
+
+    This test case verify that entries are read page by page, oldest -
+    first, with the next page prefetched on the executor.
+    """
+    def test_iter_ledger_pages(self):
+        calls = []
+        history = self.storage.history
+        self.storage.history = lambda *args, **kwargs: calls.append(kwargs.get("cursor")) or history(*args, **kwargs)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            entries = iter_ledger(self.storage, "1", page_size=3, executor=executor)
+            self.assertEqual(next(entries)["type"], "deposit")
+            # The second page is requested before the first is consumed
+            self.assertEqual(len(calls), 2)
+            types = ["deposit"] + [entry["type"] for entry in entries]
+
+        self.assertEqual(types, ["deposit"] * 5 + ["withdraw", "transfer_out"])
+        self.assertEqual(len(calls), 3)
+
+    """
+    Unit test case for the NDJSON statement
+
+    This test case verify the running balance of every line, the -
+    summary line and that output is flushed in chunks.
+    """
+    def test_ndjson_statement(self):
+        entries = iter_ledger(self.storage, "1", page_size=2)
+        chunks = list(render_statement(entries, "ndjson", lambda value: json.dumps(value, default=str), chunk_size=200))
+        self.assertGreater(len(chunks), 1)
+
+        lines = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+        self.assertEqual([line["running_balance"] for line in lines[:-1]],
+                         ["110", "120", "130", "140", "150", "120", "115"])
+        summary = lines[-1]
+        self.assertEqual(summary["type"], "summary")
+        self.assertEqual((summary["entries"], summary["opening_balance"], summary["closing_balance"]), (7, "100", "115"))
+        self.assertEqual((summary["total_credits"], summary["total_debits"]), ("50", "35"))
+
+    def test_csv_statement(self):
+        chunks = render_statement(iter_ledger(self.storage, "2"), "csv", None)
+        rows = b"".join(chunks).decode().splitlines()
+        self.assertEqual(rows[0], "entry_id,created_at,type,amount,running_balance,counterparty")
+        self.assertTrue(rows[1].endswith(",transfer_in,5,5,1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
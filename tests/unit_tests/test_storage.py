@@ -0,0 +1,321 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import unittest
+import tempfile
+import threading
+from unittest.mock import patch
+from decimal import Decimal
+from app.storage import (
+    build_storage, AccountNotFound, InsufficientBalance, DailyLimitExceeded, InvalidTransfer,
+    InvalidCursor
+)
+from app.storage.memory import MemoryStorage
+from app.storage.sqlite import SQLiteStorage
+from app.storage.coalescing import CoalescingStorage, deposit_batch_size, _Batch
+from app.storage.base import UncachedItem
+
+"""
+Storage test cases shared by the local storage engines.
+
+Every test case in StorageContract runs once per engine so the -
+in-memory and SQLite engines keep the conditional update semantics -
+of the DynamoDB table.
+"""
+class StorageContract:
+
+    def make_storage(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.storage = self.make_storage()
+        self.storage.put({
+            "account_id": "12345",
+            "first_name": "John",
+            "current_balance": Decimal("2000"),
+            "daily_limit": Decimal("1000"),
+            "daily_amount_withdrawn": Decimal("0")
+        })
+
+    def test_get(self):
+        self.assertEqual(self.storage.get("12345")["current_balance"], Decimal("2000"))
+        self.assertIsNone(self.storage.get("67899"))
+
+    def test_batch_get(self):
+        items, unprocessed = self.storage.batch_get(["12345", "67899"])
+        self.assertEqual(list(items), ["12345"])
+        self.assertEqual(unprocessed, [])
+
+    def test_deposit(self):
+        item = self.storage.deposit("12345", Decimal("10.10"))
+        self.assertEqual(item["current_balance"], Decimal("2010.10"))
+        self.assertEqual(item["first_name"], "John")
+        with self.assertRaises(AccountNotFound):
+            self.storage.deposit("67899", Decimal("1"))
+
+    def test_withdraw(self):
+        item = self.storage.withdraw("12345", Decimal("300"))
+        self.assertEqual(item["current_balance"], Decimal("1700"))
+        self.assertEqual(item["daily_amount_withdrawn"], Decimal("300"))
+
+    def test_version(self):
+        self.assertEqual(self.storage.deposit("12345", Decimal("1"))["version"], 1)
+        self.assertEqual(self.storage.withdraw("12345", Decimal("1"))["version"], 2)
+        self.assertEqual(self.storage.get("12345")["version"], 2)
+
+    def test_withdraw_rejections(self):
+        with self.assertRaises(AccountNotFound):
+            self.storage.withdraw("67899", Decimal("1"))
+
+        self.storage.withdraw("12345", Decimal("900"))
+        with self.assertRaises(DailyLimitExceeded) as ctx:
+            self.storage.withdraw("12345", Decimal("200"))
+        self.assertEqual(ctx.exception.item["daily_amount_withdrawn"], Decimal("900"))
+
+        self.storage.put({"account_id": "555", "current_balance": Decimal("5"), "daily_limit": Decimal("100")})
+        with self.assertRaises(InsufficientBalance):
+            self.storage.withdraw("555", Decimal("10"))
+
+        # Rejected withdrawals leave the item untouched
+        self.assertEqual(self.storage.get("12345")["current_balance"], Decimal("1100"))
+
+    """
+    Unit test case for the daily counter reset
+
+    This test case verify that a counter of an earlier day does not -
+    count against today's limit and is restarted by the withdrawal.
+    """
+    def test_new_day_restarts_counter(self):
+        item = self.storage.get("12345")
+        item.update({"daily_amount_withdrawn": Decimal("1000"), "withdrawal_date": "2000-01-01"})
+        self.storage.put(item)
+
+        item = self.storage.withdraw("12345", Decimal("400"))
+        self.assertEqual(item["daily_amount_withdrawn"], Decimal("400"))
+        self.assertEqual(item["withdrawal_date"], self.storage.today())
+        with self.assertRaises(DailyLimitExceeded):
+            self.storage.withdraw("12345", Decimal("601"))
+
+    def test_concurrent_withdrawals_respect_limit(self):
+        errors = []
+
+        def withdraw():
+            try:
+                self.storage.withdraw("12345", Decimal("100"))
+            except DailyLimitExceeded:
+                errors.append(1)
+
+        threads = [threading.Thread(target=withdraw) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        item = self.storage.get("12345")
+        self.assertEqual(item["daily_amount_withdrawn"], Decimal("1000"))
+        self.assertEqual(item["current_balance"], Decimal("1000"))
+        self.assertEqual(len(errors), 10)
+
+    def test_transfer(self):
+        self.storage.put({"account_id": "555", "current_balance": Decimal("5"), "daily_limit": Decimal("100")})
+        self.storage.transfer("12345", "555", Decimal("250"))
+        self.assertEqual(self.storage.get("12345")["current_balance"], Decimal("1750"))
+        self.assertEqual(self.storage.get("12345")["daily_amount_withdrawn"], Decimal("250"))
+        self.assertEqual(self.storage.get("555")["current_balance"], Decimal("255"))
+
+    def test_transfer_rejections(self):
+        self.storage.put({"account_id": "555", "current_balance": Decimal("5"), "daily_limit": Decimal("100")})
+        with self.assertRaises(InvalidTransfer):
+            self.storage.transfer("12345", "12345", Decimal("1"))
+        with self.assertRaises(AccountNotFound) as ctx:
+            self.storage.transfer("12345", "67899", Decimal("1"))
+        self.assertEqual(ctx.exception.account_id, "67899")
+        with self.assertRaises(InsufficientBalance) as ctx:
+            self.storage.transfer("555", "12345", Decimal("10"))
+        self.assertEqual(ctx.exception.account_id, "555")
+
+        # Neither side of a rejected transfer is applied
+        self.assertEqual(self.storage.get("12345")["current_balance"], Decimal("2000"))
+        self.assertEqual(self.storage.get("555")["current_balance"], Decimal("5"))
+
+
+    """
+    Unit test case for the transaction ledger
+
+    This test case verify that every balance change is recorded with -
+    the balance after it, and that history pages follow the cursor -
+    and the time range.
+    """
+    def test_history(self):
+        self.storage.put({"account_id": "555", "current_balance": Decimal("5"), "daily_limit": Decimal("100")})
+        self.storage.deposit("12345", Decimal("100"))
+        self.storage.withdraw("12345", Decimal("50"))
+        self.storage.transfer("12345", "555", Decimal("25"))
+        with self.assertRaises(InsufficientBalance):
+            self.storage.withdraw("555", Decimal("1000"))
+
+        page, cursor = self.storage.history("12345", limit=2)
+        first_cursor = cursor
+        self.assertEqual([e["type"] for e in page], ["transfer_out", "withdraw"])
+        self.assertEqual(page[0]["balance_after"], Decimal("2025"))
+        self.assertEqual(page[0]["counterparty"], "555")
+
+        page, cursor = self.storage.history("12345", limit=2, cursor=cursor)
+        self.assertEqual([e["type"] for e in page], ["deposit"])
+        self.assertIsNone(cursor)
+
+        entries, _ = self.storage.history("555")
+        self.assertEqual([(e["type"], e["balance_after"]) for e in entries], [("transfer_in", Decimal("30"))])
+
+        first = self.storage.history("12345", newest_first=False)[0][0]
+        page, _ = self.storage.history("12345", start=first["entry_id"][:-13], newest_first=False)
+        self.assertEqual(len(page), 3)
+        page, _ = self.storage.history("12345", end=first["entry_id"][:-13])
+        self.assertEqual(page, [])
+
+        # Cursors are bound to their account
+        with self.assertRaises(InvalidCursor):
+            self.storage.history("555", cursor=first_cursor)
+        with self.assertRaises(InvalidCursor):
+            self.storage.history("12345", cursor="not-a-cursor")
+
+
+class TestMemoryStorage(StorageContract, unittest.TestCase):
+
+    def make_storage(self):
+        return MemoryStorage()
+
+
+class TestSQLiteStorage(StorageContract, unittest.TestCase):
+
+    def make_storage(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        return SQLiteStorage(os.path.join(tmp.name, "accounts.db"))
+
+    def test_wal_mode(self):
+        mode = self.storage._connect().execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+
+class TestCoalescingStorage(StorageContract, unittest.TestCase):
+
+    def make_storage(self):
+        self.backend = MemoryStorage()
+        return CoalescingStorage(self.backend, window=0.001)
+
+    """
+    Unit test case for deposit group commit
+
+    This test case verify that concurrent deposits to one account are -
+    applied with a single write, every depositor gets the balance -
+    right after its own deposit and each keeps its ledger entry.
+    """
+    def test_concurrent_deposits_coalesce(self):
+        self.storage.window = 1.0
+        self.storage.max_batch = 10
+        writes = []
+        deposit_many = self.backend.deposit_many
+        self.backend.deposit_many = lambda account_id, amounts: writes.append(list(amounts)) or deposit_many(account_id, amounts)
+        batches = deposit_batch_size.count()
+
+        balances = []
+        def run(amount):
+            balances.append(self.storage.deposit("12345", Decimal(amount))["current_balance"])
+
+        threads = [threading.Thread(target=run, args=(1,)) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # max_batch closes the batch long before the window
+        self.assertEqual(writes, [[Decimal("1")] * 10])
+        self.assertEqual(deposit_batch_size.count(), batches + 1)
+        self.assertEqual(sorted(balances), [Decimal(2000 + i) for i in range(1, 11)])
+        self.assertEqual(self.storage.get("12345")["current_balance"], Decimal("2010"))
+
+        entries, _ = self.storage.history("12345", limit=100, newest_first=False)
+        self.assertEqual([(e["type"], e["amount"], e["balance_after"]) for e in entries],
+                         [("deposit", Decimal("1"), Decimal(2000 + i)) for i in range(1, 11)])
+
+    """
+    Unit test case for caching coalesced deposits
+
+    This test case verify that of the depositors of one batch only -
+    the last gets the written item, the others get items that are -
+    kept out of the balance cache, whose version is the batch's.
+    """
+    def test_coalesced_results_not_cached(self):
+        batch = _Batch()
+        batch.amounts = [Decimal("1"), Decimal("2"), Decimal("3")]
+        batch.item = {"account_id": "12345", "current_balance": Decimal("6"), "version": Decimal("1")}
+
+        results = [batch.result(index) for index in range(3)]
+        self.assertEqual([r["current_balance"] for r in results], [Decimal("1"), Decimal("3"), Decimal("6")])
+        self.assertEqual([isinstance(r, UncachedItem) for r in results], [True, True, False])
+        self.assertIs(results[2], batch.item)
+
+    """
+    Unit test case for a coalesced write without a balance
+
+    This test case verify that when the committed write returns no -
+    balance, every depositor still gets the item instead of an error.
+    """
+    def test_coalesced_result_without_balance(self):
+        self.storage.window = 1.0
+        self.storage.max_batch = 2
+        self.backend.deposit_many = lambda account_id, amounts: UncachedItem(account_id=account_id)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.storage.deposit("12345", Decimal("1"))))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [{"account_id": "12345"}] * 2)
+        self.assertTrue(all(isinstance(result, UncachedItem) for result in results))
+
+    def test_deposit_error_reaches_every_waiter(self):
+        self.storage.window = 0.05
+        errors = []
+        def run():
+            try:
+                self.storage.deposit("67899", Decimal("1"))
+            except AccountNotFound:
+                errors.append(1)
+
+        threads = [threading.Thread(target=run) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 5)
+
+
+class TestBuildStorage(unittest.TestCase):
+
+    """
+    Unit test case for storage selection
+
+    This test case verify that the backend is picked by name and -
+    unknown backends are rejected.
+    """
+    def test_build_storage(self):
+        self.assertIsInstance(build_storage("memory"), MemoryStorage)
+        with self.assertRaises(ValueError):
+            build_storage("cassandra")
+
+    @patch.dict(os.environ, {"DEPOSIT_COALESCE_WINDOW_MS": "5", "DEPOSIT_COALESCE_MAX_BATCH": "16"})
+    def test_build_coalescing_storage(self):
+        storage = build_storage("memory")
+        self.assertIsInstance(storage, CoalescingStorage)
+        self.assertIsInstance(storage.storage, MemoryStorage)
+        self.assertEqual((storage.window, storage.max_batch), (0.005, 16))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,6 +6,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../.
 import unittest
 from unittest.mock import patch, MagicMock
 from botocore.exceptions import ClientError
+from decimal import Decimal
 from app.main import app
 
 import werkzeug
@@ -24,12 +25,15 @@ class TestApp(unittest.TestCase):
         self.username = "user"  # nosec B105
         self.password = "pass" # nosec B105
 
-        patcher = patch("app.main.get_credentials", return_value=(self.username, self.password))
-        self.mock_get_credentials = patcher.start()
+        patcher = patch("app.main.credentials.get", return_value=(self.username, self.password))
+        self.mock_credentials = patcher.start()
         self.addCleanup(patcher.stop)
 
         from app import main
-        main.USERNAME, main.PASSWORD = main.get_credentials()
+
+        # Start every test without remembered daily limits
+        main.storage.daily_limits.clear()
+        self.today = main.storage.today()
 
         # Prepare auth header
         import base64
@@ -144,6 +148,7 @@ class TestApp(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         new_balance = float(response.get_json()["current_balance"])
         self.assertEqual(new_balance, self.initial_balance + 500)
+        self.assertIn("ADD version :one", mock_update.call_args.kwargs["UpdateExpression"])
 
     """
     Unit test case for invalid deposit (minus) POST endpoint
@@ -266,6 +271,603 @@ class TestApp(unittest.TestCase):
         self.assertEqual(response.status_code, 404)
         self.assertIn("error", response.get_json())
 
+    """
+    Unit test case for batch balance lookup
+
+    This test case verify that a batch lookup returns the balance of -
+    found accounts and a per account status for invalid/missing ids.
+
+    :param mock_batch: Mock BatchGetItem values from Accounts table
+    """
+    @patch("app.main.dynamodb.batch_get_item")
+    def test_batch_balances_mixed(self, mock_batch):
+        mock_batch.return_value = {"Responses": {"Accounts": [
+            {"account_id": self.account_id, "current_balance": Decimal("2000")}
+        ]}}
+
+        response = self.client.post(
+            "/balances",
+            json={"account_ids": [self.account_id, "67899", "abc"]},
+            headers=self.auth_header
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()["results"]
+        self.assertEqual(results[self.account_id], {"status": "ok", "current_balance": 2000.0})
+        self.assertEqual(results["67899"]["status"], "not_found")
+        self.assertEqual(results["abc"]["status"], "invalid")
+        self.assertEqual(mock_batch.call_count, 1)
+
+    """
+    Unit test case for a consistent batch balance lookup
+
+    This test case verify that ?consistent=true makes the BatchGetItem -
+    read strongly consistent, and that it is eventually consistent -
+    otherwise.
+
+    :param mock_batch: Mock BatchGetItem values from Accounts table
+    """
+    @patch("app.main.dynamodb.batch_get_item")
+    def test_batch_balances_consistent(self, mock_batch):
+        mock_batch.return_value = {"Responses": {"Accounts": [
+            {"account_id": self.account_id, "current_balance": Decimal("2000")}
+        ]}}
+
+        response = self.client.get(f"/balances?ids={self.account_id}&consistent=true", headers=self.auth_header)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(mock_batch.call_args.kwargs["RequestItems"]["Accounts"]["ConsistentRead"])
+
+        response = self.client.get(f"/balances?ids={self.account_id}", headers=self.auth_header)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(mock_batch.call_args.kwargs["RequestItems"]["Accounts"]["ConsistentRead"])
+
+    """
+    Unit test case for batch balance lookup with unprocessed keys
+
+    This test case verify that keys returned as UnprocessedKeys -
+    are retried until DynamoDB resolves them.
+
+    :param mock_batch: Mock BatchGetItem values from Accounts table
+    """
+    @patch("app.storage.dynamodb.time.sleep")
+    @patch("app.main.dynamodb.batch_get_item")
+    def test_batch_balances_retry_unprocessed(self, mock_batch, mock_sleep):
+        unprocessed = {"Accounts": {"Keys": [{"account_id": "67899"}]}}
+        mock_batch.side_effect = [
+            {"Responses": {"Accounts": [{"account_id": self.account_id, "current_balance": Decimal("10")}]},
+             "UnprocessedKeys": unprocessed},
+            {"Responses": {"Accounts": [{"account_id": "67899", "current_balance": Decimal("20")}]},
+             "UnprocessedKeys": {}},
+        ]
+
+        response = self.client.get(f"/balances?ids={self.account_id},67899", headers=self.auth_header)
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()["results"]
+        self.assertEqual(results["67899"]["current_balance"], 20.0)
+        self.assertEqual(mock_batch.call_count, 2)
+        self.assertEqual(mock_batch.call_args.kwargs["RequestItems"], unprocessed)
+
+    """
+    Unit test case for batch balance lookup above the id limit
+
+    This test case verify that a batch lookup with more ids than -
+    allowed is rejected before calling DynamoDB.
+
+    :param mock_batch: Mock BatchGetItem values from Accounts table
+    """
+    @patch("app.main.dynamodb.batch_get_item")
+    def test_batch_balances_too_many_ids(self, mock_batch):
+        from app import main
+        ids = [str(i) for i in range(main.BATCH_MAX_IDS + 1)]
+        response = self.client.post("/balances", json={"account_ids": ids}, headers=self.auth_header)
+        self.assertEqual(response.status_code, 400)
+        mock_batch.assert_not_called()
+
+    """
+    Unit test case for withdraw above the daily limit
+
+    This test case verify that a failed condition check returning -
+    the old item is reported as daily limit exceeded without reading -
+    the account first.
+
+    :param mock_get: Mock get values from Accounts table
+    :param mock_update: Mock update values from Accounts table
+    """
+    @patch("app.main.table.update_item")
+    @patch("app.main.table.get_item")
+    def test_withdraw_daily_limit_exceeded(self, mock_get, mock_update):
+        from app import main
+        main.storage.daily_limits.clear()
+        error_response = {
+            "Error": {"Code": "ConditionalCheckFailedException", "Message": "Conditional check failed"},
+            "Item": {
+                "account_id": {"S": self.account_id},
+                "current_balance": {"N": "2000"},
+                "daily_limit": {"N": "1000"},
+                "daily_amount_withdrawn": {"N": "800"},
+                "withdrawal_date": {"S": self.today}
+            }
+        }
+        mock_update.side_effect = ClientError(error_response, "update_item")
+
+        response = self.client.post("/withdraw", json={"account_id": self.account_id, "amount": 500}, headers=self.auth_header)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["error"], "Daily limit exceeded")
+        self.assertEqual(mock_update.call_args.kwargs["ReturnValuesOnConditionCheckFailure"], "ALL_OLD")
+        mock_get.assert_not_called()
+
+    """
+    Unit test case for withdraw with insufficient balance
+
+    This test case verify that insufficient balance is told apart -
+    from a missing account using the item returned by the failed -
+    condition check.
+
+    :param mock_update: Mock update values from Accounts table
+    """
+    @patch("app.main.table.update_item")
+    def test_withdraw_insufficient_balance_item(self, mock_update):
+        error_response = {
+            "Error": {"Code": "ConditionalCheckFailedException", "Message": "Conditional check failed"},
+            "Item": {"account_id": {"S": self.account_id}, "current_balance": {"N": "100"}}
+        }
+        mock_update.side_effect = ClientError(error_response, "update_item")
+
+        response = self.client.post("/withdraw", json={"account_id": self.account_id, "amount": 500}, headers=self.auth_header)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()["error"], "Insufficient balance")
+
+    """
+    Unit test case for withdraw with a stale daily limit
+
+    This test case verify that a withdraw conditioned on an unknown -
+    daily limit learns the limit from the failed check and retries -
+    the write with the exact headroom.
+
+    :param mock_update: Mock update values from Accounts table
+    """
+    @patch("app.main.table.update_item")
+    def test_withdraw_learns_daily_limit(self, mock_update):
+        from app import main
+        main.storage.daily_limits.clear()
+        error_response = {
+            "Error": {"Code": "ConditionalCheckFailedException", "Message": "Conditional check failed"},
+            "Item": {
+                "account_id": {"S": self.account_id},
+                "current_balance": {"N": "2000"},
+                "daily_limit": {"N": "1000"},
+                "daily_amount_withdrawn": {"N": "200"},
+                "withdrawal_date": {"S": self.today}
+            }
+        }
+        mock_update.side_effect = [
+            ClientError(error_response, "update_item"),
+            {"Attributes": {"account_id": self.account_id, "current_balance": Decimal("1500"),
+                            "daily_limit": Decimal("1000"), "daily_amount_withdrawn": Decimal("700"),
+                            "withdrawal_date": self.today}}
+        ]
+
+        response = self.client.post("/withdraw", json={"account_id": self.account_id, "amount": 500}, headers=self.auth_header)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_update.call_count, 2)
+        values = mock_update.call_args.kwargs["ExpressionAttributeValues"]
+        self.assertEqual(values[":limit"], Decimal("1000"))
+        self.assertEqual(values[":headroom"], Decimal("500"))
+
+    """
+    Unit test case for the daily counter reset
+
+    This test case verify that a counter left from an earlier day -
+    fails the same-day update, and the write is retried with the -
+    update that restarts the counter for today.
+
+    :param mock_update: Mock update values from Accounts table
+    """
+    @patch("app.main.table.update_item")
+    def test_withdraw_restarts_daily_counter(self, mock_update):
+        from app import main
+        main.storage.daily_limits.set(self.account_id, (Decimal("1000"), self.today))
+        error_response = {
+            "Error": {"Code": "ConditionalCheckFailedException", "Message": "Conditional check failed"},
+            "Item": {
+                "account_id": {"S": self.account_id},
+                "current_balance": {"N": "2000"},
+                "daily_limit": {"N": "1000"},
+                "daily_amount_withdrawn": {"N": "1000"},
+                "withdrawal_date": {"S": "2000-01-01"}
+            }
+        }
+        mock_update.side_effect = [
+            ClientError(error_response, "update_item"),
+            {"Attributes": {"account_id": self.account_id, "current_balance": Decimal("1500"),
+                            "daily_limit": Decimal("1000"), "daily_amount_withdrawn": Decimal("500"),
+                            "withdrawal_date": self.today}}
+        ]
+
+        response = self.client.post("/withdraw", json={"account_id": self.account_id, "amount": 500}, headers=self.auth_header)
+        self.assertEqual(response.status_code, 200)
+        first, retry = (call.kwargs for call in mock_update.call_args_list)
+        self.assertIn("withdrawal_date = :today AND", first["ConditionExpression"])
+        self.assertIn("withdrawal_date = :today", retry["UpdateExpression"])
+        self.assertIn("withdrawal_date <> :today", retry["ConditionExpression"])
+        self.assertEqual(retry["ExpressionAttributeValues"][":today"], self.today)
+
+    """
+    Unit test case for a raised daily limit
+
+    This test case verify that a remembered limit below the amount -
+    does not reject the withdrawal: the condition fails on the stale -
+    limit, and the write is retried with the limit of the item.
+
+    :param mock_update: Mock update values from Accounts table
+    """
+    @patch("app.main.table.update_item")
+    def test_withdraw_after_limit_raised(self, mock_update):
+        from app import main
+        main.storage.daily_limits.set(self.account_id, (Decimal("100"), self.today))
+        error_response = {
+            "Error": {"Code": "ConditionalCheckFailedException", "Message": "Conditional check failed"},
+            "Item": {
+                "account_id": {"S": self.account_id},
+                "current_balance": {"N": "2000"},
+                "daily_limit": {"N": "1000"},
+                "daily_amount_withdrawn": {"N": "0"},
+                "withdrawal_date": {"S": self.today}
+            }
+        }
+        mock_update.side_effect = [
+            ClientError(error_response, "update_item"),
+            {"Attributes": {"account_id": self.account_id, "current_balance": Decimal("1500"),
+                            "daily_limit": Decimal("1000"), "daily_amount_withdrawn": Decimal("500"),
+                            "withdrawal_date": self.today}}
+        ]
+
+        response = self.client.post("/withdraw", json={"account_id": self.account_id, "amount": 500}, headers=self.auth_header)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_update.call_count, 2)
+        self.assertEqual(mock_update.call_args.kwargs["ExpressionAttributeValues"][":limit"], Decimal("1000"))
+
+    """
+    Unit test case for the balance cache
+
+    This test case verify that a deposit writes the fresh item into -
+    the cache so the next balance lookup skips DynamoDB, and that -
+    ?consistent=true bypasses the cache.
+
+    :param mock_get: Mock get values from Accounts table
+    :param mock_update: Mock update values from Accounts table
+    """
+    @patch("app.main.table.update_item")
+    @patch("app.main.table.get_item")
+    def test_balance_cache_write_through(self, mock_get, mock_update):
+        from app.utils.cache import build_account_cache
+        mock_update.return_value = {"Attributes": {"account_id": self.account_id, "current_balance": Decimal("2500")}}
+        mock_get.return_value = {"Item": {"account_id": self.account_id, "current_balance": Decimal("2400")}}
+
+        with patch("app.main.balance_cache", build_account_cache(size=10, ttl=60)):
+            self.client.post("/deposit", json={"account_id": self.account_id, "amount": 500}, headers=self.auth_header)
+            response = self.client.get(f"/balance/{self.account_id}", headers=self.auth_header)
+            self.assertEqual(response.get_json()["current_balance"], 2500.0)
+            mock_get.assert_not_called()
+
+            response = self.client.get(f"/balance/{self.account_id}?consistent=true", headers=self.auth_header)
+            self.assertEqual(response.get_json()["current_balance"], 2400.0)
+            mock_get.assert_called_once_with(Key={"account_id": self.account_id}, ConsistentRead=True)
+
+    """
+    Unit test case for conditional balance requests
+
+    This test case verify that /balance returns the item version as -
+    its ETag, and that a cached item of the version in If-None-Match -
+    answers 304 without calling DynamoDB.
+
+    :param mock_get: Mock get values from Accounts table
+    :param mock_update: Mock update values from Accounts table
+    """
+    @patch("app.main.table.update_item")
+    @patch("app.main.table.get_item")
+    def test_balance_etag(self, mock_get, mock_update):
+        from app.utils.cache import build_account_cache
+        mock_get.return_value = {"Item": {"account_id": self.account_id, "current_balance": Decimal("2000"), "version": Decimal("6")}}
+        mock_update.return_value = {"Attributes": {"account_id": self.account_id, "current_balance": Decimal("2500"), "version": Decimal("7")}}
+
+        with patch("app.main.balance_cache", build_account_cache(size=10, ttl=60)):
+            response = self.client.get(f"/balance/{self.account_id}", headers=self.auth_header)
+            self.assertEqual(response.headers["ETag"], '"6"')
+
+            response = self.client.get(f"/balance/{self.account_id}", headers=dict(self.auth_header, **{"If-None-Match": '"6"'}))
+            self.assertEqual((response.status_code, response.headers["ETag"], response.data), (304, '"6"', b""))
+            mock_get.assert_called_once()
+
+            # The deposit writes version 7 into the cache
+            self.client.post("/deposit", json={"account_id": self.account_id, "amount": 500}, headers=self.auth_header)
+            response = self.client.get(f"/balance/{self.account_id}", headers=dict(self.auth_header, **{"If-None-Match": '"6"'}))
+            self.assertEqual((response.status_code, response.headers["ETag"]), (200, '"7"'))
+            mock_get.assert_called_once()
+
+            response = self.client.get(f"/balance/{self.account_id}?allowance=true", headers=self.auth_header)
+            self.assertEqual(response.headers["ETag"], f'"7-{self.today}"')
+
+    """
+    Unit test case for a sharded account whose shards cannot be read
+
+    This test case verify that /balance answers the JSON 503 of a busy -
+    account when shard keys stay unprocessed, and that a deposit -
+    answered from other shards' known state drops the cached item -
+    rather than caching it.
+
+    :param mock_get: Mock get values from Accounts table
+    :param mock_batch: Mock BatchGetItem of the shards
+    """
+    @patch("app.storage.dynamodb.time.sleep")
+    @patch("app.main.dynamodb.batch_get_item")
+    @patch("app.main.table.get_item")
+    def test_sharded_balance_busy(self, mock_get, mock_batch, mock_sleep):
+        from app import main
+        from app.utils.cache import build_account_cache
+        from app.storage.base import UncachedItem
+        mock_get.return_value = {"Item": {"account_id": self.account_id, "current_balance": Decimal("10"), "balance_shards": Decimal("2")}}
+        mock_batch.return_value = {"UnprocessedKeys": {"Accounts": {"Keys": [{"account_id": f"{self.account_id}#1"}]}}}
+
+        response = self.client.get(f"/balance/{self.account_id}", headers=self.auth_header)
+        self.assertEqual((response.status_code, response.get_json()), (503, {"error": "Account is busy, please retry"}))
+
+        with patch("app.main.balance_cache", build_account_cache(size=10, ttl=60)):
+            main.balance_cache.put(self.account_id, {"account_id": self.account_id, "current_balance": Decimal("10")})
+            with patch.object(main.storage, "deposit", return_value=UncachedItem(account_id=self.account_id)):
+                response = self.client.post("/deposit", json={"account_id": self.account_id, "amount": 5}, headers=self.auth_header)
+            self.assertEqual((response.status_code, response.get_json()), (200, {"account_id": self.account_id}))
+            self.assertIsNone(main.balance_cache.get(self.account_id))
+        main.storage.balance_shards.clear()
+
+    """
+    Unit test case for a valid transfer
+
+    This test case verify that a transfer debits and credits both -
+    accounts in one TransactWriteItems call, with the withdraw -
+    conditions on the source and the existence check on the destination.
+
+    :param mock_transact: Mock transaction on the Accounts table
+    """
+    @patch("app.main.storage.client.transact_write_items")
+    def test_transfer_valid(self, mock_transact):
+        from app import main
+        main.storage.daily_limits.clear()
+        mock_transact.return_value = {}
+
+        response = self.client.post("/transfer", json={"from_account_id": self.account_id, "to_account_id": "67899", "amount": 250}, headers=self.auth_header)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"from_account_id": self.account_id, "to_account_id": "67899", "amount": 250.0})
+
+        source, destination = (entry["Update"] for entry in mock_transact.call_args.kwargs["TransactItems"])
+        self.assertEqual(source["Key"], {"account_id": {"S": self.account_id}})
+        self.assertIn("current_balance >= :val", source["ConditionExpression"])
+        self.assertEqual(destination["Key"], {"account_id": {"S": "67899"}})
+        self.assertEqual(destination["ConditionExpression"], "attribute_exists(account_id)")
+
+    """
+    Unit test case for transfer cancellation reasons
+
+    This test case verify that the cancellation reason of each side -
+    of the transaction is mapped to the precise error.
+
+    :param mock_transact: Mock transaction on the Accounts table
+    """
+    @patch("app.main.storage.client.transact_write_items")
+    def test_transfer_cancellation_reasons(self, mock_transact):
+        from app import main
+        main.storage.daily_limits.clear()
+
+        def cancelled(*reasons):
+            error_response = {
+                "Error": {"Code": "TransactionCanceledException", "Message": "Transaction cancelled"},
+                "CancellationReasons": list(reasons)
+            }
+            return ClientError(error_response, "transact_write_items")
+
+        source_item = {
+            "account_id": {"S": self.account_id},
+            "current_balance": {"N": "100"},
+            "daily_limit": {"N": "1000"}
+        }
+        payload = {"from_account_id": self.account_id, "to_account_id": "67899", "amount": 250}
+
+        mock_transact.side_effect = cancelled({"Code": "None"}, {"Code": "ConditionalCheckFailed"})
+        response = self.client.post("/transfer", json=payload, headers=self.auth_header)
+        self.assertEqual((response.status_code, response.get_json()), (404, {"error": "Account 67899 not found"}))
+
+        mock_transact.side_effect = cancelled({"Code": "ConditionalCheckFailed", "Item": source_item}, {"Code": "None"})
+        response = self.client.post("/transfer", json=payload, headers=self.auth_header)
+        self.assertEqual((response.status_code, response.get_json()), (409, {"error": "Insufficient balance"}))
+
+        mock_transact.side_effect = cancelled({"Code": "TransactionConflict"}, {"Code": "None"})
+        response = self.client.post("/transfer", json=payload, headers=self.auth_header)
+        self.assertEqual(response.status_code, 503)
+
+    """
+    Unit test case for a batch of transfers
+
+    This test case verify that every transfer of a batch gets its -
+    own result and a rejected transfer does not stop the others.
+
+    :param mock_transact: Mock transaction on the Accounts table
+    """
+    @patch("app.main.storage.client.transact_write_items")
+    def test_transfer_batch(self, mock_transact):
+        mock_transact.return_value = {}
+        payload = {"transfers": [
+            {"from_account_id": self.account_id, "to_account_id": "67899", "amount": 10},
+            {"from_account_id": self.account_id, "to_account_id": self.account_id, "amount": 10},
+            {"from_account_id": self.account_id, "to_account_id": "67899", "amount": "abc"}
+        ]}
+
+        response = self.client.post("/transfer", json=payload, headers=self.auth_header)
+        self.assertEqual(response.status_code, 200)
+        statuses = [result["status"] for result in response.get_json()["results"]]
+        self.assertEqual(statuses, [200, 400, 400])
+        self.assertEqual(mock_transact.call_count, 1)
+
+
+    """
+    Unit test case for the ledger write
+
+    This test case verify that with a ledger table a deposit updates -
+    the account and puts the ledger entry in one transaction, -
+    conditioned on the balance the entry was computed from.
+
+    :param mock_get: Mock get values from Accounts table
+    :param mock_transact: Mock transaction on the Accounts and ledger tables
+    """
+    @patch("app.main.storage.client.transact_write_items")
+    @patch("app.main.table.get_item")
+    def test_deposit_with_ledger(self, mock_get, mock_transact):
+        from app import main
+        mock_get.return_value = {"Item": {"account_id": self.account_id, "current_balance": Decimal("2000")}}
+        mock_transact.return_value = {}
+
+        with patch.object(main.storage, "ledger", MagicMock()), patch.object(main.storage, "ledger_table", "Transactions"):
+            response = self.client.post("/deposit", json={"account_id": self.account_id, "amount": 500}, headers=self.auth_header)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["current_balance"], 2500.0)
+
+        update, put = mock_transact.call_args.kwargs["TransactItems"]
+        self.assertIn("current_balance = :old", update["Update"]["ConditionExpression"])
+        self.assertEqual(update["Update"]["ExpressionAttributeValues"][":old"], {"N": "2000"})
+        self.assertEqual(put["Put"]["TableName"], "Transactions")
+        self.assertEqual(put["Put"]["Item"]["type"], {"S": "deposit"})
+        self.assertEqual(put["Put"]["Item"]["balance_after"], {"N": "2500"})
+
+    """
+    Unit test case for a deposit batch with a ledger
+
+    This test case verify that deposits applied together update the -
+    account once and put one ledger entry per deposit, each with the -
+    balance after it.
+
+    :param mock_get: Mock get values from Accounts table
+    :param mock_transact: Mock transaction on the Accounts and ledger tables
+    """
+    @patch("app.main.storage.client.transact_write_items")
+    @patch("app.main.table.get_item")
+    def test_deposit_many_with_ledger(self, mock_get, mock_transact):
+        from app import main
+        mock_get.return_value = {"Item": {"account_id": self.account_id, "current_balance": Decimal("2000")}}
+        mock_transact.return_value = {}
+
+        with patch.object(main.storage, "ledger", MagicMock()), patch.object(main.storage, "ledger_table", "Transactions"):
+            self.assertEqual(main.storage.deposit_batch_limit, 99)
+            item = main.storage.deposit_many(self.account_id, [Decimal("1"), Decimal("2"), Decimal("3")])
+        self.assertEqual(item["current_balance"], Decimal("2006"))
+
+        update, *puts = mock_transact.call_args.kwargs["TransactItems"]
+        self.assertEqual(update["Update"]["ExpressionAttributeValues"][":val"], {"N": "6"})
+        self.assertEqual(update["Update"]["ExpressionAttributeValues"][":one"], {"N": "3"})
+        self.assertEqual([(p["Put"]["Item"]["amount"], p["Put"]["Item"]["balance_after"]) for p in puts], [
+            ({"N": "1"}, {"N": "2001"}), ({"N": "2"}, {"N": "2003"}), ({"N": "3"}, {"N": "2006"})
+        ])
+        self.assertEqual(mock_get.call_count, 1)
+
+    """
+    Unit test case for transaction history pages
+
+    This test case verify that the history is read with a Query -
+    limited to the page size, and that the opaque cursor round-trips -
+    to the ExclusiveStartKey of the next page.
+    """
+    def test_transactions_cursor(self):
+        from app import main
+        ledger = MagicMock()
+        last_key = {"account_id": self.account_id, "entry_id": "2024-06-30T08:15:00.000000Z#abc"}
+        ledger.query.return_value = {"Items": [], "LastEvaluatedKey": last_key}
+
+        with patch.object(main.storage, "ledger", ledger):
+            response = self.client.get(f"/transactions/{self.account_id}?limit=1000", headers=self.auth_header)
+            cursor = response.get_json()["next_cursor"]
+            self.assertEqual(ledger.query.call_args.kwargs["Limit"], main.TRANSACTIONS_PAGE_MAX)
+
+            response = self.client.get(f"/transactions/{self.account_id}?cursor={cursor}&from=2024-06-01", headers=self.auth_header)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(ledger.query.call_args.kwargs["ExclusiveStartKey"], last_key)
+
+            response = self.client.get(f"/transactions/67899?cursor={cursor}", headers=self.auth_header)
+            self.assertEqual((response.status_code, response.get_json()), (400, {"error": "Invalid cursor"}))
+
+        response = self.client.get(f"/transactions/{self.account_id}", headers=self.auth_header)
+        self.assertEqual(response.status_code, 501)
+
+    """
+    Unit test case for admission control
+
+    This test case verify that requests over the account rate are -
+    answered 429 with Retry-After without calling DynamoDB, and that -
+    other accounts are still admitted.
+    """
+    @patch("app.main.table.update_item")
+    def test_admission_account_rate(self, mock_update):
+        from app import main
+        from app.utils.admission import build_admission_control
+        mock_update.return_value = {"Attributes": {"account_id": self.account_id, "current_balance": Decimal("2500")}}
+
+        with patch.object(main, "admission", build_admission_control(account_rate=0.5, account_burst=2, max_concurrency=4)):
+            for _ in range(2):
+                response = self.client.post("/deposit", json={"account_id": self.account_id, "amount": 500}, headers=self.auth_header)
+                self.assertEqual(response.status_code, 200)
+
+            response = self.client.post("/deposit", json={"account_id": int(self.account_id), "amount": 500}, headers=self.auth_header)
+            self.assertEqual((response.status_code, response.get_json()), (429, {"error": "Too many requests"}))
+            self.assertEqual(response.headers["Retry-After"], "2")
+            self.assertEqual(mock_update.call_count, 2)
+
+            response = self.client.post("/deposit", json={"account_id": "67899", "amount": 500}, headers=self.auth_header)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(main.admission.concurrency.active, 0)
+
+    """
+    Unit test case for the sampling profiler
+
+    This test case verify that the rate is set on the admin endpoint, -
+    that sampled requests are aggregated under their route, and that -
+    the profiles download as pstats and collapsed stacks.
+    """
+    @patch("app.main.table.get_item")
+    def test_profile_requests(self, mock_get):
+        import marshal
+        import tempfile
+        from app import main
+        mock_get.return_value = {"Item": {"account_id": self.account_id, "current_balance": Decimal("2000")}}
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(patch.object(main.profiler, "directory", directory.name))
+        self.addCleanup(main.profiler.reset)
+        self.addCleanup(main.profiler.set_rate, 0)
+
+        response = self.client.post("/admin/profile", json={"rate": 2}, headers=self.auth_header)
+        self.assertEqual((response.status_code, response.get_json()), (400, {"error": "Invalid rate"}))
+        response = self.client.get("/admin/profile/download", headers=self.auth_header)
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.post("/admin/profile", json={"rate": 1}, headers=self.auth_header)
+        self.assertEqual(response.get_json(), {"rate": 1.0, "routes": {}})
+        for _ in range(2):
+            self.assertEqual(self.client.get(f"/balance/{self.account_id}", headers=self.auth_header).status_code, 200)
+
+        route = "GET /balance/<account_id>"
+        routes = self.client.get("/admin/profile", headers=self.auth_header).get_json()["routes"]
+        self.assertEqual(list(routes), [route])
+        self.assertEqual(routes[route]["requests"], 2)
+
+        response = self.client.get("/admin/profile/download", query_string={"route": route}, headers=self.auth_header)
+        self.assertEqual(response.headers["Content-Disposition"], "attachment; filename=profile.pstats")
+        self.assertIn("handle_balance", {name for _, _, name in marshal.loads(response.data)})  # nosec B302
+
+        response = self.client.get("/admin/profile/download", query_string={"format": "collapsed"}, headers=self.auth_header)
+        self.assertEqual(response.mimetype, "text/plain")
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertTrue(all(line.startswith(route + ";") for line in lines))
+        self.assertTrue(any("handle_balance (app/main.py" in line for line in lines))
+
+        self.assertEqual(self.client.get("/admin/profile/download", query_string={"format": "svg"},
+                                         headers=self.auth_header).status_code, 400)
+        self.assertEqual(self.client.delete("/admin/profile", headers=self.auth_header).get_json()["routes"], {})
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,126 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import unittest
+from decimal import Decimal
+from app.utils.validator import (
+    parse_body, parse_amount, parse_account_id, is_account_id, amount_parser, ACCOUNT_WRITE, TRANSFER,
+    ACCOUNT_IMPORT
+)
+
+
+class TestValidator(unittest.TestCase):
+
+    """
+    Unit test case for request body parsing
+
+    This test case verify that JSON numbers with a fraction are read -
+    straight to Decimal and integers stay integers.
+    """
+    def test_parse_body(self):
+        data = parse_body(b'{"account_id": "1", "amount": 0.1, "count": 3}')
+        self.assertEqual(data["amount"], Decimal("0.1"))
+        self.assertIsInstance(data["count"], int)
+        self.assertEqual(parse_body('{"amount": 10.25}'), {"amount": Decimal("10.25")})
+        self.assertEqual(parse_body('{"amount": 5}'.encode("utf-16")), {"amount": 5})
+
+        with self.assertRaises(ValueError):
+            parse_body(b"{not json")
+
+    """
+    Unit test case for amount parsing
+
+    This test case verify that valid amounts are parsed to exact -
+    Decimals whatever JSON type they arrive as.
+    """
+    def test_parse_amount(self):
+        self.assertEqual(parse_amount(500), Decimal("500"))
+        self.assertEqual(parse_amount(Decimal("11.67")), Decimal("11.67"))
+        self.assertEqual(parse_amount("11.67"), Decimal("11.67"))
+        self.assertEqual(parse_amount(11.67), Decimal("11.67"))
+        self.assertEqual(parse_amount("1.500"), Decimal("1.500"))
+        self.assertEqual(parse_amount(Decimal("1E+3")), Decimal("1000"))
+
+    """
+    Unit test case for rejected amounts
+
+    This test case verify that amounts that are not positive, finite, -
+    plain decimals within scale and precision are rejected.
+    """
+    def test_parse_amount_rejected(self):
+        for value in (None, True, False, 0, -1, "-1", "0", "abc", "1e3", " 5", "1.", ".5", "NaN",
+                      Decimal("NaN"), Decimal("Infinity"), float("inf"), [], {}):
+            self.assertIsNone(parse_amount(value), value)
+
+        # Float rounding artefacts and extra decimal places are not rounded away
+        self.assertIsNone(parse_amount(Decimal("0.30000000000000004")))
+        self.assertIsNone(parse_amount(0.1 + 0.2))
+        self.assertIsNone(parse_amount(10.555))
+        self.assertIsNone(parse_amount("10.555"))
+
+        # 13 integer digits at most with the default scale of 2
+        self.assertEqual(parse_amount("9999999999999.99"), Decimal("9999999999999.99"))
+        self.assertIsNone(parse_amount("10000000000000"))
+
+        parse = amount_parser(scale=0, precision=3)
+        self.assertEqual(parse(999), Decimal("999"))
+        self.assertIsNone(parse(1000))
+        self.assertIsNone(parse("1.5"))
+
+    """
+    Unit test case for account id parsing
+
+    This test case verify that account ids are ASCII digit strings, -
+    JSON integers are accepted as their string.
+    """
+    def test_parse_account_id(self):
+        self.assertEqual(parse_account_id("12345"), "12345")
+        self.assertEqual(parse_account_id(12345), "12345")
+        for value in (None, True, "", "abc", "12a", "-1", -1, "١٢٣", "1" * 33, 1.0):
+            self.assertIsNone(parse_account_id(value), value)
+        self.assertTrue(is_account_id("007"))
+        self.assertFalse(is_account_id("²"))
+
+    """
+    Unit test case for request schemas
+
+    This test case verify that a schema returns the parsed values, -
+    or the error of the first invalid field.
+    """
+    def test_schema(self):
+        values, error = ACCOUNT_WRITE.validate({"account_id": 7, "amount": Decimal("2.50")})
+        self.assertIsNone(error)
+        self.assertEqual(values, {"account_id": "7", "amount": Decimal("2.50")})
+
+        self.assertEqual(ACCOUNT_WRITE.validate({}), (None, "Empty request body"))
+        self.assertEqual(ACCOUNT_WRITE.validate([1]), (None, "Empty request body"))
+        self.assertEqual(ACCOUNT_WRITE.validate({"account_id": "x", "amount": "x"}), (None, "Invalid account_id"))
+        self.assertEqual(ACCOUNT_WRITE.validate({"account_id": "1", "amount": "x"}), (None, "Invalid amount"))
+        self.assertEqual(
+            TRANSFER.validate({"from_account_id": "1", "to_account_id": "", "amount": 1}), (None, "Invalid account_id"))
+
+    """
+    Unit test case for the account import schema
+
+    This test case verify that balances may be 0, that a missing -
+    daily_amount_withdrawn defaults to 0 and other optional fields -
+    are left out, and that optional fields are still validated.
+    """
+    def test_import_schema(self):
+        values, error = ACCOUNT_IMPORT.validate({"account_id": "1", "current_balance": "0", "daily_limit": 500,
+                                                 "withdrawal_date": "", "first_name": "Ann"})
+        self.assertIsNone(error)
+        self.assertEqual(values, {"account_id": "1", "current_balance": Decimal("0"), "daily_limit": Decimal("500"),
+                                  "daily_amount_withdrawn": Decimal("0"), "first_name": "Ann"})
+
+        record = {"account_id": "1", "current_balance": "10", "daily_limit": "500"}
+        self.assertEqual(ACCOUNT_IMPORT.validate(dict(record, current_balance="-1")), (None, "Invalid current_balance"))
+        self.assertEqual(ACCOUNT_IMPORT.validate(dict(record, withdrawal_date="2024-02-30")),
+                         (None, "Invalid withdrawal_date"))
+        self.assertIsNone(parse_amount("0"))
+
+
+if __name__ == "__main__":
+    unittest.main()